@@ -12,7 +12,6 @@ Usage:
 
 import sys
 import os
-import time
 import numpy as np
 from pathlib import Path
 import argparse
@@ -33,12 +32,15 @@ if not in_venv:
 try:
     # Import R3F environment
     from r3f_agents.environment import R3FEnv
+    from r3f_agents.vec_env import R3FVecEnv
+    from r3f_agents.sharded import R3FShardedVecEnv
+    from r3f_agents.rewards import TargetReward
+    from r3f_agents.evaluation import AsyncEvalCallback, EvaluationRunner, summarize
 
     # Import Stable Baselines3
     from stable_baselines3 import PPO, A2C, SAC
     from stable_baselines3.common.vec_env import DummyVecEnv
-    from stable_baselines3.common.evaluation import evaluate_policy
-    from stable_baselines3.common.callbacks import EvalCallback, CheckpointCallback
+    from stable_baselines3.common.callbacks import CheckpointCallback
     from stable_baselines3.common.monitor import Monitor
     from stable_baselines3.common.env_checker import check_env
 except ImportError as e:
@@ -72,6 +74,14 @@ def parse_args():
                         help="Evaluate a trained model instead of training")
     parser.add_argument("--model-path", type=str, default="./models/best_model", 
                         help="Path to save/load the model")
+    parser.add_argument("--num-agents", type=int, default=1,
+                        help="Number of agents to train in parallel over one connection")
+    parser.add_argument("--endpoints", type=str, nargs="+", default=["ws://localhost:8765"],
+                        help="Server URLs; with several, the agents are spread over all of them")
+    parser.add_argument("--eval-agents", type=int, default=8,
+                        help="Number of agents evaluation episodes are played on at once")
+    parser.add_argument("--eval-episodes", type=int, default=16,
+                        help="Number of episodes per evaluation")
     parser.add_argument("--no-tensorboard", action="store_true",
                         help="Disable TensorBoard logging even if available")
     return parser.parse_args()
@@ -91,14 +101,39 @@ def make_env(websocket_url, agent_id, start_position, target_position):
         return env
     return _init
 
+def make_eval_env(args):
+    """Create the agents evaluation episodes are played on, apart from the training agents."""
+    return R3FVecEnv(
+        websocket_url=args.endpoints[0],
+        agent_ids=[f"eval_{i}" for i in range(args.eval_agents)],
+        max_episode_steps=500,
+        reward=TargetReward(args.eval_agents, target_position=args.target, start_position=args.start)
+    )
+
 def train_agent(args):
     """Train an RL agent to navigate from start to target."""
     print("Starting R3F Agents RL training...")
     print(f"Training agent to navigate from {args.start} to {args.target}")
     
     # Create the environment
-    env_fn = make_env("ws://localhost:8765", "main", args.start, args.target)
-    env = DummyVecEnv([env_fn])
+    if len(args.endpoints) > 1:
+        num_agents = max(args.num_agents, len(args.endpoints))
+        env = R3FShardedVecEnv(
+            args.endpoints,
+            num_agents=num_agents,
+            max_episode_steps=500,
+            reward=TargetReward(num_agents, target_position=args.target, start_position=args.start)
+        )
+    elif args.num_agents > 1:
+        env = R3FVecEnv(
+            websocket_url=args.endpoints[0],
+            num_agents=args.num_agents,
+            max_episode_steps=500,
+            reward=TargetReward(args.num_agents, target_position=args.target, start_position=args.start)
+        )
+    else:
+        env_fn = make_env(args.endpoints[0], "main", args.start, args.target)
+        env = DummyVecEnv([env_fn])
     
     # Create log and model directories
     log_dir = "./logs"
@@ -106,14 +141,15 @@ def train_agent(args):
     os.makedirs(log_dir, exist_ok=True)
     os.makedirs(model_dir, exist_ok=True)
     
-    # Set up callbacks
-    eval_callback = EvalCallback(
-        env,
+    # Set up callbacks. Evaluation runs on its own agents while training goes on
+    eval_env = make_eval_env(args)
+    eval_callback = AsyncEvalCallback(
+        eval_env,
+        n_eval_episodes=args.eval_episodes,
         best_model_save_path=model_dir,
         log_path=log_dir,
         eval_freq=1000,
-        deterministic=True,
-        render=False
+        deterministic=True
     )
     
     checkpoint_callback = CheckpointCallback(
@@ -166,6 +202,7 @@ def train_agent(args):
     # Save the final model
     final_model_path = os.path.join(model_dir, "final_model")
     model.save(final_model_path)
+    eval_env.close()
     print(f"Training completed. Final model saved to {final_model_path}")
     
     return model
@@ -175,8 +212,7 @@ def evaluate_agent(args):
     print(f"Evaluating trained agent from {args.model_path}")
     
     # Create the environment
-    env_fn = make_env("ws://localhost:8765", "main", args.start, args.target)
-    env = env_fn()
+    env = make_eval_env(args)
     
     # Load the trained model
     if args.algo.lower() == "ppo":
@@ -188,33 +224,17 @@ def evaluate_agent(args):
     else:
         raise ValueError(f"Unsupported algorithm: {args.algo}")
     
-    # Run evaluation episodes
-    episodes = 5
-    max_steps = 500
-    
-    for episode in range(episodes):
-        print(f"\nStarting evaluation episode {episode + 1}/{episodes}")
-        obs, _ = env.reset()
-        done = False
-        total_reward = 0
-        step = 0
-        
-        while not done and step < max_steps:
-            action, _ = model.predict(obs, deterministic=True)
-            obs, reward, done, _, info = env.step(action)
-            total_reward += reward
-            
-            # Print progress every 50 steps
-            if step % 50 == 0:
-                position = obs['position'] if isinstance(obs, dict) else obs
-                distance = info.get('distance', 'unknown')
-                print(f"Step {step}: Position = {position}, Distance to target = {distance}")
-            
-            # Small delay to make the motion visible
-            time.sleep(0.01)
-            step += 1
-        
-        print(f"Episode {episode + 1}/{episodes} completed - Total reward: {total_reward:.2f}")
+    # Play the episodes on all evaluation agents at once, printing each as it ends
+    runner = EvaluationRunner(env, n_episodes=args.eval_episodes, seed=0)
+    results = []
+    for result in runner.episodes(model):
+        print(f"Episode {result.episode + 1}/{args.eval_episodes} completed - Total reward: {result.episode_return:.2f}, "
+              f"steps: {result.length}, success: {result.success}, step latency: {result.step_latency * 1000:.1f} ms")
+        results.append(result)
+    
+    summary = summarize(results)
+    print(f"\nMean reward: {summary['mean_return']:.2f} +/- {summary['std_return']:.2f}, "
+          f"success rate: {summary['success_rate']:.2f}")
     
     env.close()
     print("Evaluation completed")
@@ -31,9 +31,18 @@ export interface AgentState {
 }
 
 export interface AgentMessage {
-  type: 'state' | 'action' | 'reset' | 'info' | 'error'
+  type: 'state' | 'action' | 'reset' | 'snapshot' | 'restore' | 'info' | 'error'
   agentId: string
   data: Partial<AgentState>
+  seq?: number
+  version?: number
+  delta?: boolean
+}
+
+export interface BatchEntry {
+  agentId: string
+  data?: Partial<AgentState>
+  seq?: number
 }
 
 interface Store {
@@ -78,6 +87,8 @@ export class AgentConnection {
             const message = JSON.parse(event.data) as WebSocketMessage
             if ('type' in message && message.type === 'state') {
               this.store.updateAgentState(message.agentId, message.data)
+            } else if ('type' in message && message.type === 'restore') {
+              this.store.updateAgentState(message.agentId, message.data.state)
             }
           } catch (error) {
             this.store.setError('Failed to parse message')
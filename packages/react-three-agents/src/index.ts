@@ -10,5 +10,7 @@ export * from './types/message.types'
 export * from './utils/math'
 export * from './utils/websocket'
 export * from './utils/validation'
+export * from './utils/binaryProtocol'
+export * from './utils/stateDelta'
 
 export * from './constants/defaults'
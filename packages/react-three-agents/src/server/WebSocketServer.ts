@@ -1,15 +1,74 @@
 import { WebSocketServer, WebSocket } from "ws";
-import type { AgentMessage, AgentState } from "../core/AgentConnection";
-import { IncomingMessage } from "http";
+import type { AgentMessage, AgentState, BatchEntry } from "../core/AgentConnection";
+import { IncomingMessage, Server as HttpServer, createServer } from "http";
+import { existsSync, unlinkSync } from "fs";
 import { MessageValidator } from "../utils/MessageValidator";
+import {
+  BINARY_PROTOCOL,
+  BinaryKind,
+  CameraConfig,
+  decodeBinaryRecords,
+  decodeCameraFrames,
+  encodeBinaryRecords,
+  encodeCameraFrame,
+  isBinaryEncodable,
+} from "../utils/binaryProtocol";
+import { DEFAULT_KEYFRAME_INTERVAL, StateBaseline, diffState } from "../utils/stateDelta";
+
+/**
+ * What a connection is used for, announced with an `info` message
+ * `{ role }` or inferred from the first message it sends.
+ * - trainer: drives agents; receives only the messages of its own agents
+ * - scene: renders the agents and reports their states; receives resets
+ * - viewer: only watches; receives coalesced state updates at a limited rate
+ */
+export type ConnectionRole = "trainer" | "viewer" | "scene";
+
+const CONNECTION_ROLES: ConnectionRole[] = ["trainer", "viewer", "scene"];
 
 interface WebSocketConnection {
   ws: WebSocket;
   id: string;
-  agentId?: string;
+  /** Undefined until announced or inferred; treated as a viewer meanwhile */
+  role?: ConnectionRole;
+  agentIds: Set<string>;
   lastActivity: number;
+  binary: boolean;
+  binaryAgents: string[];
+  binaryIndex: Map<string, number>;
+  delta: boolean;
+  baselines: Map<string, StateBaseline>;
+  /** Agents whose camera frames this connection subscribed to */
+  cameras: Set<string>;
+}
+
+export interface ServerMetrics {
+  connections: number;
+  viewers: number;
+  agents: number;
+  messagesReceived: number;
+  binaryFramesReceived: number;
+  invalidMessages: number;
+  messagesSent: number;
+  bytesSent: number;
+  sendErrors: number;
+  /** Keyframe requests from clients that missed a delta-encoded state */
+  resyncRequests: number;
+  /** Camera frames received from the scene */
+  cameraFrames: number;
+  broadcasts: number;
+  /** State updates replaced by a newer one before viewers were sent them */
+  coalescedUpdates: number;
+  /** Number of connections the last broadcast was delivered to */
+  lastFanOut: number;
+  maxFanOut: number;
+  /** Bytes buffered in socket send queues, summed over connections */
+  queueDepth: number;
+  maxQueueDepth: number;
 }
 
+type ServerCounters = Omit<ServerMetrics, "connections" | "agents" | "queueDepth" | "viewers">;
+
 export interface AgentAction {
   agentId: string;
   position?: [number, number, number];
@@ -17,27 +76,86 @@ export interface AgentAction {
   action?: string;
 }
 
+/**
+ * An action being applied for several ticks, see the `repeat` field of
+ * action messages.
+ */
+interface ActionRepeat {
+  action: Omit<AgentAction, "agentId">;
+  remaining: number;
+  reward: number;
+}
+
 export class AgentWebSocketServer {
   private server: WebSocketServer | null = null;
+  private httpServer: HttpServer | null = null;
   private connections: Map<string, WebSocketConnection>;
+  /** Trainer connection driving each agent */
+  private owners: Map<string, WebSocketConnection> = new Map();
   private agents: Map<string, AgentState>;
+  private pendingSeq: Map<string, number>;
   private port: number;
+  private socketPath?: string;
   private isRunning: boolean = false;
   private onAgentAction?: (action: AgentAction) => void;
+  private onAgentSnapshot?: (agentId: string) => Partial<AgentState> | void | Promise<Partial<AgentState> | void>;
+  private onAgentRestore?: (agentId: string, state: AgentState) => void | Promise<void>;
   private heartbeatInterval: NodeJS.Timeout | null = null;
   private validator: MessageValidator;
   private connectionTimeout = 30000; // 30 seconds timeout
+  private resumeGracePeriod = 30000; // keep agent state 30 seconds for a resume
+  private detachedAgents: Map<string, NodeJS.Timeout> = new Map();
+  private actionRepeats: Map<string, ActionRepeat> = new Map();
+  private keyframeInterval = DEFAULT_KEYFRAME_INTERVAL;
+  /** Agents with a subscribed camera, in the order of their stream index */
+  private cameraStreams: string[] = [];
+  private cameraConfigs: Map<string, CameraConfig> = new Map();
+  private viewerInterval = 50; // send viewers at most 20 updates per second
+  /** Latest state of each agent not sent to viewers yet */
+  private viewerUpdates: Map<string, AgentMessage> = new Map();
+  private viewerTimer: NodeJS.Timeout | null = null;
+  private counters: ServerCounters = {
+    messagesReceived: 0,
+    binaryFramesReceived: 0,
+    invalidMessages: 0,
+    messagesSent: 0,
+    bytesSent: 0,
+    sendErrors: 0,
+    resyncRequests: 0,
+    cameraFrames: 0,
+    broadcasts: 0,
+    coalescedUpdates: 0,
+    lastFanOut: 0,
+    maxFanOut: 0,
+    maxQueueDepth: 0,
+  };
 
-  constructor(port: number = 8765) {
+  /**
+   * @param port TCP port to listen on
+   * @param socketPath Unix domain socket to listen on instead of the TCP port,
+   * for trainers running on the same host (`unix:///path` in the Python SDK)
+   */
+  constructor(port: number = 8765, socketPath?: string) {
     this.port = port;
+    this.socketPath = socketPath;
     this.connections = new Map();
     this.agents = new Map();
+    this.pendingSeq = new Map();
     this.validator = new MessageValidator();
   }
 
   private setupWebSocketServer() {
     try {
-      this.server = new WebSocketServer({ port: this.port });
+      if (this.socketPath) {
+        if (existsSync(this.socketPath)) {
+          unlinkSync(this.socketPath);
+        }
+        this.httpServer = createServer();
+        this.server = new WebSocketServer({ server: this.httpServer });
+        this.httpServer.listen(this.socketPath);
+      } else {
+        this.server = new WebSocketServer({ port: this.port });
+      }
 
       this.server.on("connection", this.handleConnection.bind(this));
       this.server.on("error", this.handleServerError.bind(this));
@@ -56,14 +174,28 @@ export class AgentWebSocketServer {
     const connection: WebSocketConnection = { 
       ws, 
       id, 
-      lastActivity: Date.now() 
+      agentIds: new Set(),
+      lastActivity: Date.now(),
+      binary: false,
+      binaryAgents: [],
+      binaryIndex: new Map(),
+      delta: false,
+      baselines: new Map(),
+      cameras: new Set(),
     };
     
     this.connections.set(id, connection);
     console.log(`Client connected: ${id}`);
 
-    ws.on("message", (message: any) => this.handleMessage(message, ws, connection));
-    ws.on("close", () => this.handleClose(ws));
+    ws.on("message", (message: any, isBinary: boolean) =>
+      isBinary
+        ? this.handleBinaryMessage(message, ws, connection)
+        : this.handleMessage(message, ws, connection)
+    );
+    ws.on("pong", () => {
+      connection.lastActivity = Date.now();
+    });
+    ws.on("close", () => this.handleClose(connection));
     ws.on("error", (error: Error) => this.handleConnectionError(error, connection));
     
     this.sendToConnection(connection, {
@@ -71,6 +203,13 @@ export class AgentWebSocketServer {
       agentId: "server",
       data: { message: `Connected with ID: ${id}` }
     });
+    if (this.cameraConfigs.size > 0) {
+      this.sendToConnection(connection, {
+        type: "info",
+        agentId: "server",
+        data: { camera: Object.fromEntries(this.cameraConfigs) }
+      });
+    }
   }
   
   private generateUniqueId(): string {
@@ -81,12 +220,14 @@ export class AgentWebSocketServer {
     try {
       connection.lastActivity = Date.now();
       this.connections.set(connection.id, connection);
+      this.counters.messagesReceived++;
       
       const messageStr = message.toString();
       const data = JSON.parse(messageStr) as AgentMessage;
       
       const validationResult = this.validator.validate(data);
       if (!validationResult.valid) {
+        this.counters.invalidMessages++;
         this.sendToConnection(connection, {
           type: "error",
           agentId: "server",
@@ -95,9 +236,19 @@ export class AgentWebSocketServer {
         return;
       }
 
-      if (data.agentId && !connection.agentId) {
-        connection.agentId = data.agentId;
-        this.connections.set(connection.id, connection);
+      this.inferRole(connection, data);
+
+      const batch = this.expandBatch(data);
+      if (batch) {
+        for (const entry of batch) {
+          this.bindAgent(connection, entry.agentId);
+        }
+        await Promise.all(batch.map((entry) => this.processMessage(entry, ws, connection)));
+        return;
+      }
+
+      if (data.agentId && data.agentId !== "*" && (connection.role === "trainer" || connection.agentIds.size === 0)) {
+        this.bindAgent(connection, data.agentId);
       }
 
       await this.processMessage(data, ws, connection);
@@ -111,13 +262,404 @@ export class AgentWebSocketServer {
     }
   }
   
+  private async handleBinaryMessage(message: Buffer, ws: WebSocket, connection: WebSocketConnection) {
+    try {
+      connection.lastActivity = Date.now();
+      this.counters.binaryFramesReceived++;
+
+      if (message.byteLength > 0 && message[0] === BinaryKind.Frame) {
+        this.relayCameraFrames(message, connection);
+        return;
+      }
+
+      const validationResult = this.validator.validateBinary(message, connection.binaryAgents.length);
+      if (!validationResult.valid) {
+        this.counters.invalidMessages++;
+        this.sendToConnection(connection, {
+          type: "error",
+          agentId: "server",
+          data: { error: `Invalid binary frame: ${validationResult.errors.join(', ')}` }
+        });
+        return;
+      }
+
+      const messages: AgentMessage[] = decodeBinaryRecords(message).map((record) => ({
+        type: record.type,
+        agentId: connection.binaryAgents[record.agentIndex],
+        data: record.data,
+        seq: record.seq,
+      }));
+      for (const entry of messages) {
+        this.inferRole(connection, entry);
+        this.bindAgent(connection, entry.agentId);
+      }
+      await Promise.all(messages.map((entry) => this.processMessage(entry, ws, connection)));
+    } catch (error) {
+      console.error("Failed to process binary message:", error);
+      this.sendToConnection(connection, {
+        type: "error",
+        agentId: "server",
+        data: { error: `Failed to process message: ${error}` }
+      });
+    }
+  }
+
+  /**
+   * Switches a connection to the binary protocol for the announced agents.
+   * The acknowledgement lists the agents in index order; indices of agents
+   * announced earlier on the same connection are kept.
+   */
+  private negotiateProtocol(connection: WebSocketConnection, agents: unknown, seq?: number) {
+    if (Array.isArray(agents)) {
+      for (const agentId of agents) {
+        if (typeof agentId === "string" && !connection.binaryIndex.has(agentId)) {
+          connection.binaryIndex.set(agentId, connection.binaryAgents.length);
+          connection.binaryAgents.push(agentId);
+        }
+        if (typeof agentId === "string") {
+          this.claimTrainer(connection);
+          this.bindAgent(connection, agentId);
+        }
+      }
+    }
+    connection.binary = true;
+    this.sendToConnection(connection, {
+      type: "info",
+      agentId: "server",
+      data: { protocol: BINARY_PROTOCOL, agents: connection.binaryAgents, delta: connection.delta },
+      seq,
+    });
+  }
+
+  /**
+   * Subscribes a connection to the camera frames of agents.
+   * Each camera gets a stream index, forwarded to the scene with its
+   * configuration; the acknowledgement lists the connection's agents in the
+   * index order its frames are addressed with.
+   */
+  private subscribeCameras(connection: WebSocketConnection, cameras: unknown, seq?: number) {
+    const accepted: string[] = [];
+    const announced: Record<string, CameraConfig> = {};
+    if (cameras && typeof cameras === "object") {
+      for (const [agentId, value] of Object.entries(cameras as Record<string, Partial<CameraConfig>>)) {
+        const config: CameraConfig = {
+          width: Number(value?.width ?? 84),
+          height: Number(value?.height ?? 84),
+          channels: Number(value?.channels ?? 3),
+          every: Number(value?.every ?? 1),
+        };
+        const valid =
+          [config.width, config.height].every((size) => Number.isInteger(size) && size > 0 && size <= 0xffff) &&
+          [1, 3, 4].includes(config.channels) &&
+          Number.isInteger(config.every) && config.every >= 1;
+        if (!valid) {
+          continue;
+        }
+        if (!connection.binaryIndex.has(agentId)) {
+          connection.binaryIndex.set(agentId, connection.binaryAgents.length);
+          connection.binaryAgents.push(agentId);
+        }
+        if (!this.cameraStreams.includes(agentId)) {
+          this.cameraStreams.push(agentId);
+        }
+        config.index = this.cameraStreams.indexOf(agentId);
+        this.cameraConfigs.set(agentId, config);
+        connection.cameras.add(agentId);
+        this.claimTrainer(connection);
+        this.bindAgent(connection, agentId);
+        announced[agentId] = config;
+        accepted.push(agentId);
+      }
+    }
+    this.sendToConnection(connection, {
+      type: "info",
+      agentId: "server",
+      data: { camera: accepted, agents: connection.binaryAgents },
+      seq,
+    });
+    if (accepted.length > 0) {
+      this.sendToRoles({ type: "info", agentId: "server", data: { camera: announced } }, ["scene", "viewer"], connection.ws);
+    }
+  }
+
+  /**
+   * Forwards camera frames sent by the scene, addressed by stream index, to
+   * the connections subscribed to them. Frames are only re-addressed, never
+   * decoded to pixels.
+   */
+  private relayCameraFrames(message: Buffer, source: WebSocketConnection) {
+    const validationResult = this.validator.validateBinary(message, this.cameraStreams.length);
+    if (!validationResult.valid) {
+      this.counters.invalidMessages++;
+      this.sendToConnection(source, {
+        type: "error",
+        agentId: "server",
+        data: { error: `Invalid camera frame: ${validationResult.errors.join(', ')}` }
+      });
+      return;
+    }
+    for (const frame of decodeCameraFrames(message)) {
+      const agentId = this.cameraStreams[frame.agentIndex];
+      const config = this.cameraConfigs.get(agentId);
+      if (!config || frame.width !== config.width || frame.height !== config.height || frame.channels !== config.channels) {
+        this.counters.invalidMessages++;
+        continue;
+      }
+      this.counters.cameraFrames++;
+      this.sendCameraFrame(agentId, frame.frame, frame.pixels);
+    }
+  }
+
+  /**
+   * Gives a connection the role its first message implies, unless it
+   * announced one: actions, resets, snapshots and restores carrying a
+   * sequence number come from trainers, states from scenes. Requests
+   * without one, such as the named actions a scene sends on click, imply
+   * nothing, so they never take an agent away from its trainer.
+   */
+  private inferRole(connection: WebSocketConnection, message: AgentMessage) {
+    if (connection.role) {
+      return;
+    }
+    const request = ["action", "reset", "snapshot", "restore"].includes(message.type);
+    if (request && this.carriesSeq(message)) {
+      connection.role = "trainer";
+    } else if (message.type === "state") {
+      connection.role = "scene";
+    }
+  }
+
+  private carriesSeq(message: AgentMessage): boolean {
+    if (message.seq !== undefined) {
+      return true;
+    }
+    const batch = message.data?.batch as BatchEntry[] | undefined;
+    return Array.isArray(batch) && batch.some((entry) => entry.seq !== undefined);
+  }
+
+  /**
+   * Makes a connection that negotiates on behalf of agents (protocol,
+   * cameras, resume) a trainer, unless it announced another role.
+   */
+  private claimTrainer(connection: WebSocketConnection) {
+    if (!connection.role) {
+      connection.role = "trainer";
+    }
+  }
+
+  private roleOf(connection: WebSocketConnection): ConnectionRole {
+    return connection.role ?? "viewer";
+  }
+
+  /**
+   * Records that a connection works with an agent. Trainer connections
+   * become the agent's owner, replacing a previous owner.
+   */
+  private bindAgent(connection: WebSocketConnection, agentId: string) {
+    connection.agentIds.add(agentId);
+    if (connection.role === "trainer") {
+      this.owners.set(agentId, connection);
+    }
+  }
+
+  private announceRole(connection: WebSocketConnection, role: unknown, seq?: number) {
+    if (CONNECTION_ROLES.includes(role as ConnectionRole)) {
+      connection.role = role as ConnectionRole;
+      if (connection.role === "trainer") {
+        connection.agentIds.forEach((agentId) => this.owners.set(agentId, connection));
+      } else {
+        this.releaseAgents(connection);
+      }
+    }
+    this.sendToConnection(connection, {
+      type: "info",
+      agentId: "server",
+      data: { role: this.roleOf(connection) },
+      seq,
+    });
+  }
+
+  /**
+   * Removes a connection from the owner index.
+   */
+  private releaseAgents(connection: WebSocketConnection) {
+    connection.agentIds.forEach((agentId) => {
+      if (this.owners.get(agentId) === connection) {
+        this.owners.delete(agentId);
+      }
+    });
+  }
+
+  /**
+   * Routes a state update: the owning trainer gets it right away, with its
+   * sequence number, and viewers get it coalesced at the viewer rate.
+   * Scenes and other trainers do not get it.
+   */
+  private publishState(message: AgentMessage, exclude?: WebSocket) {
+    const owner = this.owners.get(message.agentId);
+    if (owner && owner.ws !== exclude) {
+      this.sendToConnection(owner, message);
+    }
+    const { seq: _, ...update } = message;
+    if (this.viewerInterval <= 0) {
+      this.sendToRoles(update, ["viewer"], exclude);
+      return;
+    }
+    const pending = this.viewerUpdates.get(message.agentId);
+    if (pending) {
+      this.counters.coalescedUpdates++;
+      // Viewers may hold delta baselines, so partial updates accumulate
+      update.data = { ...pending.data, ...update.data };
+    }
+    this.viewerUpdates.set(message.agentId, update);
+    if (!this.viewerTimer) {
+      this.viewerTimer = setTimeout(() => this.flushViewerUpdates(), this.viewerInterval);
+    }
+  }
+
+  private flushViewerUpdates() {
+    this.viewerTimer = null;
+    const updates = Array.from(this.viewerUpdates.values());
+    this.viewerUpdates.clear();
+    for (const update of updates) {
+      this.sendToRoles(update, ["viewer"]);
+    }
+  }
+
+  /**
+   * Sends a message to every connection with one of the given roles,
+   * serializing it once for all recipients that take plain JSON.
+   */
+  private sendToRoles(message: AgentMessage, roles: ConnectionRole[], exclude?: WebSocket) {
+    let messageStr: string | null = null;
+    let fanOut = 0;
+    this.connections.forEach((connection) => {
+      const { ws } = connection;
+      if (ws === exclude || ws.readyState !== WebSocket.OPEN || !roles.includes(this.roleOf(connection))) {
+        return;
+      }
+      try {
+        const payload = this.encodeForConnection(connection, message) ?? (messageStr ??= JSON.stringify(message));
+        ws.send(payload);
+        this.countSent(connection, payload);
+        fanOut++;
+      } catch (error) {
+        this.counters.sendErrors++;
+        console.error(`Error sending message to connection ${connection.id}:`, error);
+      }
+    });
+    this.counters.broadcasts++;
+    this.counters.lastFanOut = fanOut;
+    this.counters.maxFanOut = Math.max(this.counters.maxFanOut, fanOut);
+  }
+
+  /**
+   * Encodes a message for connections that negotiated binary frames or
+   * delta-encoded states.
+   * Returns null when the message is sent as plain JSON.
+   */
+  private encodeForConnection(connection: WebSocketConnection, message: AgentMessage): Uint8Array | string | null {
+    if (connection.binary) {
+      const agentIndex = connection.binaryIndex.get(message.agentId);
+      if (agentIndex !== undefined && isBinaryEncodable(message.type, message.data)) {
+        return encodeBinaryRecords([{
+          type: message.type as "state" | "action" | "reset",
+          agentIndex,
+          seq: message.seq,
+          data: message.data,
+        }]);
+      }
+    }
+    if (connection.delta && message.type === "state" && message.data) {
+      return JSON.stringify(this.encodeDelta(connection, message));
+    }
+    return null;
+  }
+
+  /**
+   * Versions a state message against the connection's baseline of the agent.
+   * Only the changed fields are sent, except for the first message, every
+   * `keyframeInterval` messages and when every field changed.
+   */
+  private encodeDelta(connection: WebSocketConnection, message: AgentMessage): AgentMessage {
+    const baseline = connection.baselines.get(message.agentId);
+    const version = (baseline?.version ?? 0) + 1;
+    // States only ever gain fields, so partial updates merge into the baseline
+    const state = baseline ? { ...baseline.state, ...message.data } : message.data;
+    if (baseline && baseline.sinceKeyframe < this.keyframeInterval) {
+      const delta = diffState(baseline.state, message.data);
+      if (Object.keys(delta).length < Object.keys(state).length) {
+        connection.baselines.set(message.agentId, { version, state, sinceKeyframe: baseline.sinceKeyframe + 1 });
+        return { ...message, data: delta, version, delta: true };
+      }
+    }
+    connection.baselines.set(message.agentId, { version, state, sinceKeyframe: 0 });
+    return { ...message, data: state, version };
+  }
+
+  /**
+   * Makes the next state of an agent a keyframe on every connection, after
+   * its state was replaced rather than updated.
+   */
+  private forgetBaselines(agentId: string) {
+    this.connections.forEach((connection) => connection.baselines.delete(agentId));
+  }
+
+  /**
+   * Sends keyframes of the given agents to a connection that missed a delta.
+   */
+  private resyncAgents(connection: WebSocketConnection, agents: unknown) {
+    if (!Array.isArray(agents)) {
+      return;
+    }
+    this.counters.resyncRequests++;
+    for (const agentId of agents) {
+      const state = typeof agentId === "string" ? this.agents.get(agentId) : undefined;
+      if (state) {
+        connection.baselines.delete(agentId);
+        this.sendToConnection(connection, { type: "state", agentId, data: state });
+      }
+    }
+  }
+
+  /**
+   * Expands a batched frame into one message per agent.
+   * A batched frame carries `data.batch`, a list of `{ agentId, data }`
+   * entries that share the frame's type, so a trainer driving many agents
+   * over one connection can send all of them in a single frame.
+   */
+  private expandBatch(message: AgentMessage): AgentMessage[] | null {
+    const batch = message.data?.batch as BatchEntry[] | undefined;
+    if (!Array.isArray(batch)) {
+      return null;
+    }
+    return batch.map((entry) => ({
+      type: message.type,
+      agentId: entry.agentId,
+      data: entry.data || {},
+      seq: entry.seq,
+    }));
+  }
+
   private async processMessage(data: AgentMessage, ws: WebSocket, connection: WebSocketConnection) {
     switch (data.type) {
       case "action":
+        if (data.seq !== undefined) {
+          this.pendingSeq.set(data.agentId, data.seq);
+        }
         if (data.data && this.onAgentAction) {
+          // `repeat` applies the action for that many ticks; the scene's
+          // state updates are folded into a single reply
+          const { repeat, ...action } = data.data;
+          const ticks = Math.max(1, Math.floor(Number(repeat) || 1));
+          if (ticks > 1) {
+            this.actionRepeats.set(data.agentId, { action, remaining: ticks - 1, reward: 0 });
+          } else {
+            this.actionRepeats.delete(data.agentId);
+          }
           await Promise.resolve(this.onAgentAction({
             agentId: data.agentId,
-            ...data.data,
+            ...action,
           }));
         }
         break;
@@ -136,48 +678,215 @@ export class AgentWebSocketServer {
             ...data.data,
           };
           this.agents.set(data.agentId, newState);
-          await this.broadcast(data, ws);
+          // A scene's report answers the trainer's pending request
+          const seq = this.pendingSeq.get(data.agentId);
+          this.pendingSeq.delete(data.agentId);
+          this.publishState(seq !== undefined ? { ...data, seq } : data, ws);
         }
         break;
         
-      case "reset":
-        this.agents.set(data.agentId, {
+      case "reset": {
+        const resetState: AgentState = {
           position: [0, 0, 0],
           rotation: [0, 0, 0],
           action: "",
           reward: 0,
           done: false,
           ...data.data,
+        };
+        this.agents.set(data.agentId, resetState);
+        this.pendingSeq.delete(data.agentId);
+        this.actionRepeats.delete(data.agentId);
+        this.forgetBaselines(data.agentId);
+        this.viewerUpdates.delete(data.agentId);
+        this.sendToRoles(data, ["scene", "viewer"], ws);
+        this.sendToConnection(connection, {
+          type: "state",
+          agentId: data.agentId,
+          data: resetState,
+          seq: data.seq,
+        });
+        break;
+      }
+
+      case "snapshot": {
+        const stored = this.agents.get(data.agentId);
+        const extra = this.onAgentSnapshot ? await Promise.resolve(this.onAgentSnapshot(data.agentId)) : undefined;
+        this.sendToConnection(connection, {
+          type: "snapshot",
+          agentId: data.agentId,
+          data: { state: stored || extra ? { ...stored, ...extra } : null },
+          seq: data.seq,
+        });
+        break;
+      }
+
+      case "restore": {
+        const saved = data.data?.state;
+        if (!saved || typeof saved !== "object" || Array.isArray(saved)) {
+          // Batch entries are not checked by the validator
+          this.sendToConnection(connection, {
+            type: "error",
+            agentId: data.agentId,
+            data: { error: "Restore must carry a 'state' object" },
+            seq: data.seq,
+          });
+          break;
+        }
+        const restoredState: AgentState = {
+          position: [0, 0, 0],
+          rotation: [0, 0, 0],
+          action: "",
+          reward: 0,
+          ...(saved as Partial<AgentState>),
+          done: false,
+        };
+        this.agents.set(data.agentId, restoredState);
+        this.pendingSeq.delete(data.agentId);
+        this.actionRepeats.delete(data.agentId);
+        this.forgetBaselines(data.agentId);
+        this.viewerUpdates.delete(data.agentId);
+        if (this.onAgentRestore) {
+          await Promise.resolve(this.onAgentRestore(data.agentId, restoredState));
+        }
+        this.sendToRoles({ type: "restore", agentId: data.agentId, data: { state: restoredState } }, ["scene", "viewer"], ws);
+        this.sendToConnection(connection, {
+          type: "state",
+          agentId: data.agentId,
+          data: this.agents.get(data.agentId) || restoredState,
+          seq: data.seq,
         });
-        await this.broadcast(data, ws);
         break;
+      }
         
       case "info":
+        if (data.data?.keepalive) {
+          break;
+        }
+        if (data.data?.role) {
+          this.announceRole(connection, data.data.role, data.seq);
+          break;
+        }
+        if (data.data?.resume) {
+          this.resumeAgents(connection, data.data.agents, data.seq);
+          break;
+        }
+        if (data.data?.resync) {
+          this.resyncAgents(connection, data.data.resync);
+          break;
+        }
+        if (data.data?.camera) {
+          this.subscribeCameras(connection, data.data.camera, data.seq);
+          break;
+        }
+        if (data.data?.delta) {
+          connection.delta = true;
+        }
+        if (data.data?.protocol === BINARY_PROTOCOL) {
+          this.negotiateProtocol(connection, data.data.agents, data.seq);
+          break;
+        }
+        if (data.data?.delta) {
+          this.sendToConnection(connection, {
+            type: "info",
+            agentId: "server",
+            data: { protocol: "json", delta: true },
+            seq: data.seq,
+          });
+          break;
+        }
         this.sendToConnection(connection, {
           type: "info",
           agentId: "server",
-          data: { message: "Information received" }
+          data: { message: "Information received" },
+          seq: data.seq,
         });
         break;
     }
   }
   
-  private handleClose(ws: WebSocket) {
-    const connection = this.findConnectionByWs(ws);
-
-    if (connection) {
-      this.connections.delete(connection.id);
+  private handleClose(connection: WebSocketConnection) {
+    if (this.connections.delete(connection.id)) {
       console.log(`Client disconnected: ${connection.id}`);
+      this.releaseAgents(connection);
+      this.detachAgents(connection);
+    }
+  }
 
-      if (connection.agentId) {
-        this.agents.delete(connection.agentId);
-        this.broadcast({
-          type: "info",
-          agentId: "server",
-          data: { agentDisconnected: connection.agentId }
-        });
+  /**
+   * Keeps the state of a closed connection's agents for the resume grace
+   * period, so a trainer that reconnects can carry on with its episodes.
+   */
+  private detachAgents(connection: WebSocketConnection) {
+    connection.agentIds.forEach((agentId) => {
+      if (this.isAgentBound(agentId)) {
+        return;
+      }
+      if (this.resumeGracePeriod <= 0) {
+        this.removeAgent(agentId);
+        return;
+      }
+      const existing = this.detachedAgents.get(agentId);
+      if (existing) {
+        clearTimeout(existing);
+      }
+      this.detachedAgents.set(agentId, setTimeout(() => this.removeAgent(agentId), this.resumeGracePeriod));
+    });
+  }
+
+  private isAgentBound(agentId: string): boolean {
+    return this.owners.has(agentId);
+  }
+
+  private removeAgent(agentId: string) {
+    const timer = this.detachedAgents.get(agentId);
+    if (timer) {
+      clearTimeout(timer);
+      this.detachedAgents.delete(agentId);
+    }
+    this.agents.delete(agentId);
+    this.pendingSeq.delete(agentId);
+    this.actionRepeats.delete(agentId);
+    this.forgetBaselines(agentId);
+    this.viewerUpdates.delete(agentId);
+    this.cameraConfigs.delete(agentId);
+    this.connections.forEach((connection) => connection.cameras.delete(agentId));
+    this.broadcast({
+      type: "info",
+      agentId: "server",
+      data: { agentDisconnected: agentId }
+    });
+  }
+
+  /**
+   * Re-binds agents to a reconnected trainer.
+   * Agents whose state is still known are resumed; the others are reported
+   * as lost so the trainer can truncate their episodes.
+   */
+  private resumeAgents(connection: WebSocketConnection, agents: unknown, seq?: number) {
+    const resumed: string[] = [];
+    const lost: string[] = [];
+    if (Array.isArray(agents)) {
+      for (const agentId of agents) {
+        if (typeof agentId !== "string") {
+          continue;
+        }
+        const timer = this.detachedAgents.get(agentId);
+        if (timer) {
+          clearTimeout(timer);
+          this.detachedAgents.delete(agentId);
+        }
+        this.claimTrainer(connection);
+        this.bindAgent(connection, agentId);
+        (this.agents.has(agentId) ? resumed : lost).push(agentId);
       }
     }
+    this.sendToConnection(connection, {
+      type: "info",
+      agentId: "server",
+      data: { resumed, lost },
+      seq,
+    });
   }
   
   private handleServerError(error: Error) {
@@ -188,15 +897,6 @@ export class AgentWebSocketServer {
     console.error(`Connection error for ${connection.id}:`, error);
   }
   
-  private findConnectionByWs(ws: WebSocket): WebSocketConnection | undefined {
-    for (const [_, conn] of this.connections.entries()) {
-      if (conn.ws === ws) {
-        return conn;
-      }
-    }
-    return undefined;
-  }
-  
   private startHeartbeatCheck() {
     if (this.heartbeatInterval) {
       clearInterval(this.heartbeatInterval);
@@ -211,13 +911,13 @@ export class AgentWebSocketServer {
           try {
             connection.ws.close(1000, "Connection timeout");
             this.connections.delete(id);
+            this.releaseAgents(connection);
             
-            if (connection.agentId) {
-              this.agents.delete(connection.agentId);
-            }
+            this.detachAgents(connection);
           } catch (e) {
             console.error(`Error closing timed out connection ${id}:`, e);
             this.connections.delete(id);
+            this.releaseAgents(connection);
           }
         } else {
           try {
@@ -233,28 +933,39 @@ export class AgentWebSocketServer {
   private sendToConnection(connection: WebSocketConnection, message: AgentMessage) {
     try {
       if (connection.ws.readyState === WebSocket.OPEN) {
-        connection.ws.send(JSON.stringify(message));
+        const payload = this.encodeForConnection(connection, message) ?? JSON.stringify(message);
+        connection.ws.send(payload);
+        this.countSent(connection, payload);
         return true;
       }
     } catch (error) {
+      this.counters.sendErrors++;
       console.error(`Error sending message to connection ${connection.id}:`, error);
     }
     return false;
   }
 
+  private countSent(connection: WebSocketConnection, payload: string | Uint8Array) {
+    this.counters.messagesSent++;
+    this.counters.bytesSent += typeof payload === "string" ? Buffer.byteLength(payload) : payload.byteLength;
+    if (connection.ws.bufferedAmount > this.counters.maxQueueDepth) {
+      this.counters.maxQueueDepth = connection.ws.bufferedAmount;
+    }
+  }
+
   public start(): boolean {
     try {
       const result = this.setupWebSocketServer();
       this.isRunning = result;
       
       if (result) {
-        console.log(`WebSocket server is running on port ${this.port}`);
+        console.log(`WebSocket server is running on ${this.describeAddress()}`);
       }
       
       return result;
     } catch (error) {
       console.error(
-        `Failed to start WebSocket server on port ${this.port}:`,
+        `Failed to start WebSocket server on ${this.describeAddress()}:`,
         error
       );
       this.isRunning = false;
@@ -262,6 +973,10 @@ export class AgentWebSocketServer {
     }
   }
 
+  private describeAddress(): string {
+    return this.socketPath ? `socket ${this.socketPath}` : `port ${this.port}`;
+  }
+
   public stop() {
     if (this.isRunning && this.server) {
       if (this.heartbeatInterval) {
@@ -285,8 +1000,25 @@ export class AgentWebSocketServer {
         }
       });
 
+      if (this.httpServer) {
+        this.httpServer.close();
+        this.httpServer = null;
+      }
+
+      this.detachedAgents.forEach((timer) => clearTimeout(timer));
+      this.detachedAgents.clear();
+      if (this.viewerTimer) {
+        clearTimeout(this.viewerTimer);
+        this.viewerTimer = null;
+      }
+      this.viewerUpdates.clear();
       this.connections.clear();
+      this.owners.clear();
       this.agents.clear();
+      this.pendingSeq.clear();
+      this.actionRepeats.clear();
+      this.cameraStreams = [];
+      this.cameraConfigs.clear();
       this.server = null;
 
       this.isRunning = false;
@@ -298,31 +1030,34 @@ export class AgentWebSocketServer {
     const messageStr = JSON.stringify(message);
     const promises: Promise<void>[] = [];
     
-    this.connections.forEach(({ ws }) => {
+    this.connections.forEach((connection) => {
+      const { ws } = connection;
       if (ws !== exclude && ws.readyState === WebSocket.OPEN) {
+        const payload = this.encodeForConnection(connection, message) ?? messageStr;
         promises.push(
           new Promise<void>((resolve) => {
-            ws.send(messageStr, (error) => {
+            ws.send(payload, (error) => {
               if (error) {
+                this.counters.sendErrors++;
                 console.error("Error broadcasting message:", error);
               }
               resolve();
             });
           })
         );
+        this.countSent(connection, payload);
       }
     });
     
+    this.counters.broadcasts++;
+    this.counters.lastFanOut = promises.length;
+    this.counters.maxFanOut = Math.max(this.counters.maxFanOut, promises.length);
     await Promise.all(promises);
   }
 
   public sendToAgent(agentId: string, message: AgentMessage): boolean {
-    for (const [_, connection] of this.connections.entries()) {
-      if (connection.agentId === agentId) {
-        return this.sendToConnection(connection, message);
-      }
-    }
-    return false;
+    const owner = this.owners.get(agentId);
+    return owner ? this.sendToConnection(owner, message) : false;
   }
 
   public async updateAgentState(agentId: string, state: Partial<AgentState>) {
@@ -337,24 +1072,75 @@ export class AgentWebSocketServer {
     const newState = { ...currentState, ...state };
     this.agents.set(agentId, newState);
 
+    const repeat = this.actionRepeats.get(agentId);
+    if (repeat) {
+      // Only this tick's report counts; the merged state holds the previous reward
+      repeat.reward += state.reward ?? 0;
+      if (repeat.remaining > 0 && !newState.done && this.onAgentAction) {
+        repeat.remaining--;
+        await Promise.resolve(this.onAgentAction({ agentId, ...repeat.action }));
+        return newState;
+      }
+      this.actionRepeats.delete(agentId);
+    }
+
     const stateMessage: AgentMessage = {
       type: "state",
       agentId,
-      data: newState,
+      data: repeat ? { ...newState, reward: repeat.reward } : newState,
+      seq: this.pendingSeq.get(agentId),
     };
+    this.pendingSeq.delete(agentId);
 
-    await this.broadcast(stateMessage);
-
-    const sent = this.sendToAgent(agentId, stateMessage);
-    if (!sent) {
+    if (!this.owners.has(agentId)) {
       console.log(
         `Could not send state update directly to agent ${agentId}. It might not be connected.`
       );
     }
+    this.publishState(stateMessage);
 
     return newState;
   }
 
+  /**
+   * Sends a camera frame of an agent to the connections subscribed to its
+   * camera, for scenes running in the server's process. `pixels` holds
+   * `height` rows of `width * channels` bytes, as configured by the
+   * subscription.
+   * Returns the number of connections the frame was sent to.
+   */
+  public sendCameraFrame(agentId: string, frame: number, pixels: Uint8Array): number {
+    const config = this.cameraConfigs.get(agentId);
+    if (!config) {
+      return 0;
+    }
+    let sent = 0;
+    this.connections.forEach((connection) => {
+      const agentIndex = connection.binaryIndex.get(agentId);
+      if (!connection.cameras.has(agentId) || agentIndex === undefined || connection.ws.readyState !== WebSocket.OPEN) {
+        return;
+      }
+      try {
+        const payload = encodeCameraFrame({ ...config, agentIndex, frame, pixels });
+        connection.ws.send(payload);
+        this.countSent(connection, payload);
+        sent++;
+      } catch (error) {
+        this.counters.sendErrors++;
+        console.error(`Error sending camera frame to connection ${connection.id}:`, error);
+      }
+    });
+    return sent;
+  }
+
+  /**
+   * Returns the camera subscriptions with their stream indices, for scenes
+   * running in the server's process.
+   */
+  public getCameraConfigs(): Map<string, CameraConfig> {
+    return new Map(this.cameraConfigs);
+  }
+
   public getAgentState(agentId: string): AgentState | undefined {
     return this.agents.get(agentId);
   }
@@ -363,6 +1149,24 @@ export class AgentWebSocketServer {
     this.onAgentAction = callback;
   }
 
+  /**
+   * Registers a hook answering `snapshot` requests, for scenes running in
+   * the server's process. The fields it returns, e.g. velocities the scene
+   * does not report in its states, are added to the agent's last state.
+   */
+  public onSnapshot(callback: (agentId: string) => Partial<AgentState> | void | Promise<Partial<AgentState> | void>) {
+    this.onAgentSnapshot = callback;
+  }
+
+  /**
+   * Registers a hook applying `restore` requests, for scenes running in the
+   * server's process. It runs before the trainer is sent the restored state,
+   * so it can put the scene back with `updateAgentState` first.
+   */
+  public onRestore(callback: (agentId: string, state: AgentState) => void | Promise<void>) {
+    this.onAgentRestore = callback;
+  }
+
   public isServerRunning(): boolean {
     return this.isRunning;
   }
@@ -370,13 +1174,72 @@ export class AgentWebSocketServer {
   public setConnectionTimeout(ms: number) {
     this.connectionTimeout = ms;
   }
+
+  /**
+   * Sets how long the state of a disconnected trainer's agents is kept for it
+   * to resume. 0 removes them as soon as the connection closes.
+   */
+  public setResumeGracePeriod(ms: number) {
+    this.resumeGracePeriod = ms;
+  }
+
+  /**
+   * Sets the minimum time between two state updates sent to viewers; states
+   * of an agent produced in between are coalesced into the latest one.
+   * 0 sends every state to viewers as it happens.
+   */
+  public setViewerInterval(ms: number) {
+    this.viewerInterval = ms;
+  }
+
+  /**
+   * Sets how many delta-encoded states of an agent are sent between two full
+   * keyframes on connections that negotiated delta encoding.
+   */
+  public setKeyframeInterval(messages: number) {
+    this.keyframeInterval = messages;
+  }
   
+  /**
+   * Returns the server's traffic counters, mirroring the metrics of the
+   * Python SDK.
+   */
+  public getMetrics(): ServerMetrics {
+    let queueDepth = 0;
+    let viewers = 0;
+    this.connections.forEach((connection) => {
+      queueDepth += connection.ws.bufferedAmount;
+      viewers += this.roleOf(connection) === "viewer" ? 1 : 0;
+    });
+    return {
+      ...this.counters,
+      connections: this.connections.size,
+      viewers,
+      agents: this.agents.size,
+      queueDepth,
+    };
+  }
+
+  /**
+   * Formats the server's metrics in the Prometheus text exposition format.
+   */
+  public getPrometheusMetrics(prefix: string = "r3f_server"): string {
+    const metrics = this.getMetrics();
+    const gauges = new Set(["connections", "viewers", "agents", "lastFanOut", "maxFanOut", "queueDepth", "maxQueueDepth"]);
+    return Object.entries(metrics)
+      .map(([key, value]) => {
+        const name = `${prefix}_${key.replace(/[A-Z]/g, (c) => `_${c.toLowerCase()}`)}`;
+        const type = gauges.has(key) ? "gauge" : "counter";
+        const suffix = type === "counter" ? "_total" : "";
+        return `# TYPE ${name}${suffix} ${type}\n${name}${suffix} ${value}\n`;
+      })
+      .join("");
+  }
+
   public getConnectedAgents(): string[] {
     const agents = [];
     for (const [_, connection] of this.connections.entries()) {
-      if (connection.agentId) {
-        agents.push(connection.agentId);
-      }
+      agents.push(...connection.agentIds);
     }
     return agents;
   }
@@ -1,11 +1,12 @@
 import type { AgentState } from './agent.types'
 
-export type MessageType = 'state' | 'action' | 'reset' | 'info' | 'error' | 'connection'
+export type MessageType = 'state' | 'action' | 'reset' | 'snapshot' | 'restore' | 'info' | 'error' | 'connection'
 
 export interface BaseMessage {
   type: MessageType
   agentId: string
   data: Record<string, unknown>
+  seq?: number
 }
 
 export interface StateMessage extends BaseMessage {
@@ -19,6 +20,14 @@ export interface StateMessage extends BaseMessage {
   }
 }
 
+/** Sent to scenes when a trainer puts an agent back into a saved state */
+export interface RestoreMessage extends BaseMessage {
+  type: 'restore'
+  data: {
+    state: StateMessage['data'] & Record<string, unknown>
+  }
+}
+
 export interface ConnectionStatus {
   type: 'connection'
   id: string
@@ -26,12 +35,29 @@ export interface ConnectionStatus {
   error?: string
 }
 
-export type WebSocketMessage = StateMessage | ConnectionStatus
+export type WebSocketMessage = StateMessage | RestoreMessage | ConnectionStatus
 
 export interface AgentMessage {
   type: MessageType
   agentId: string
   data: Partial<AgentState>
+  seq?: number
+  version?: number
+  delta?: boolean
+}
+
+export interface BatchEntry {
+  agentId: string
+  data?: Partial<AgentState>
+  seq?: number
+}
+
+export interface BatchMessage {
+  type: MessageType
+  agentId: string
+  data: {
+    batch: BatchEntry[]
+  }
 }
 
 export type ConnectionMessage = ConnectionStatus 
\ No newline at end of file
@@ -1,4 +1,5 @@
 import type { AgentMessage } from "../core/AgentConnection";
+import { BINARY_HEADER_SIZE, BinaryKind, binaryRecordSize } from "./binaryProtocol";
 
 interface ValidationResult {
   valid: boolean;
@@ -35,12 +36,12 @@ export class MessageValidator {
 
     if (
       message.type &&
-      !["state", "action", "reset", "info", "error"].includes(message.type)
+      !["state", "action", "reset", "snapshot", "restore", "info", "error"].includes(message.type)
     ) {
       errors.push(
         `Invalid message type: ${
           message.type
-        }. Must be one of: state, action, reset, info, error`
+        }. Must be one of: state, action, reset, snapshot, restore, info, error`
       );
     }
 
@@ -52,6 +53,26 @@ export class MessageValidator {
       errors.push("Data must be an object");
     }
 
+    if ("seq" in message && !this.isValidSeq(message.seq)) {
+      errors.push("Sequence number must be a non-negative integer");
+    }
+
+    if (message.data && "batch" in message.data) {
+      if (!Array.isArray(message.data.batch)) {
+        errors.push("Batch must be an array");
+      } else {
+        message.data.batch.forEach((entry: any, index: number) => {
+          if (!entry || typeof entry.agentId !== "string") {
+            errors.push(`Batch entry ${index} must have a string 'agentId'`);
+          } else if (entry.data !== undefined && typeof entry.data !== "object") {
+            errors.push(`Batch entry ${index} data must be an object`);
+          } else if ("seq" in entry && !this.isValidSeq(entry.seq)) {
+            errors.push(`Batch entry ${index} sequence number must be a non-negative integer`);
+          }
+        });
+      }
+    }
+
     if (message.type === "state" && message.data) {
       if (message.data.position && !this.isValidPosition(message.data.position)) {
         errors.push("Position must be an array of 3 numbers");
@@ -62,6 +83,64 @@ export class MessageValidator {
       }
     }
 
+    if (message.type === "restore" && message.data && !("batch" in message.data)) {
+      const state = message.data.state;
+      if (!state || typeof state !== "object" || Array.isArray(state)) {
+        errors.push("Restore must carry a 'state' object");
+      } else if (state.position && !this.isValidPosition(state.position)) {
+        errors.push("Position must be an array of 3 numbers");
+      }
+    }
+
+    return {
+      valid: errors.length === 0,
+      errors,
+    };
+  }
+
+  /**
+   * Validates the record layout of a binary frame
+   * @param frame The binary frame to validate
+   * @param agentCount Number of agents negotiated on the connection
+   * @returns Validation result with errors if any
+   */
+  validateBinary(frame: ArrayBufferView, agentCount: number): ValidationResult {
+    const errors: string[] = [];
+    const view = new DataView(frame.buffer, frame.byteOffset, frame.byteLength);
+    let offset = 0;
+
+    if (agentCount === 0) {
+      return {
+        valid: false,
+        errors: ["Binary protocol was not negotiated on this connection"],
+      };
+    }
+
+    while (offset < view.byteLength && errors.length === 0) {
+      if (view.byteLength - offset < BINARY_HEADER_SIZE) {
+        errors.push(`Truncated record header at byte ${offset}`);
+        break;
+      }
+      const kind = view.getUint8(offset);
+      const agentIndex = view.getUint16(offset + 2, true);
+      const size = binaryRecordSize(view, offset);
+
+      if (!(kind in BinaryKind)) {
+        errors.push(`Invalid record kind: ${kind}`);
+      }
+      if (agentIndex >= agentCount) {
+        errors.push(`Unknown agent index: ${agentIndex}`);
+      }
+      if (size < 0) {
+        errors.push(`Truncated record header at byte ${offset}`);
+        break;
+      }
+      offset += size;
+      if (offset > view.byteLength) {
+        errors.push("Truncated record payload");
+      }
+    }
+
     return {
       valid: errors.length === 0,
       errors,
@@ -89,4 +168,11 @@ export class MessageValidator {
       rotation.every((val) => typeof val === "number")
     );
   }
-} 
\ No newline at end of file
+
+  /**
+   * Checks if a value is a valid request sequence number
+   */
+  private isValidSeq(seq: any): boolean {
+    return Number.isInteger(seq) && seq >= 0;
+  }
+}
@@ -0,0 +1,293 @@
+import type { AgentState } from '../types/agent.types'
+
+/**
+ * Compact binary wire format, negotiated per connection with an `info`
+ * message `{ protocol: 'binary', agents: [...] }`.
+ *
+ * A binary frame holds one or more records. Each record is a 12-byte
+ * little-endian header (kind u8, flags u8, agent index u16, seq u32,
+ * count u16, repeat u16) followed by `count` float32 values.
+ * State payloads are `position[3], rotation[3], reward, done`; action
+ * payloads hold `position[3]` and/or `rotation[3]` as announced by the flags.
+ * `repeat` is the number of ticks an action is applied for, 0 when absent.
+ *
+ * Camera frame records reuse the header with `seq` holding the frame number
+ * and `count` 0, followed by an 8-byte frame header (width u16, height u16,
+ * channels u8, 3 reserved bytes) and `width * height * channels` uint8 pixels,
+ * rows top to bottom.
+ */
+export const BINARY_PROTOCOL = 'binary'
+
+export const BINARY_HEADER_SIZE = 12
+export const BINARY_FRAME_HEADER_SIZE = 8
+export const BINARY_STATE_SIZE = 8
+export const BINARY_NO_SEQ = 0xffffffff
+
+export enum BinaryKind {
+  State = 1,
+  Action = 2,
+  Reset = 3,
+  Frame = 4
+}
+
+export const BINARY_FLAG_POSITION = 0x01
+export const BINARY_FLAG_ROTATION = 0x02
+export const BINARY_FLAG_DONE = 0x04
+
+const KIND_BY_TYPE: Record<string, BinaryKind> = {
+  state: BinaryKind.State,
+  action: BinaryKind.Action,
+  reset: BinaryKind.Reset
+}
+
+const TYPE_BY_KIND: Record<number, 'state' | 'action' | 'reset'> = {
+  [BinaryKind.State]: 'state',
+  [BinaryKind.Action]: 'action',
+  [BinaryKind.Reset]: 'reset'
+}
+
+const STATE_KEYS = new Set(['position', 'rotation', 'reward', 'done', 'action'])
+const ACTION_KEYS = new Set(['position', 'rotation', 'repeat'])
+
+export interface BinaryRecord {
+  type: 'state' | 'action' | 'reset'
+  agentIndex: number
+  seq?: number
+  data: Partial<AgentState>
+}
+
+/**
+ * Camera subscription of an agent, sent by trainers in an `info` message
+ * `{ camera: { [agentId]: CameraConfig } }`. The server forwards it to the
+ * scene with the `index` its frames must be addressed with.
+ */
+export interface CameraConfig {
+  width: number
+  height: number
+  /** 1 for depth, 3 for RGB, 4 for RGBA */
+  channels: number
+  /** Scene ticks between two frames */
+  every: number
+  index?: number
+}
+
+export interface CameraFrame {
+  agentIndex: number
+  frame: number
+  width: number
+  height: number
+  channels: number
+  pixels: Uint8Array
+}
+
+const toBytes = (frame: ArrayBuffer | ArrayBufferView): Uint8Array =>
+  frame instanceof ArrayBuffer
+    ? new Uint8Array(frame)
+    : new Uint8Array(frame.buffer, frame.byteOffset, frame.byteLength)
+
+/**
+ * Returns whether a message payload can be expressed as a binary record.
+ */
+export const isBinaryEncodable = (type: string, data: Partial<AgentState>): boolean => {
+  if (!(type in KIND_BY_TYPE)) return false
+  const keys = Object.keys(data || {})
+  if (type === 'reset') return keys.length === 0
+  if (type === 'action') return keys.every((key) => ACTION_KEYS.has(key))
+  return keys.every((key) => STATE_KEYS.has(key))
+}
+
+/**
+ * Encodes records into one binary frame.
+ * Callers must check `isBinaryEncodable` first; unsupported fields are dropped.
+ */
+export const encodeBinaryRecords = (records: BinaryRecord[]): Uint8Array => {
+  const payloads = records.map((record) => {
+    const values: number[] = []
+    let flags = 0
+    let repeat = 0
+    if (record.type === 'state') {
+      const position = record.data.position || [0, 0, 0]
+      const rotation = record.data.rotation || [0, 0, 0]
+      values.push(...position, ...rotation, record.data.reward || 0, record.data.done ? 1 : 0)
+      flags = BINARY_FLAG_POSITION | BINARY_FLAG_ROTATION | (record.data.done ? BINARY_FLAG_DONE : 0)
+    } else if (record.type === 'action') {
+      if (record.data.position) {
+        values.push(...record.data.position)
+        flags |= BINARY_FLAG_POSITION
+      }
+      if (record.data.rotation) {
+        values.push(...record.data.rotation)
+        flags |= BINARY_FLAG_ROTATION
+      }
+      repeat = record.data.repeat || 0
+    }
+    return { record, values, flags, repeat }
+  })
+
+  const size = payloads.reduce((total, { values }) => total + BINARY_HEADER_SIZE + 4 * values.length, 0)
+  const bytes = new Uint8Array(size)
+  const view = new DataView(bytes.buffer)
+  let offset = 0
+
+  for (const { record, values, flags, repeat } of payloads) {
+    view.setUint8(offset, KIND_BY_TYPE[record.type])
+    view.setUint8(offset + 1, flags)
+    view.setUint16(offset + 2, record.agentIndex, true)
+    view.setUint32(offset + 4, record.seq ?? BINARY_NO_SEQ, true)
+    view.setUint16(offset + 8, values.length, true)
+    view.setUint16(offset + 10, repeat, true)
+    offset += BINARY_HEADER_SIZE
+    for (const value of values) {
+      view.setFloat32(offset, value, true)
+      offset += 4
+    }
+  }
+
+  return bytes
+}
+
+/**
+ * Returns the size in bytes of the record starting at `offset`, or -1 if its
+ * header is truncated.
+ */
+export const binaryRecordSize = (view: DataView, offset: number): number => {
+  if (view.byteLength - offset < BINARY_HEADER_SIZE) return -1
+  if (view.getUint8(offset) !== BinaryKind.Frame) {
+    return BINARY_HEADER_SIZE + 4 * view.getUint16(offset + 8, true)
+  }
+  if (view.byteLength - offset < BINARY_HEADER_SIZE + BINARY_FRAME_HEADER_SIZE) return -1
+  const header = offset + BINARY_HEADER_SIZE
+  const pixels = view.getUint16(header, true) * view.getUint16(header + 2, true) * view.getUint8(header + 4)
+  return BINARY_HEADER_SIZE + BINARY_FRAME_HEADER_SIZE + pixels
+}
+
+/**
+ * Encodes a camera frame as a single-record binary frame.
+ */
+export const encodeCameraFrame = (frame: CameraFrame): Uint8Array => {
+  const size = frame.width * frame.height * frame.channels
+  if (frame.pixels.byteLength !== size) {
+    throw new Error(`Camera frame holds ${frame.pixels.byteLength} bytes, expected ${size}`)
+  }
+  const bytes = new Uint8Array(BINARY_HEADER_SIZE + BINARY_FRAME_HEADER_SIZE + size)
+  const view = new DataView(bytes.buffer)
+  view.setUint8(0, BinaryKind.Frame)
+  view.setUint16(2, frame.agentIndex, true)
+  view.setUint32(4, frame.frame, true)
+  view.setUint16(BINARY_HEADER_SIZE, frame.width, true)
+  view.setUint16(BINARY_HEADER_SIZE + 2, frame.height, true)
+  view.setUint8(BINARY_HEADER_SIZE + 4, frame.channels)
+  bytes.set(frame.pixels, BINARY_HEADER_SIZE + BINARY_FRAME_HEADER_SIZE)
+  return bytes
+}
+
+/**
+ * Decodes the camera frame records of a binary frame. Pixels are views into
+ * the frame, not copies.
+ */
+export const decodeCameraFrames = (frame: ArrayBuffer | ArrayBufferView): CameraFrame[] => {
+  const bytes = toBytes(frame)
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength)
+  const frames: CameraFrame[] = []
+  let offset = 0
+
+  while (offset < bytes.byteLength) {
+    const size = binaryRecordSize(view, offset)
+    if (size < 0 || offset + size > bytes.byteLength) {
+      throw new Error(`Truncated record at byte ${offset}`)
+    }
+    if (view.getUint8(offset) === BinaryKind.Frame) {
+      const header = offset + BINARY_HEADER_SIZE
+      frames.push({
+        agentIndex: view.getUint16(offset + 2, true),
+        frame: view.getUint32(offset + 4, true),
+        width: view.getUint16(header, true),
+        height: view.getUint16(header + 2, true),
+        channels: view.getUint8(header + 4),
+        pixels: bytes.subarray(header + BINARY_FRAME_HEADER_SIZE, offset + size)
+      })
+    }
+    offset += size
+  }
+
+  return frames
+}
+
+/**
+ * Decodes a binary frame into records.
+ * Camera frame records are skipped, see `decodeCameraFrames`.
+ * @throws Error if the frame is truncated or holds an unknown record kind
+ */
+export const decodeBinaryRecords = (frame: ArrayBuffer | ArrayBufferView): BinaryRecord[] => {
+  const bytes = toBytes(frame)
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength)
+  const records: BinaryRecord[] = []
+  let offset = 0
+
+  while (offset < bytes.byteLength) {
+    if (bytes.byteLength - offset < BINARY_HEADER_SIZE) {
+      throw new Error(`Truncated record header at byte ${offset}`)
+    }
+    const kind = view.getUint8(offset)
+    const flags = view.getUint8(offset + 1)
+    const agentIndex = view.getUint16(offset + 2, true)
+    const seq = view.getUint32(offset + 4, true)
+    const count = view.getUint16(offset + 8, true)
+    const repeat = view.getUint16(offset + 10, true)
+    if (kind === BinaryKind.Frame) {
+      const size = binaryRecordSize(view, offset)
+      if (size < 0 || offset + size > bytes.byteLength) {
+        throw new Error(`Truncated camera frame at byte ${offset}`)
+      }
+      offset += size
+      continue
+    }
+    offset += BINARY_HEADER_SIZE
+
+    const type = TYPE_BY_KIND[kind]
+    if (!type) {
+      throw new Error(`Unknown record kind ${kind}`)
+    }
+    if (offset + 4 * count > bytes.byteLength) {
+      throw new Error(`Truncated record payload at byte ${offset}`)
+    }
+
+    const values: number[] = []
+    for (let i = 0; i < count; i++) {
+      values.push(view.getFloat32(offset + 4 * i, true))
+    }
+    offset += 4 * count
+
+    const data: Partial<AgentState> = {}
+    if (type === 'state') {
+      if (count < BINARY_STATE_SIZE) {
+        throw new Error(`State record holds ${count} values, expected ${BINARY_STATE_SIZE}`)
+      }
+      data.position = [values[0], values[1], values[2]]
+      data.rotation = [values[3], values[4], values[5]]
+      data.reward = values[6]
+      data.done = (flags & BINARY_FLAG_DONE) !== 0
+    } else if (type === 'action') {
+      let cursor = 0
+      if (flags & BINARY_FLAG_POSITION) {
+        data.position = [values[cursor], values[cursor + 1], values[cursor + 2]]
+        cursor += 3
+      }
+      if (flags & BINARY_FLAG_ROTATION) {
+        data.rotation = [values[cursor], values[cursor + 1], values[cursor + 2]]
+      }
+      if (repeat > 0) {
+        data.repeat = repeat
+      }
+    }
+
+    records.push({
+      type,
+      agentIndex,
+      seq: seq === BINARY_NO_SEQ ? undefined : seq,
+      data
+    })
+  }
+
+  return records
+}
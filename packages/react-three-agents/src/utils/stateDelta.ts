@@ -0,0 +1,51 @@
+import type { AgentState } from '../types/agent.types'
+
+/**
+ * Delta-encoded agent states, negotiated per connection with an `info`
+ * message carrying `delta: true`.
+ *
+ * State messages sent as JSON on such a connection carry a `version` that
+ * counts up per agent. Keyframes hold the full state and replace the
+ * receiver's baseline; messages flagged `delta` hold only the fields that
+ * changed and are merged into it. A receiver that misses a version asks for a
+ * keyframe with an `info` message `{ resync: [agentId, ...] }`.
+ */
+export const DEFAULT_KEYFRAME_INTERVAL = 100
+
+export interface StateBaseline {
+  version: number
+  state: Partial<AgentState>
+  sinceKeyframe: number
+}
+
+const sameValue = (a: unknown, b: unknown): boolean => {
+  if (a === b) return true
+  if (Array.isArray(a) && Array.isArray(b)) {
+    return a.length === b.length && a.every((value, index) => sameValue(value, b[index]))
+  }
+  if (a !== null && b !== null && typeof a === 'object' && typeof b === 'object') {
+    return JSON.stringify(a) === JSON.stringify(b)
+  }
+  return false
+}
+
+/**
+ * Returns the fields of `next` that differ from `previous`.
+ */
+export const diffState = (previous: Partial<AgentState>, next: Partial<AgentState>): Partial<AgentState> => {
+  const delta: Partial<AgentState> = {}
+  for (const key of Object.keys(next)) {
+    if (!(key in previous) || !sameValue(previous[key], next[key])) {
+      delta[key] = next[key]
+    }
+  }
+  return delta
+}
+
+/**
+ * Merges a delta into a baseline state without modifying either.
+ */
+export const applyStateDelta = (baseline: Partial<AgentState>, delta: Partial<AgentState>): Partial<AgentState> => ({
+  ...baseline,
+  ...delta
+})
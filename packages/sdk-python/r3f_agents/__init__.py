@@ -28,6 +28,51 @@ Example:
 __version__ = "0.2.0"
 __author__ = "delartificial"
 
-from .environment import R3FEnv
+from .actions import ActionEncoder
+from .camera import FrameRing
+from .connection import R3FConnection
+from .environment import R3FEnv, AsyncR3FEnv
+from .evaluation import EvaluationRunner, AsyncEvalCallback, EpisodeResult
+from .loop import BackgroundLoop, get_background_loop
+from .metrics import Metrics, LatencyHistogram
+from .observation import ObservationBuffer
+from .recorder import TrajectoryRecorder, TrajectoryReader
+from .rewards import TargetReward
+from .replay import R3FReplayEnv, R3FReplayVecEnv, ReplayBackend
+from .sharded import R3FShardedVecEnv
+from .vec_env import R3FVecEnv
+from .subproc import R3FSubprocVecEnv
+from .server import RelayServer
+from .sim import KinematicSimulator, SimulatorServer, HeadlessVecEnv
+from .transport import register_backend, unregister_backend
 
-__all__ = ["R3FEnv"] 
\ No newline at end of file
+__all__ = [
+    "R3FEnv",
+    "AsyncR3FEnv",
+    "R3FVecEnv",
+    "R3FSubprocVecEnv",
+    "R3FShardedVecEnv",
+    "HeadlessVecEnv",
+    "KinematicSimulator",
+    "SimulatorServer",
+    "RelayServer",
+    "R3FConnection",
+    "ObservationBuffer",
+    "ActionEncoder",
+    "FrameRing",
+    "TrajectoryRecorder",
+    "TrajectoryReader",
+    "R3FReplayEnv",
+    "R3FReplayVecEnv",
+    "ReplayBackend",
+    "TargetReward",
+    "EvaluationRunner",
+    "AsyncEvalCallback",
+    "EpisodeResult",
+    "Metrics",
+    "LatencyHistogram",
+    "BackgroundLoop",
+    "get_background_loop",
+    "register_backend",
+    "unregister_backend",
+] 
\ No newline at end of file
@@ -0,0 +1,322 @@
+"""
+Declarative mapping from action spaces to ``action`` message payloads.
+
+An ``ActionEncoder`` compiles an action space once into lookup tables and
+column selections, then turns a whole batch of actions into wire payloads in
+one vectorized pass. Three channels of the server's ``AgentAction`` can be
+driven:
+
+- ``position``: movement direction ``[x, y, z]``;
+- ``rotation``: angular velocity ``[x, y, z]``, sent only by the actions that
+  map to one, so the others keep facing their direction of travel;
+- ``action``: a named action string handled by the scene, e.g. ``"jump"``.
+
+The mapping is given per action space:
+
+- ``Discrete(n)``: one entry per action index, as a list or as a dict from
+  index to entry, where an entry is a dict of channels, e.g.
+  ``{"position": [0, 0, -1]}`` or ``{"action": "jump"}``. Indices without
+  an entry do nothing. Defaults to the four movement directions;
+- ``MultiDiscrete``: one such table per dimension. The positions and
+  rotations of the dimensions are summed and the last named action wins.
+  Defaults to moving along x, y and z, from -1 to 1, one axis per dimension;
+- ``Box``: the columns each channel is read from, e.g.
+  ``{"position": [0, 1, 2], "rotation": [3, 4, 5]}``. Defaults to the first
+  three columns for ``position`` and the next three, if any, for
+  ``rotation``. Boxes of another size are sent as ``position`` unchanged;
+- ``Dict``: one mapping per key, for its subspace. The parts are combined
+  like the dimensions of a MultiDiscrete space. A ``position`` or
+  ``rotation`` key holding a 3-vector Box drives that channel by default.
+
+Example:
+    ```python
+    env = R3FVecEnv(
+        num_agents=16,
+        action_space=spaces.Discrete(6),
+        action_mapping=[
+            {"position": [0, 0, -1]},
+            {"position": [0, 0, 1]},
+            {"rotation": [0, 1, 0]},
+            {"rotation": [0, -1, 0]},
+            {"action": "jump"},
+            {},
+        ],
+    )
+    ```
+"""
+import numpy as np
+from gymnasium import spaces
+from typing import Dict, Any, Optional, List, Sequence, Tuple, Union
+import logging
+
+logger = logging.getLogger("r3f_agents")
+
+# Channels of the server's AgentAction an action can drive
+ACTION_CHANNELS = ('position', 'rotation', 'action')
+
+# Movement direction of each discrete action in the default mapping
+DISCRETE_DIRECTIONS = np.array([
+    [0.0, 0.0, -1.0],
+    [0.0, 0.0, 1.0],
+    [-1.0, 0.0, 0.0],
+    [1.0, 0.0, 0.0],
+], dtype=np.float32)
+
+ActionMapping = Union[Sequence[Any], Dict[Any, Any]]
+# positions, rotations, rows sending a rotation, named actions ('' for none)
+Arrays = Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray]]
+
+
+def _vector(value: Any, channel: str) -> np.ndarray:
+    vector = np.asarray(value, dtype=np.float32)
+    if vector.shape != (3,):
+        raise ValueError(f"'{channel}' must be a 3-vector, got {value!r}")
+    return vector
+
+
+class _Table:
+    """Payload channels of every value of one discrete dimension."""
+
+    def __init__(self, n: int, start: int, mapping: Optional[ActionMapping]):
+        self.start = start
+        self.positions = np.zeros((n, 3), dtype=np.float32)
+        self.rotations = np.zeros((n, 3), dtype=np.float32)
+        self.rotated = np.zeros(n, dtype=bool)
+        names = [''] * n
+
+        if mapping is None:
+            count = min(n, len(DISCRETE_DIRECTIONS))
+            self.positions[:count] = DISCRETE_DIRECTIONS[:count]
+            entries = {}
+        elif isinstance(mapping, dict):
+            entries = mapping
+        else:
+            if len(mapping) != n:
+                raise ValueError(f"Expected {n} action entries, got {len(mapping)}")
+            entries = dict(enumerate(mapping))
+
+        for index, entry in entries.items():
+            if not 0 <= index < n:
+                raise ValueError(f"Action index {index} is out of range for {n} actions")
+            unknown = set(entry) - set(ACTION_CHANNELS)
+            if unknown:
+                raise ValueError(f"Unknown action channels {sorted(unknown)}, expected some of {ACTION_CHANNELS}")
+            if 'position' in entry:
+                self.positions[index] = _vector(entry['position'], 'position')
+            if 'rotation' in entry:
+                self.rotations[index] = _vector(entry['rotation'], 'rotation')
+                self.rotated[index] = True
+            if entry.get('action'):
+                names[index] = str(entry['action'])
+
+        self.names = np.array(names, dtype=object) if any(names) else None
+        if not self.rotated.any():
+            self.rotations = self.rotated = None
+
+    def arrays(self, indices: np.ndarray) -> Arrays:
+        indices = indices - self.start
+        return (
+            self.positions[indices],
+            None if self.rotations is None else self.rotations[indices],
+            None if self.rotated is None else self.rotated[indices],
+            None if self.names is None else self.names[indices],
+        )
+
+
+def _combine(parts: List[Arrays]) -> Arrays:
+    """Sum the movement of several parts and keep the last named action."""
+    positions = sum(part[0] for part in parts)
+    rotations = rotated = names = None
+    for _, part_rotations, part_rotated, part_names in parts:
+        if part_rotations is not None:
+            rotations = part_rotations if rotations is None else rotations + part_rotations
+            part_rotated = np.ones(len(part_rotations), dtype=bool) if part_rotated is None else part_rotated
+            rotated = part_rotated if rotated is None else rotated | part_rotated
+        if part_names is not None:
+            names = part_names if names is None else np.where(part_names != '', part_names, names)
+    return positions, rotations, rotated, names
+
+
+class ActionEncoder:
+    """
+    Action space compiled into batched ``action`` message payloads.
+
+    See the module docstring for the mapping each kind of space accepts.
+
+    Example:
+        ```python
+        encoder = ActionEncoder(spaces.Discrete(3), [
+            {'position': [0, 0, -1]},
+            {'rotation': [0, 1, 0]},
+            {'action': 'jump'},
+        ])
+        encoder.encode(2)                     # {'position': [0.0, 0.0, 0.0], 'action': 'jump'}
+        encoder.encode_batch(np.array([0, 1]))
+        ```
+    """
+
+    def __init__(self, action_space: spaces.Space, mapping: Optional[ActionMapping] = None):
+        """
+        Compile the action space.
+
+        Args:
+            action_space: Per-agent action space. Discrete, MultiDiscrete,
+                Box, or a Dict of those
+            mapping: How actions map to payload channels. Defaults to the
+                mapping described in the module docstring
+
+        Raises:
+            ValueError: If the space is not supported or the mapping does not
+                fit it
+        """
+        self.action_space = action_space
+        self.tables: List[_Table] = []
+        self.columns: Dict[str, np.ndarray] = {}
+        self.children: Dict[str, ActionEncoder] = {}
+        self.raw = False
+
+        if isinstance(action_space, spaces.Discrete):
+            self.tables.append(_Table(int(action_space.n), int(action_space.start), mapping))
+        elif isinstance(action_space, spaces.MultiDiscrete):
+            nvec = np.asarray(action_space.nvec).reshape(-1)
+            starts = np.asarray(getattr(action_space, 'start', np.zeros_like(nvec))).reshape(-1)
+            if mapping is None:
+                if len(nvec) > 3:
+                    raise ValueError(f"MultiDiscrete spaces of {len(nvec)} dimensions need an action mapping")
+                mapping = [self._axis_table(int(n), axis) for axis, n in enumerate(nvec)]
+            if len(mapping) != len(nvec):
+                raise ValueError(f"Expected one action table per dimension, got {len(mapping)} for {len(nvec)}")
+            self.tables = [_Table(int(n), int(start), table) for n, start, table in zip(nvec, starts, mapping)]
+        elif isinstance(action_space, spaces.Box):
+            size = int(np.prod(action_space.shape, dtype=np.int64))
+            if mapping is None:
+                if size not in (3, 6):
+                    self.raw = True
+                    mapping = {}
+                else:
+                    mapping = {'position': [0, 1, 2]}
+                    if size == 6:
+                        mapping['rotation'] = [3, 4, 5]
+            for channel, columns in mapping.items():
+                if channel not in ('position', 'rotation'):
+                    raise ValueError(f"Box actions can only drive 'position' and 'rotation', got '{channel}'")
+                columns = np.asarray(columns, dtype=np.int64)
+                if columns.shape != (3,) or columns.min() < 0 or columns.max() >= size:
+                    raise ValueError(f"'{channel}' needs 3 column indices below {size}, got {columns.tolist()}")
+                self.columns[channel] = columns
+            self.size = size
+        elif isinstance(action_space, spaces.Dict):
+            mapping = mapping or {}
+            unknown = set(mapping) - set(action_space.spaces)
+            if unknown:
+                raise ValueError(f"Action mapping has keys {sorted(unknown)} missing from the action space")
+            for key, space in action_space.spaces.items():
+                sub_mapping = mapping.get(key)
+                if sub_mapping is None and key in ('position', 'rotation') and isinstance(space, spaces.Box) \
+                        and int(np.prod(space.shape, dtype=np.int64)) == 3:
+                    sub_mapping = {key: [0, 1, 2]}
+                child = ActionEncoder(space, sub_mapping)
+                if child.raw:
+                    raise ValueError(f"Action space for key '{key}' needs an action mapping: {space}")
+                self.children[key] = child
+        else:
+            raise ValueError(f"Unsupported action space: {action_space}")
+
+    @staticmethod
+    def _axis_table(n: int, axis: int) -> List[Dict[str, List[float]]]:
+        """Entries moving along one axis, from -1 to 1 over ``n`` values."""
+        table = []
+        for value in np.linspace(-1.0, 1.0, n) if n > 1 else [0.0]:
+            position = [0.0, 0.0, 0.0]
+            position[axis] = float(value)
+            table.append({'position': position})
+        return table
+
+    def _single(self, action: Any) -> Any:
+        """Wrap one action into a batch of one."""
+        if self.children:
+            return {key: child._single(action[key]) for key, child in self.children.items()}
+        return np.asarray(action)[None]
+
+    def arrays(self, actions: Any) -> Arrays:
+        """
+        Decode a batch of actions into channel arrays.
+
+        Args:
+            actions: ``(N,)`` indices for a Discrete space, ``(N, d)`` arrays
+                for MultiDiscrete and Box spaces, and for a Dict space a dict
+                of such batches or a sequence of N dict actions
+
+        Returns:
+            positions ``(N, 3)``, rotations ``(N, 3)`` or None, a ``(N,)``
+            mask of the rows sending a rotation or None for all of them, and
+            the ``(N,)`` named actions, empty for none, or None
+        """
+        if self.children:
+            if not isinstance(actions, dict):
+                actions = {key: np.stack([action[key] for action in actions]) for key in self.children}
+            return _combine([child.arrays(actions[key]) for key, child in self.children.items()])
+        if self.tables:
+            indices = np.asarray(actions, dtype=np.int64).reshape(-1, len(self.tables))
+            if len(self.tables) == 1:
+                return self.tables[0].arrays(indices[:, 0])
+            return _combine([table.arrays(indices[:, d]) for d, table in enumerate(self.tables)])
+        actions = np.asarray(actions, dtype=np.float32).reshape(-1, self.size)
+        if self.raw:
+            return actions, None, None, None
+        position = self.columns.get('position')
+        rotation = self.columns.get('rotation')
+        positions = np.zeros((len(actions), 3), dtype=np.float32) if position is None else actions[:, position]
+        return positions, None if rotation is None else actions[:, rotation], None, None
+
+    def encode_batch(self, actions: Any) -> List[Dict[str, Any]]:
+        """
+        Convert a batch of actions into the payloads of ``action`` messages.
+
+        Args:
+            actions: Batch of actions, see ``arrays``
+
+        Returns:
+            The ``data`` field of each agent's action message
+        """
+        positions, rotations, rotated, names = self.arrays(actions)
+        payloads = [{'position': position} for position in positions.tolist()]
+        if rotations is not None:
+            rotation_list = rotations.tolist()
+            rows = range(len(payloads)) if rotated is None else np.flatnonzero(rotated).tolist()
+            for i in rows:
+                payloads[i]['rotation'] = rotation_list[i]
+        if names is not None:
+            for i in np.flatnonzero(names != '').tolist():
+                payloads[i]['action'] = names[i]
+        return payloads
+
+    def encode(self, action: Any) -> Dict[str, Any]:
+        """
+        Convert one action into the payload of an ``action`` message.
+
+        Args:
+            action: Action from the action space
+
+        Returns:
+            The ``data`` field of the action message
+        """
+        return self.encode_batch(self._single(action))[0]
+
+
+def encode_action(action: Union[np.ndarray, int]) -> Dict[str, Any]:
+    """
+    Convert an action into the payload of an ``action`` message, without an
+    action space to compile.
+
+    Args:
+        action: Either a continuous action [x, y, z] or a discrete action index
+
+    Returns:
+        The ``data`` field of the action message
+    """
+    if isinstance(action, (int, np.integer)):
+        if 0 <= action < len(DISCRETE_DIRECTIONS):
+            return {'position': DISCRETE_DIRECTIONS[action].tolist()}
+        return {'position': [0.0, 0.0, 0.0]}
+    return {'position': np.asarray(action, dtype=np.float32).tolist()}
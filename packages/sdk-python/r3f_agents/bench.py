@@ -0,0 +1,365 @@
+"""
+Throughput and latency benchmarks for the Python SDK.
+
+Runs R3FEnv and R3FVecEnv against the headless simulator server
+(``r3f_agents.sim``) started in a separate process, so the client-side
+cost is measured through the real connection code path. The suite sweeps
+agent counts, payload sizes and wire protocols and writes the results as
+JSON. Like any server, the simulator sends states with fields the binary
+record cannot hold, such as the sensor payload, as JSON even in binary mode,
+so every result reports the ``reply_protocol`` its replies actually used.
+Given a previous result file as ``--baseline``, it exits with status 1 when
+throughput or tail latency regressed beyond ``--tolerance``, or when replies
+fell back to another protocol than in the baseline.
+
+Example:
+    ```bash
+    python -m r3f_agents.bench --agents 1 16 64 --payload-sizes 0 256 --output bench.json
+    python -m r3f_agents.bench --baseline bench.json
+    ```
+"""
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import subprocess
+import multiprocessing
+import numpy as np
+from gymnasium import spaces
+from typing import Dict, Any, Optional, List, Sequence
+import websockets
+import logging
+
+from .environment import R3FEnv
+from .metrics import LatencyHistogram
+from .vec_env import R3FVecEnv
+
+logger = logging.getLogger("r3f_agents")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, latency: float = 0.0, payload_size: int = 0,
+                 broadcast: bool = False, timeout: float = 10.0) -> subprocess.Popen:
+    """
+    Start the simulator server in a child process and wait until it listens.
+
+    Args:
+        port: Port to listen on
+        latency: Seconds every reply is delayed by
+        payload_size: Extra sensor values in every state
+        broadcast: Broadcast states to viewer connections
+        timeout: Seconds to wait for the server to accept connections
+
+    Returns:
+        The server process
+
+    Raises:
+        RuntimeError: If the server does not come up in time
+    """
+    command = [
+        sys.executable, "-m", "r3f_agents.sim",
+        "--host", "127.0.0.1",
+        "--port", str(port),
+        "--latency", str(latency),
+        "--payload-size", str(payload_size),
+    ]
+    if broadcast:
+        command.append("--broadcast")
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"Simulator server did not start on port {port}")
+
+
+def _run_viewers(url: str, count: int) -> None:
+    """Keep ``count`` idle viewer connections open, discarding what they receive."""
+    async def viewer():
+        async with websockets.connect(url) as websocket:
+            async for _ in websocket:
+                pass
+
+    async def viewers():
+        await asyncio.gather(*(viewer() for _ in range(count)), return_exceptions=True)
+
+    asyncio.run(viewers())
+
+
+def observation_space(payload_size: int) -> spaces.Dict:
+    """Observation space matching the simulator's states."""
+    subspaces = {
+        'position': spaces.Box(low=-np.inf, high=np.inf, shape=(3,), dtype=np.float32),
+        'rotation': spaces.Box(low=-np.pi, high=np.pi, shape=(3,), dtype=np.float32),
+    }
+    if payload_size:
+        subspaces['sensors'] = spaces.Box(low=-np.inf, high=np.inf, shape=(payload_size,), dtype=np.float32)
+    return spaces.Dict(subspaces)
+
+
+def _summarize(name: str, num_agents: int, steps: int, elapsed: float, cpu: float,
+               histogram: LatencyHistogram, metrics_before: Dict[str, int], env) -> Dict[str, Any]:
+    counters = env.metrics.counters
+    transitions = steps * num_agents
+    wire_bytes = (counters['bytes_sent'] - metrics_before['bytes_sent']
+                  + counters['bytes_received'] - metrics_before['bytes_received'])
+    frames = counters['frames_received'] - metrics_before['frames_received']
+    binary_frames = counters['binary_frames_received'] - metrics_before['binary_frames_received']
+    if binary_frames == 0:
+        reply_protocol = 'json'
+    elif binary_frames == frames:
+        reply_protocol = 'binary'
+    else:
+        reply_protocol = 'mixed'
+    return {
+        'name': name,
+        'agents': num_agents,
+        'steps': steps,
+        'protocol': env.connection.protocol,
+        'reply_protocol': reply_protocol,
+        'steps_per_sec': steps / elapsed,
+        'agent_steps_per_sec': transitions / elapsed,
+        'latency': {
+            'mean': histogram.mean,
+            'p50': histogram.quantile(0.5),
+            'p99': histogram.quantile(0.99),
+            'p999': histogram.quantile(0.999),
+            'max': histogram.max,
+        },
+        'cpu_per_step': cpu / steps,
+        'bytes_per_transition': wire_bytes / transitions,
+        'timeouts': counters['timeouts'] - metrics_before['timeouts'],
+    }
+
+
+def bench_single(url: str, steps: int, protocol: str, payload_size: int, warmup: int = 50) -> Dict[str, Any]:
+    """
+    Measure one R3FEnv stepping a single agent.
+
+    Args:
+        url: Server URL
+        steps: Number of measured steps
+        protocol: Wire protocol to request
+        payload_size: Extra sensor values in every state
+        warmup: Unmeasured steps taken first
+
+    Returns:
+        The measurement
+    """
+    env = R3FEnv(url, agent_id=f"bench_single_{protocol}_{payload_size}",
+                 observation_space=observation_space(payload_size), protocol=protocol)
+    action = np.zeros(3, dtype=np.float32)
+    try:
+        env.reset()
+        for _ in range(warmup):
+            env.step(action)
+        histogram = LatencyHistogram()
+        before = dict(env.metrics.counters)
+        cpu_start, start = time.process_time(), time.perf_counter()
+        for _ in range(steps):
+            step_start = time.perf_counter()
+            env.step(action)
+            histogram.record(time.perf_counter() - step_start)
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        name = f"single/payload={payload_size}/protocol={protocol}"
+        return _summarize(name, 1, steps, elapsed, cpu, histogram, before, env)
+    finally:
+        env.close()
+
+
+def bench_vec(url: str, num_agents: int, steps: int, protocol: str, payload_size: int, warmup: int = 20) -> Dict[str, Any]:
+    """
+    Measure one R3FVecEnv stepping ``num_agents`` agents in batches.
+
+    Args:
+        url: Server URL
+        num_agents: Number of agents
+        steps: Number of measured batched steps
+        protocol: Wire protocol to request
+        payload_size: Extra sensor values in every state
+        warmup: Unmeasured steps taken first
+
+    Returns:
+        The measurement
+    """
+    agent_ids = [f"bench_vec_{protocol}_{payload_size}_{num_agents}_{i}" for i in range(num_agents)]
+    env = R3FVecEnv(url, agent_ids=agent_ids, observation_space=observation_space(payload_size),
+                    protocol=protocol, max_episode_steps=10 ** 9)
+    actions = np.zeros((num_agents, 3), dtype=np.float32)
+    try:
+        env.reset()
+        for _ in range(warmup):
+            env.step(actions)
+        histogram = LatencyHistogram()
+        before = dict(env.metrics.counters)
+        cpu_start, start = time.process_time(), time.perf_counter()
+        for _ in range(steps):
+            step_start = time.perf_counter()
+            env.step(actions)
+            histogram.record(time.perf_counter() - step_start)
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        name = f"vec/agents={num_agents}/payload={payload_size}/protocol={protocol}"
+        return _summarize(name, num_agents, steps, elapsed, cpu, histogram, before, env)
+    finally:
+        env.close()
+
+
+def run_suite(agents: Sequence[int] = (1, 4, 16, 64),
+              payload_sizes: Sequence[int] = (0, 64),
+              protocols: Sequence[str] = ("json", "binary"),
+              steps: int = 1000,
+              latency: float = 0.0,
+              fanout: int = 0) -> Dict[str, Any]:
+    """
+    Run the whole sweep.
+
+    Args:
+        agents: Agent counts of the vectorized runs
+        payload_sizes: Extra sensor values per state to sweep
+        protocols: Wire protocols to sweep
+        steps: Measured steps per run
+        latency: Simulated one-way server latency in seconds
+        fanout: Number of idle viewer connections every state is broadcast to
+
+    Returns:
+        The configuration, the environment and one result per run
+    """
+    results = []
+    for payload_size in payload_sizes:
+        port = _free_port()
+        server = start_server(port, latency=latency, payload_size=payload_size, broadcast=fanout > 0)
+        url = f"ws://127.0.0.1:{port}"
+        viewers = None
+        if fanout:
+            viewers = multiprocessing.Process(target=_run_viewers, args=(url, fanout), daemon=True)
+            viewers.start()
+        try:
+            for protocol in protocols:
+                results.append(bench_single(url, steps, protocol, payload_size))
+                print(f"{results[-1]['name']}: {results[-1]['steps_per_sec']:.0f} steps/s, "
+                      f"{results[-1]['reply_protocol']} replies", file=sys.stderr)
+                for num_agents in agents:
+                    results.append(bench_vec(url, num_agents, steps, protocol, payload_size))
+                    print(f"{results[-1]['name']}: {results[-1]['agent_steps_per_sec']:.0f} agent steps/s, "
+                          f"{results[-1]['reply_protocol']} replies", file=sys.stderr)
+        finally:
+            if viewers is not None:
+                viewers.terminate()
+            server.terminate()
+            server.wait()
+
+    return {
+        'config': {
+            'agents': list(agents),
+            'payload_sizes': list(payload_sizes),
+            'protocols': list(protocols),
+            'steps': steps,
+            'latency': latency,
+            'fanout': fanout,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpus': multiprocessing.cpu_count(),
+            'numpy': np.__version__,
+            'websockets': websockets.__version__,
+        },
+        'results': results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Find runs that regressed against a baseline report.
+
+    A run regresses when its throughput dropped, or its p99 step latency
+    grew, by more than ``tolerance``, or when its replies used another
+    protocol than in the baseline.
+
+    Args:
+        report: Report produced by ``run_suite``
+        baseline: Earlier report to compare against
+        tolerance: Allowed relative change, e.g. 0.1 for 10%
+
+    Returns:
+        One description per regression
+    """
+    previous = {result['name']: result for result in baseline.get('results', [])}
+    regressions = []
+    for result in report['results']:
+        reference = previous.get(result['name'])
+        if reference is None:
+            continue
+        if 'reply_protocol' in reference and result['reply_protocol'] != reference['reply_protocol']:
+            regressions.append(
+                f"{result['name']}: replies sent as {result['reply_protocol']}, "
+                f"baseline {reference['reply_protocol']}"
+            )
+        if result['steps_per_sec'] < reference['steps_per_sec'] * (1 - tolerance):
+            regressions.append(
+                f"{result['name']}: {result['steps_per_sec']:.0f} steps/s, "
+                f"baseline {reference['steps_per_sec']:.0f}"
+            )
+        if result['latency']['p99'] > reference['latency']['p99'] * (1 + tolerance):
+            regressions.append(
+                f"{result['name']}: p99 {result['latency']['p99'] * 1e3:.3f} ms, "
+                f"baseline {reference['latency']['p99'] * 1e3:.3f} ms"
+            )
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the benchmark suite from the command line."""
+    parser = argparse.ArgumentParser(description="R3F Agents SDK benchmarks")
+    parser.add_argument("--agents", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="Agent counts of the vectorized runs")
+    parser.add_argument("--payload-sizes", type=int, nargs="+", default=[0, 64],
+                        help="Extra sensor values per state")
+    parser.add_argument("--protocols", nargs="+", default=["json", "binary"], choices=["json", "binary"],
+                        help="Wire protocols to benchmark")
+    parser.add_argument("--steps", type=int, default=1000, help="Measured steps per run")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated server latency in seconds")
+    parser.add_argument("--fanout", type=int, default=0,
+                        help="Idle viewer connections every state is broadcast to")
+    parser.add_argument("--output", type=str, default=None, help="File to write the JSON report to")
+    parser.add_argument("--baseline", type=str, default=None, help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("r3f_agents").setLevel(logging.WARNING)
+    report = run_suite(args.agents, args.payload_sizes, args.protocols, args.steps, args.latency, args.fanout)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Camera observations streamed by the scene as binary frames.
+
+A trainer subscribes an agent's camera with an ``info`` message
+``{"camera": {agent_id: {"width": ..., "height": ..., "channels": ...,
+"every": ...}}}``. The scene then renders the agent's view every ``every``
+ticks, downscaled to ``width`` x ``height``, and sends it as a binary camera
+frame record (see ``r3f_agents.protocol``). RGB frames have 3 channels, depth
+frames 1. Frames are copied once, straight from the received bytes, into a
+preallocated FrameRing per agent, and exposed as the ``camera`` key of the
+observation.
+"""
+import numpy as np
+from gymnasium import spaces
+from typing import Dict, Any, Tuple
+import logging
+
+from .observation import DEFAULT_KEY
+
+logger = logging.getLogger("r3f_agents")
+
+# Observation key of the camera image
+CAMERA_KEY = 'camera'
+
+CAMERA_DEFAULTS = {'width': 84, 'height': 84, 'channels': 3, 'every': 1}
+
+
+def camera_config(config: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Validate a camera configuration and fill in the defaults.
+
+    Args:
+        config: Any of ``width``, ``height``, ``channels`` (3 for RGB, 1 for
+            depth) and ``every`` (ticks between two frames)
+
+    Returns:
+        The complete configuration
+
+    Raises:
+        ValueError: If a field is unknown or out of range
+    """
+    unknown = set(config) - set(CAMERA_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown camera settings: {sorted(unknown)}")
+    config = {key: int(config.get(key, default)) for key, default in CAMERA_DEFAULTS.items()}
+    if not 0 < config['width'] <= 0xFFFF or not 0 < config['height'] <= 0xFFFF:
+        raise ValueError(f"Camera size must be between 1 and 65535, got {config['width']}x{config['height']}")
+    if config['channels'] not in (1, 3, 4):
+        raise ValueError(f"Camera channels must be 1, 3 or 4, got {config['channels']}")
+    if config['every'] < 1:
+        raise ValueError(f"Camera every must be at least 1, got {config['every']}")
+    return config
+
+
+def camera_space(config: Dict[str, int]) -> spaces.Box:
+    """
+    Observation space of the frames of a camera.
+
+    Args:
+        config: Configuration returned by ``camera_config``
+
+    Returns:
+        A uint8 Box of shape ``(height, width, channels)``
+    """
+    return spaces.Box(low=0, high=255, shape=(config['height'], config['width'], config['channels']), dtype=np.uint8)
+
+
+def split_camera_space(observation_space: spaces.Space,
+                       config: Dict[str, int]) -> Tuple[spaces.Dict, spaces.Space]:
+    """
+    Add the camera to an observation space.
+
+    Args:
+        observation_space: Observation space of the agent state, a Box or a
+            Dict. A ``camera`` entry it already has is replaced
+        config: Configuration returned by ``camera_config``
+
+    Returns:
+        The full observation space, and the part of it read from the agent
+        state
+    """
+    if isinstance(observation_space, spaces.Dict):
+        state_spaces = {key: space for key, space in observation_space.spaces.items() if key != CAMERA_KEY}
+    else:
+        state_spaces = {DEFAULT_KEY: observation_space}
+    full = spaces.Dict({**state_spaces, CAMERA_KEY: camera_space(config)})
+    return full, spaces.Dict(state_spaces)
+
+
+class FrameRing:
+    """
+    Preallocated ring of the most recent frames of one camera.
+
+    Frames are written in place, so receiving one never allocates. Views
+    handed out by ``latest(copy=False)`` stay valid until ``capacity`` more
+    frames have arrived.
+    """
+
+    def __init__(self, height: int, width: int, channels: int, capacity: int = 4):
+        """
+        Allocate the ring.
+
+        Args:
+            height: Frame height in pixels
+            width: Frame width in pixels
+            channels: Values per pixel
+            capacity: Number of frames kept
+        """
+        self.shape = (height, width, channels)
+        self.capacity = capacity
+        self.frames = np.zeros((capacity,) + self.shape, dtype=np.uint8)
+        self.indices = np.full(capacity, -1, dtype=np.int64)
+        self.count = 0
+
+    @classmethod
+    def for_config(cls, config: Dict[str, int], capacity: int = 4) -> "FrameRing":
+        """
+        Allocate a ring for a camera configuration.
+
+        Args:
+            config: Configuration returned by ``camera_config``
+            capacity: Number of frames kept
+
+        Returns:
+            An empty ring
+        """
+        return cls(config['height'], config['width'], config['channels'], capacity)
+
+    @property
+    def frame(self) -> int:
+        """Number of the most recent frame, -1 before the first one."""
+        return int(self.indices[(self.count - 1) % self.capacity]) if self.count else -1
+
+    def write(self, pixels: np.ndarray, frame: int) -> bool:
+        """
+        Copy a frame into the ring.
+
+        Args:
+            pixels: ``(height, width, channels)`` uint8 image, typically a view
+                into the received bytes
+            frame: Frame number
+
+        Returns:
+            False if the frame does not have the configured shape and was
+            discarded
+        """
+        if pixels.shape != self.shape:
+            logger.warning(f"Discarding camera frame of shape {pixels.shape}, expected {self.shape}")
+            return False
+        slot = self.count % self.capacity
+        np.copyto(self.frames[slot], pixels)
+        self.indices[slot] = frame
+        self.count += 1
+        return True
+
+    def latest(self, copy: bool = True) -> np.ndarray:
+        """
+        The most recent frame, black before the first one.
+
+        Args:
+            copy: Return a copy. Otherwise return a read-only view into the ring
+
+        Returns:
+            ``(height, width, channels)`` uint8 image
+        """
+        frame = self.frames[(self.count - 1) % self.capacity]
+        if copy:
+            return frame.copy()
+        frame = frame.view()
+        frame.flags.writeable = False
+        return frame
+
+    def clear(self) -> None:
+        """Forget every frame."""
+        self.frames.fill(0)
+        self.indices.fill(-1)
+        self.count = 0
@@ -0,0 +1,788 @@
+import json
+import time
+import random
+import asyncio
+import itertools
+from typing import Dict, Any, Optional, List, Set, Tuple
+import logging
+
+from .camera import FrameRing
+from .metrics import Metrics
+from .protocol import PROTOCOL_BINARY, PROTOCOL_JSON, ProtocolError, decode_frame, encode_record
+from .transport import Transport, create_transport
+
+logger = logging.getLogger("r3f_agents")
+
+
+class AgentChannel:
+    """
+    Per-agent routing state of an R3FConnection.
+
+    Replies that answer one of the agent's requests resolve the matching
+    future; everything else addressed to the agent (scene-pushed states,
+    reset broadcasts, info messages) lands in ``queue``.
+    """
+
+    def __init__(self, agent_id: str, queue_size: int):
+        self.agent_id = agent_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # Sequence numbers of the requests awaiting a reply, oldest first,
+        # with the type of each request
+        self.pending: Dict[int, str] = {}
+        # Request types whose replies are known to echo the sequence number.
+        # Replies to the other types are matched in order.
+        self.echoed: Set[str] = set()
+        self.last_seq = -1
+        self.reset_baseline()
+
+    def reset_baseline(self) -> None:
+        """Forget the delta-encoding baseline, e.g. for a new connection."""
+        self.baseline: Optional[Dict[str, Any]] = None
+        self.version = 0
+        # Requests whose reply was a delta that could not be applied, answered
+        # by the next keyframe. None while no resync is outstanding.
+        self.resync: Optional[List[int]] = None
+
+
+class R3FConnection:
+    """
+    Connection to the relay server shared by one or more agents.
+
+    A single reader task parses every incoming frame once and routes it by
+    ``agentId``. Outgoing ``action``/``reset`` messages carry a sequence number
+    (``seq``) that the server echoes in its ``state`` reply, so each reply is
+    matched to the exact request that caused it rather than to whichever state
+    message happens to arrive next. Messages for agents that are not registered
+    on this connection are dropped right after parsing.
+
+    With ``protocol="binary"`` the connection offers the compact binary format
+    of ``r3f_agents.protocol`` when it connects and falls back to JSON if the
+    server does not acknowledge it. With ``delta=True`` it also asks for
+    delta-encoded states, merges every delta into a per-agent baseline so
+    callers always see full states, and requests a keyframe when a version is
+    missing.
+
+    Cameras added with ``add_camera`` are subscribed whenever the connection
+    is established, and their binary frames are written into a FrameRing per
+    agent as they arrive.
+
+    The transport is chosen from the URL scheme (see ``r3f_agents.transport``):
+    ``ws://`` for TCP, ``unix://`` for a Unix domain socket and ``inproc://``
+    for a Python backend in the same process.
+
+    Failed connection attempts are retried with jittered exponential backoff.
+    When a connection that was up is re-established, the connection asks the
+    server to re-bind its agents; agents whose server-side state did not
+    survive are listed in ``lost_agents`` until they are reset. While idle, a
+    keepalive message is sent every ``keepalive_interval`` seconds so that slow
+    policy updates do not trip the server's inactivity timeout.
+    """
+
+    def __init__(self, websocket_url: str, queue_size: int = 64,
+                 protocol: str = PROTOCOL_JSON, negotiation_timeout: float = 2.0,
+                 metrics: Optional[Metrics] = None, reconnect: bool = True,
+                 max_retries: int = 5, backoff_base: float = 0.25, backoff_max: float = 10.0,
+                 keepalive_interval: Optional[float] = 10.0, resume_timeout: float = 2.0,
+                 delta: bool = False):
+        """
+        Initialize the connection.
+
+        Args:
+            websocket_url: URL of the server, ``ws://``, ``unix://`` or ``inproc://``
+            queue_size: Capacity of each agent's queue of unsolicited messages.
+                When full, the oldest message is discarded
+            protocol: Preferred wire protocol, ``"json"`` or ``"binary"``
+            negotiation_timeout: Seconds to wait for the server to acknowledge
+                the binary protocol before falling back to JSON
+            metrics: Metrics to record timings and counters into. A new
+                instance is created when None
+            reconnect: Retry failed connection attempts instead of failing on
+                the first one
+            max_retries: Connection attempts made after the first one fails
+            backoff_base: Upper bound in seconds of the first retry delay,
+                doubled on every further attempt
+            backoff_max: Largest upper bound of a retry delay in seconds
+            keepalive_interval: Seconds without outgoing traffic after which a
+                keepalive message is sent. None disables keepalives
+            resume_timeout: Seconds to wait for the server to answer a resume
+                request after a reconnect
+            delta: Ask the server to send only the state fields that changed
+        """
+        if protocol not in (PROTOCOL_JSON, PROTOCOL_BINARY):
+            raise ValueError(f"Unsupported protocol: {protocol}")
+
+        self.logger = logger
+
+        self.websocket_url = websocket_url
+        self.transport: Optional[Transport] = None
+        self.connected = False
+        self.queue_size = queue_size
+        self.metrics = metrics or Metrics()
+        self.last_serialize = 0.0
+        self.last_send = 0.0
+        self.last_parse = 0.0
+        self._connected_once = False
+        self.reconnect = reconnect
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.keepalive_interval = keepalive_interval
+        self.resume_timeout = resume_timeout
+        self.lost_agents: Set[str] = set()
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self._last_sent = 0.0
+
+        self._channels: Dict[str, AgentChannel] = {}
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        # Requests failed by the last dropped connection, kept until their
+        # waiters collect the error
+        self._failed: Dict[tuple, asyncio.Future] = {}
+        self._seq = itertools.count()
+        self._reader_task: Optional[asyncio.Task] = None
+
+        self.requested_protocol = protocol
+        self.protocol = PROTOCOL_JSON
+        self.requested_delta = delta
+        self.delta = False
+        self._resync_agents: Set[str] = set()
+        self._cameras: Dict[str, Tuple[Dict[str, int], FrameRing]] = {}
+        self.negotiation_timeout = negotiation_timeout
+        self._agent_index: Dict[str, int] = {}
+        self._agent_list: List[str] = []
+        # Key and seq identifying the answer to the info request in flight
+        self._handshake: Optional[Tuple[str, int, asyncio.Future]] = None
+
+    @property
+    def dropped_messages(self) -> int:
+        """Messages discarded because no registered agent or full queue."""
+        return self.metrics.counters['dropped_messages']
+
+    @property
+    def stale_replies(self) -> int:
+        """Replies that arrived after their request was given up on."""
+        return self.metrics.counters['stale_replies']
+
+    def register(self, agent_id: str) -> AgentChannel:
+        """
+        Route messages addressed to an agent to this connection.
+
+        Args:
+            agent_id: Agent to register
+
+        Returns:
+            The agent's channel
+        """
+        channel = self._channels.get(agent_id)
+        if channel is None:
+            channel = AgentChannel(agent_id, self.queue_size)
+            self._channels[agent_id] = channel
+        return channel
+
+    def add_camera(self, agent_id: str, config: Dict[str, int]) -> FrameRing:
+        """
+        Stream an agent's camera over this connection from the next connect.
+
+        Args:
+            agent_id: Agent whose view is streamed
+            config: Configuration returned by ``r3f_agents.camera.camera_config``
+
+        Returns:
+            The ring the agent's frames are written into
+        """
+        ring = FrameRing.for_config(config)
+        self._cameras[agent_id] = (config, ring)
+        return ring
+
+    def unregister(self, agent_id: str) -> None:
+        """
+        Stop routing messages for an agent and cancel its pending requests.
+
+        Args:
+            agent_id: Agent to unregister
+        """
+        channel = self._channels.pop(agent_id, None)
+        if channel is not None:
+            for seq in channel.pending:
+                future = self._pending.pop((agent_id, seq), None)
+                if future is not None and not future.done():
+                    future.cancel()
+
+    async def connect(self) -> None:
+        """
+        Establish the connection and start the reader task.
+
+        Does nothing while connected. After the connection was lost, a new
+        one is opened and the registered agents are resumed on it.
+
+        Raises:
+            ConnectionError: If connection to the server fails after all retries
+            ValueError: If the URL scheme is not supported
+        """
+        if self.transport is not None and self.connected:
+            return
+        # Created here rather than in __init__, which may run outside the loop
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.transport is not None and self.connected:
+                return
+            attempts = self.max_retries + 1 if self.reconnect else 1
+            for attempt in range(attempts):
+                await self._open()
+                try:
+                    await self._start_session()
+                    break
+                except ConnectionError as e:
+                    if attempt + 1 == attempts:
+                        raise
+                    self.logger.warning(f"Connection lost during the handshake ({e}), reconnecting")
+            if self.keepalive_interval and self._keepalive_task is None:
+                self._keepalive_task = asyncio.create_task(self._keepalive())
+
+    async def _start_session(self) -> None:
+        """Start reading from a new transport, resume the agents and negotiate the protocol."""
+        self.protocol = PROTOCOL_JSON
+        self.delta = False
+        self._resync_agents.clear()
+        for channel in self._channels.values():
+            channel.reset_baseline()
+        self._reader_task = asyncio.create_task(self._reader())
+        if self._connected_once and self._channels:
+            await self._resume()
+        self._connected_once = True
+        wanted = self.requested_protocol == PROTOCOL_BINARY or self.requested_delta
+        if wanted and self.transport.serializes:
+            await self._negotiate()
+        if self._cameras:
+            await self._subscribe_cameras()
+
+    async def _open(self) -> None:
+        """
+        Open a new transport, retrying with full-jitter exponential backoff.
+
+        Raises:
+            ConnectionError: If every attempt fails
+        """
+        await self._close_transport()
+        attempts = self.max_retries + 1 if self.reconnect else 1
+        for attempt in range(attempts):
+            transport = create_transport(self.websocket_url)
+            try:
+                self.logger.debug(f"Attempting to connect to {self.websocket_url}")
+                await transport.connect()
+            except Exception as e:
+                if attempt + 1 == attempts:
+                    self.logger.error(f"Failed to connect to R3F environment: {e}")
+                    raise ConnectionError(f"Could not connect to server: {e}")
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                self.logger.warning(f"Connection attempt {attempt + 1} failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            self.transport = transport
+            self.connected = True
+            self._last_sent = time.perf_counter()
+            if self._connected_once:
+                self.metrics.increment('reconnects')
+            self.logger.info(f"Connected to R3F environment at {self.websocket_url}")
+            return
+
+    async def _request_info(self, data: Dict[str, Any], key: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Send an info message to the server and wait for its answer.
+
+        Args:
+            data: Data of the info message
+            key: Field that identifies the answer
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            The answer's data, or None if none arrived in time
+        """
+        future = asyncio.get_running_loop().create_future()
+        seq = next(self._seq)
+        self._handshake = (key, seq, future)
+        try:
+            await self.send({'type': 'info', 'agentId': '*', 'data': data, 'seq': seq})
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._handshake = None
+
+    async def _resume(self) -> None:
+        """Ask the server to re-bind the registered agents to this connection."""
+        agents = list(self._channels)
+        ack = await self._request_info({'resume': True, 'agents': agents}, 'resumed', self.resume_timeout)
+        # Servers without session support keep nothing across connections
+        resumed = set(ack.get('resumed', [])) if ack else set()
+        self.lost_agents = set(agents) - resumed
+        if self.lost_agents:
+            self.logger.warning(f"Server lost the state of {len(self.lost_agents)} agent(s) during the reconnect")
+        else:
+            self.logger.info(f"Resumed {len(agents)} agent(s)")
+
+    async def _negotiate(self) -> None:
+        """Offer the requested protocol and delta encoding for the registered agents."""
+        offer = {'protocol': self.requested_protocol, 'agents': list(self._channels)}
+        if self.requested_delta:
+            offer['delta'] = True
+        ack = await self._request_info(offer, 'protocol', self.negotiation_timeout) or {}
+        if self.requested_delta:
+            self.delta = bool(ack.get('delta'))
+            if not self.delta:
+                self.logger.info("Server did not acknowledge delta-encoded states, using full states")
+        if self.requested_protocol != PROTOCOL_BINARY:
+            return
+        if ack.get('protocol') != PROTOCOL_BINARY:
+            self.logger.info("Server did not acknowledge the binary protocol, using JSON")
+            return
+        self._agent_list = list(ack.get('agents', []))
+        self._agent_index = {agent_id: index for index, agent_id in enumerate(self._agent_list)}
+        self.protocol = PROTOCOL_BINARY
+        self.logger.info(f"Using binary protocol for {len(self._agent_list)} agent(s)")
+
+    async def _subscribe_cameras(self) -> None:
+        """Ask the server to stream the cameras added with ``add_camera``."""
+        cameras = {agent_id: config for agent_id, (config, _) in self._cameras.items()}
+        ack = await self._request_info({'camera': cameras}, 'camera', self.negotiation_timeout)
+        if ack is None or 'camera' not in ack:
+            self.logger.warning("Server did not acknowledge the camera subscription, no frames will arrive")
+            return
+        if 'agents' in ack:
+            # Frames are addressed by index in the connection's agent list
+            self._agent_list = list(ack['agents'])
+            self._agent_index = {agent_id: index for index, agent_id in enumerate(self._agent_list)}
+        missing = set(cameras) - set(ack['camera'])
+        if missing:
+            self.logger.warning(f"Server refused the camera of {sorted(missing)}")
+
+    async def _keepalive(self) -> None:
+        """Send a keepalive message whenever nothing was sent for a while."""
+        while True:
+            if not self.connected:
+                # Nothing to keep alive until the connection is back
+                await asyncio.sleep(self.keepalive_interval)
+                continue
+            idle = time.perf_counter() - self._last_sent
+            await asyncio.sleep(max(self.keepalive_interval - idle, 0.0))
+            if not self.connected:
+                continue
+            if time.perf_counter() - self._last_sent >= self.keepalive_interval:
+                try:
+                    await self.send({'type': 'info', 'agentId': '*', 'data': {'keepalive': True}})
+                except ConnectionError:
+                    pass
+
+    async def _close_transport(self) -> None:
+        """Close the current transport and stop its reader task."""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        if self.transport:
+            try:
+                await self.transport.close()
+            except Exception as e:
+                self.logger.debug(f"Error while closing transport: {e}")
+            self.transport = None
+            self.connected = False
+
+    async def close(self) -> None:
+        """Stop the reader and keepalive tasks and close the transport."""
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            try:
+                await self._keepalive_task
+            except asyncio.CancelledError:
+                pass
+            self._keepalive_task = None
+        if self.transport:
+            await self._close_transport()
+            self.logger.info("Disconnected from R3F environment")
+        self._fail_pending(None)
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        """
+        Send a message without expecting a reply.
+
+        Args:
+            message: The message to send to the server
+        """
+        await self.connect()
+        start = time.perf_counter()
+        if self.transport.serializes:
+            frame = self._encode_binary(message)
+            if frame is None:
+                frame = json.dumps(message)
+                self.logger.debug(f"Sending message: {frame}")
+        else:
+            frame = message
+        encoded = time.perf_counter()
+        await self.transport.send(frame)
+        sent = time.perf_counter()
+        self._last_sent = sent
+        self.last_serialize = encoded - start
+        self.last_send = sent - encoded
+        self.metrics.record('serialize', self.last_serialize)
+        self.metrics.record('send', self.last_send)
+        if self.transport.serializes:
+            self.metrics.increment('bytes_sent', len(frame))
+
+    def _encode_binary(self, message: Dict[str, Any]) -> Optional[bytes]:
+        """
+        Encode a message as a binary frame if the protocol allows it.
+
+        Args:
+            message: The message to encode
+
+        Returns:
+            The binary frame, or None if the message must be sent as JSON
+        """
+        if self.protocol != PROTOCOL_BINARY:
+            return None
+        data = message.get('data', {})
+        entries = data.get('batch') if isinstance(data, dict) else None
+        if entries is None:
+            entries = [message]
+        records = []
+        for entry in entries:
+            agent_index = self._agent_index.get(entry['agentId'])
+            if agent_index is None:
+                return None
+            record = encode_record(message['type'], agent_index, entry.get('data', {}), entry.get('seq'))
+            if record is None:
+                return None
+            records.append(record)
+        return b''.join(records)
+
+    def _track(self, agent_id: str, message_type: str) -> int:
+        """Allocate a sequence number and a reply future for an agent."""
+        channel = self.register(agent_id)
+        seq = next(self._seq)
+        channel.pending[seq] = message_type
+        self._pending[(agent_id, seq)] = asyncio.get_running_loop().create_future()
+        return seq
+
+    async def send_request(self, message: Dict[str, Any]) -> int:
+        """
+        Send a message whose ``state`` reply will be awaited.
+
+        Args:
+            message: The message to send. Its ``seq`` field is set here
+
+        Returns:
+            The sequence number to pass to ``wait_reply``
+        """
+        message['seq'] = self._track(message['agentId'], message['type'])
+        await self.send(message)
+        return message['seq']
+
+    async def send_batch_request(self, message_type: str, payloads: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Send one batched frame carrying a request for each agent.
+
+        Args:
+            message_type: Type shared by every message in the batch
+            payloads: Message data keyed by agent ID
+
+        Returns:
+            Sequence numbers keyed by agent ID
+        """
+        seqs = {agent_id: self._track(agent_id, message_type) for agent_id in payloads}
+        await self.send({
+            'type': message_type,
+            'agentId': '*',
+            'data': {
+                'batch': [
+                    {'agentId': agent_id, 'seq': seqs[agent_id], 'data': data}
+                    for agent_id, data in payloads.items()
+                ]
+            }
+        })
+        return seqs
+
+    async def wait_reply(self, agent_id: str, seq: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Wait for the reply to a request.
+
+        Args:
+            agent_id: Agent that sent the request
+            seq: Sequence number returned by ``send_request``
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            The reply message, or None if it did not arrive in time
+        """
+        replies = await self.wait_replies({agent_id: seq}, timeout)
+        return replies.get(agent_id)
+
+    async def wait_replies(self, seqs: Dict[str, int], timeout: float) -> Dict[str, Dict[str, Any]]:
+        """
+        Wait concurrently for the replies to several requests.
+
+        Args:
+            seqs: Sequence numbers keyed by agent ID
+            timeout: Maximum number of seconds to wait for all replies
+
+        Returns:
+            Reply messages keyed by agent ID. Agents whose reply did not arrive
+            in time are missing from the result.
+
+        Raises:
+            ConnectionError: If the connection dropped after the requests were
+                sent
+        """
+        futures = {}
+        for agent_id, seq in seqs.items():
+            future = self._pending.get((agent_id, seq))
+            if future is None:
+                future = self._failed.pop((agent_id, seq), None)
+            if future is not None:
+                futures[agent_id] = future
+        if futures:
+            await asyncio.wait(futures.values(), timeout=timeout)
+
+        replies = {}
+        error = None
+        for agent_id, future in futures.items():
+            seq = seqs[agent_id]
+            if future.done():
+                self._pending.pop((agent_id, seq), None)
+                if future.cancelled():
+                    continue
+                exception = future.exception()
+                if exception is not None:
+                    error = error or exception
+                    continue
+                replies[agent_id] = future.result()
+            else:
+                self._forget(agent_id, seq)
+        if error is not None:
+            raise error
+        return replies
+
+    def drain(self, agent_id: str) -> List[Dict[str, Any]]:
+        """
+        Pop every queued unsolicited message for an agent.
+
+        Args:
+            agent_id: Agent whose queue is drained
+
+        Returns:
+            Queued messages, oldest first
+        """
+        channel = self._channels.get(agent_id)
+        messages = []
+        if channel is not None:
+            while not channel.queue.empty():
+                messages.append(channel.queue.get_nowait())
+        return messages
+
+    def _forget(self, agent_id: str, seq: int) -> None:
+        """Drop a request that will no longer be awaited."""
+        future = self._pending.pop((agent_id, seq), None)
+        if future is not None and not future.done():
+            future.cancel()
+        channel = self._channels.get(agent_id)
+        if channel is not None:
+            channel.pending.pop(seq, None)
+            channel.last_seq = max(channel.last_seq, seq)
+
+    def _resolve(self, channel: AgentChannel, seq: int, message: Dict[str, Any]) -> None:
+        """
+        Hand a reply to the request it answers.
+
+        The future stays in ``_pending`` until ``wait_replies`` collects it, so
+        a reply that arrives before its waiter is not lost.
+        """
+        future = self._pending.get((channel.agent_id, seq))
+        channel.pending.pop(seq, None)
+        channel.last_seq = max(channel.last_seq, seq)
+        if future is not None and not future.done():
+            future.set_result(message)
+
+    def _enqueue(self, channel: AgentChannel, message: Dict[str, Any]) -> None:
+        """Queue an unsolicited message, discarding the oldest one if full."""
+        if channel.queue.full():
+            channel.queue.get_nowait()
+            self.metrics.increment('dropped_messages')
+        channel.queue.put_nowait(message)
+
+    def _dispatch(self, message: Dict[str, Any]) -> None:
+        """
+        Route one parsed message.
+
+        Args:
+            message: Message received from the server
+        """
+        if self._handshake is not None and message.get('type') == 'info':
+            key, seq, future = self._handshake
+            data = message.get('data') or {}
+            # A reply echoing the request's seq answers it, as does one
+            # without a seq that carries the requested capability from a
+            # server that predates seqs on info messages. Replies to other
+            # info messages and server announcements are not answers.
+            if 'seq' in message:
+                answered = message['seq'] == seq
+            else:
+                answered = key in data
+            if answered:
+                if not future.done():
+                    future.set_result(data)
+                return
+
+        if message.get('type') == 'camera':
+            camera = self._cameras.get(message.get('agentId'))
+            if camera is not None and camera[1].write(message['data'], message.get('frame', -1)):
+                self.metrics.increment('camera_frames')
+            else:
+                self.metrics.increment('dropped_messages')
+            return
+
+        channel = self._channels.get(message.get('agentId'))
+        if channel is None:
+            self.metrics.increment('dropped_messages')
+            return
+
+        if message.get('type') == 'state':
+            if 'version' in message:
+                message = self._apply_delta(channel, message)
+                if message is None:
+                    return
+                if channel.resync is not None and self._answer_resync(channel, message) and 'seq' not in message:
+                    return
+            seq = message.get('seq')
+            if seq is not None:
+                if (channel.agent_id, seq) in self._pending:
+                    channel.echoed.add(channel.pending.get(seq, 'state'))
+                    self._resolve(channel, seq, message)
+                    return
+                if seq <= channel.last_seq:
+                    self.metrics.increment('stale_replies')
+                    return
+            else:
+                # Servers that predate sequence numbers, and scenes that
+                # report states without them, answer in order.
+                for pending_seq, request_type in channel.pending.items():
+                    if request_type not in channel.echoed:
+                        self._resolve(channel, pending_seq, message)
+                        return
+        elif (channel.agent_id, message.get('seq')) in self._pending:
+            # Snapshot replies, and errors answering a request
+            self._resolve(channel, message['seq'], message)
+            return
+
+        self._enqueue(channel, message)
+
+    def _apply_delta(self, channel: AgentChannel, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Merge a versioned state into the agent's baseline.
+
+        Args:
+            channel: Channel of the agent the state belongs to
+            message: Keyframe or delta message
+
+        Returns:
+            The message holding the full state, or None if it is a delta that
+            does not follow the baseline, in which case a keyframe is requested
+        """
+        version = message['version']
+        if message.get('delta'):
+            if channel.baseline is None or version != channel.version + 1:
+                self._request_resync(channel, message.get('seq'))
+                return None
+            # A new dictionary, so states already handed out stay as they were
+            state = dict(channel.baseline)
+            state.update(message['data'])
+            message['data'] = state
+        channel.baseline = message['data']
+        channel.version = version
+        return message
+
+    def _request_resync(self, channel: AgentChannel, seq: Optional[int]) -> None:
+        """Drop the baseline of an agent and schedule a keyframe request."""
+        self.metrics.increment('resyncs')
+        channel.baseline = None
+        if channel.resync is None:
+            channel.resync = []
+            self._resync_agents.add(channel.agent_id)
+        if seq is not None:
+            channel.resync.append(seq)
+
+    def _answer_resync(self, channel: AgentChannel, message: Dict[str, Any]) -> bool:
+        """
+        Hand the first keyframe after a resync request to the requests whose
+        delta was discarded.
+
+        Returns:
+            Whether any request was answered
+        """
+        seqs, channel.resync = channel.resync, None
+        answered = False
+        for seq in seqs:
+            if (channel.agent_id, seq) in self._pending:
+                self._resolve(channel, seq, {**message, 'seq': seq})
+                answered = True
+        return answered
+
+    async def _reader(self) -> None:
+        """Read, parse and route frames until the connection closes."""
+        try:
+            async for raw in self.transport:
+                if isinstance(raw, dict):
+                    self._dispatch(raw)
+                    continue
+                start = time.perf_counter()
+                self.metrics.increment('bytes_received', len(raw))
+                self.metrics.increment('frames_received')
+                if isinstance(raw, bytes):
+                    self.metrics.increment('binary_frames_received')
+                    try:
+                        messages = decode_frame(raw, self._agent_list)
+                    except ProtocolError as e:
+                        self.logger.warning(f"Discarding malformed binary frame: {e}")
+                        continue
+                else:
+                    try:
+                        messages = [json.loads(raw)]
+                    except ValueError:
+                        self.logger.warning(f"Discarding malformed message: {raw!r}")
+                        continue
+                self.last_parse = time.perf_counter() - start
+                self.metrics.record('parse', self.last_parse)
+                for message in messages:
+                    self._dispatch(message)
+                if self._resync_agents:
+                    agents = list(self._resync_agents)
+                    self._resync_agents.clear()
+                    await self.send({'type': 'info', 'agentId': '*', 'data': {'resync': agents}})
+            self.logger.warning(f"Connection to {self.websocket_url} closed by server")
+        except ConnectionError as e:
+            self.logger.warning(f"Connection to {self.websocket_url} closed: {e}")
+        self.connected = False
+        if self._handshake is not None and not self._handshake[2].done():
+            self._handshake[2].set_exception(ConnectionError("Connection lost during the handshake"))
+        self._fail_pending(ConnectionError("Connection to R3F environment lost"))
+
+    def _fail_pending(self, error: Optional[Exception]) -> None:
+        """
+        Fail every request still waiting for a reply.
+
+        Args:
+            error: Exception to raise in the waiters, or None to cancel them
+        """
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                if error is None:
+                    future.cancel()
+                else:
+                    future.set_exception(error)
+        # A request sent just before the drop may not be awaited yet
+        self._failed = {} if error is None else pending
+        for channel in self._channels.values():
+            channel.pending.clear()
@@ -1,13 +1,21 @@
-import json
-import asyncio
 import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
-from typing import Dict, Any, Optional, Tuple, List, Union
-import websockets
+from collections import deque
+from typing import Dict, Any, Optional, Tuple, List, Union, Deque
 import time
+import asyncio
 import logging
 
+from .actions import ActionEncoder, ActionMapping, encode_action
+from .camera import CAMERA_KEY, camera_config, split_camera_space
+from .connection import R3FConnection
+from .loop import BackgroundLoop, get_background_loop
+from .metrics import Metrics
+from .observation import ObservationBuffer
+from .protocol import PROTOCOL_JSON
+from .rewards import TargetReward
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,6 +23,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger("r3f_agents")
 
+def default_action_space() -> spaces.Box:
+    """Continuous [x, y, z] movement action space used when none is given."""
+    return spaces.Box(
+        low=-1.0,
+        high=1.0,
+        shape=(3,),
+        dtype=np.float32
+    )
+
+
+def default_observation_space() -> spaces.Dict:
+    """Position and rotation observation space used when none is given."""
+    return spaces.Dict({
+        'position': spaces.Box(
+            low=-np.inf,
+            high=np.inf,
+            shape=(3,),
+            dtype=np.float32
+        ),
+        'rotation': spaces.Box(
+            low=-np.pi,
+            high=np.pi,
+            shape=(3,),
+            dtype=np.float32
+        )
+    })
+
+
 class R3FEnv(gym.Env):
     """
     Reinforcement Learning environment that connects to a React Three Fiber scene via WebSockets.
@@ -23,66 +59,134 @@ class R3FEnv(gym.Env):
     This environment allows agents to interact with 3D scenes rendered using React Three Fiber.
     It handles communication with the WebSocket server, state management, and reward calculation.
     """
-    metadata = {'render_modes': ['human']}
+    metadata = {'render_modes': ['human', 'rgb_array']}
     
     def __init__(self, 
                  websocket_url: str = "ws://localhost:8765",
                  agent_id: str = "main",
                  observation_space: Optional[spaces.Space] = None,
                  action_space: Optional[spaces.Space] = None,
-                 max_episode_steps: int = 1000):
+                 max_episode_steps: int = 1000,
+                 loop: Optional[BackgroundLoop] = None,
+                 protocol: str = PROTOCOL_JSON,
+                 copy_obs: bool = True,
+                 max_inflight: int = 1,
+                 metrics_port: Optional[int] = None,
+                 on_disconnect: str = "truncate",
+                 frame_skip: int = 1,
+                 delta: bool = False,
+                 camera: Optional[Dict[str, Any]] = None,
+                 start_position: Optional[List[float]] = None,
+                 target_position: Optional[List[float]] = None,
+                 reward: Optional[TargetReward] = None,
+                 action_mapping: Optional[ActionMapping] = None,
+                 timings: bool = False):
         """
         Initialize the R3F environment.
         
         Args:
-            websocket_url: URL of the WebSocket server
+            websocket_url: URL of the server: ``ws://host:port``,
+                ``unix:///path/to/socket`` or ``inproc://name``
             agent_id: Unique identifier for this agent
             observation_space: Custom observation space configuration
             action_space: Custom action space configuration
-            max_episode_steps: Maximum number of steps per episode
+            max_episode_steps: Maximum number of steps per episode, counted
+                in learner steps rather than scene ticks
+            loop: Background loop that owns the WebSocket. Defaults to the
+                process-wide loop shared by all environments
+            protocol: Wire protocol to request from the server, ``"json"`` or
+                ``"binary"``. Binary falls back to JSON if the server does not
+                support it
+            copy_obs: Return observation copies. When False, observations are
+                read-only views into the environment's buffer that are
+                overwritten by the next step
+            max_inflight: Number of actions that may be sent with
+                ``step_async`` before their results are collected with
+                ``step_wait``
+            metrics_port: Serve ``metrics`` in the Prometheus text format on
+                this local port
+            on_disconnect: What to do with a step whose connection dropped
+                before its reply arrived, once reconnected: ``"truncate"``
+                ends the episode with ``truncated=True``, ``"replay"`` sends
+                the action again if the server kept the agent's state
+            frame_skip: Number of scene ticks each action is applied for.
+                The server repeats the action and replies once with the
+                summed reward, stopping early when the scene reports done
+            delta: Ask the server for delta-encoded states, which are merged
+                back into full states as they arrive
+            camera: Stream the agent's view from the scene, e.g.
+                ``{"width": 84, "height": 84, "channels": 3, "every": 1}``.
+                The latest frame is added to the observation as a uint8
+                ``camera`` image and its number to ``info['camera_frame']``
+            start_position: Position [x, y, z] the agent is reset to, unless
+                the reset options give one
+            target_position: Position [x, y, z] to reach. Rewards and
+                termination are then computed from the agent's position by a
+                ``TargetReward`` instead of taken from the server, and
+                ``info`` reports the ``distance`` to the target
+            reward: Reward engine to use instead of the one built from
+                ``start_position`` and ``target_position``
+            action_mapping: How actions map to the ``position``,
+                ``rotation`` and named ``action`` channels of the action
+                message, see ``ActionEncoder``. Discrete actions default to
+                the four movement directions, Box actions to movement and,
+                for six columns, rotation
+            timings: Add the duration in seconds of each phase of the step
+                to ``info['timings']``. They are always recorded in
+                ``metrics``
         """
         super().__init__()
         
+        if on_disconnect not in ("truncate", "replay"):
+            raise ValueError(f"on_disconnect must be 'truncate' or 'replay', got {on_disconnect!r}")
+        if frame_skip < 1:
+            raise ValueError(f"frame_skip must be at least 1, got {frame_skip}")
+        
         # Set up logger
         self.logger = logger
         
         self.websocket_url = websocket_url
         self.agent_id = agent_id
-        self.websocket = None
-        self.loop = None
-        self.connected = False
+        self.metrics = Metrics(labels={'agent': agent_id})
+        self.connection = R3FConnection(websocket_url, protocol=protocol, metrics=self.metrics, delta=delta)
+        self.loop = loop
         self.timeout = 5.0
         self.max_episode_steps = max_episode_steps
         self.current_step = 0
+        self.max_inflight = max_inflight
+        self.on_disconnect = on_disconnect
+        self.frame_skip = frame_skip
+        self.timings = timings
+        self._inflight: Deque[Any] = deque()
         
-        self.action_space = action_space or spaces.Box(
-            low=-1.0,
-            high=1.0,
-            shape=(3,),
-            dtype=np.float32
-        )
+        self.action_space = action_space or default_action_space()
+        self.observation_space = observation_space or default_observation_space()
+        self.action_encoder = ActionEncoder(self.action_space, action_mapping)
         
-        self.observation_space = observation_space or spaces.Dict({
-            'position': spaces.Box(
-                low=-np.inf,
-                high=np.inf,
-                shape=(3,),
-                dtype=np.float32
-            ),
-            'rotation': spaces.Box(
-                low=-np.pi,
-                high=np.pi,
-                shape=(3,),
-                dtype=np.float32
-            )
-        })
+        # The camera image is not part of the agent state and bypasses the buffer
+        state_space = self.observation_space
+        self.camera = None
+        self._frames = None
+        if camera is not None:
+            self.camera = camera_config(camera)
+            self.observation_space, state_space = split_camera_space(self.observation_space, self.camera)
+            self._frames = self.connection.add_camera(agent_id, self.camera)
+        
+        self.copy_obs = copy_obs
+        self._obs = ObservationBuffer(state_space)
+        self._reward = 0.0
         
-        self._state = {
-            'position': np.zeros(3, dtype=np.float32),
-            'rotation': np.zeros(3, dtype=np.float32),
-            'reward': 0.0,
-            'done': False
-        }
+        if reward is None and target_position is not None:
+            reward = TargetReward(1, target_position=target_position, start_position=start_position)
+        self.reward = reward
+        if start_position is None and reward is not None and reward.starts is not None:
+            start_position = reward.starts[0]
+        self.start_position = None if start_position is None else np.asarray(start_position, dtype=np.float32)
+        # Latest position of the agent, as the reward engine's (1, 3) batch
+        self._position = np.zeros((1, 3), dtype=np.float32)
+        
+        if metrics_port is not None:
+            self.metrics.serve(metrics_port)
         
         self.logger.info(f"R3F Environment initialized: agent_id={agent_id}, url={websocket_url}")
     
@@ -93,155 +197,395 @@ class R3FEnv(gym.Env):
         Raises:
             ConnectionError: If connection to the WebSocket server fails
         """
-        if self.websocket is None or not self.connected:
-            try:
-                self.logger.debug(f"Attempting to connect to {self.websocket_url}")
-                self.websocket = await websockets.connect(self.websocket_url)
-                self.connected = True
-                self.logger.info(f"Connected to R3F environment at {self.websocket_url}")
-            except Exception as e:
-                self.connected = False
-                self.logger.error(f"Failed to connect to R3F environment: {e}")
-                raise ConnectionError(f"Could not connect to WebSocket server: {e}")
+        self.connection.register(self.agent_id)
+        await self.connection.connect()
     
     async def _disconnect(self) -> None:
         """Close WebSocket connection."""
-        if self.websocket:
-            await self.websocket.close()
-            self.websocket = None
-            self.connected = False
-            self.logger.info("Disconnected from R3F environment")
+        await self.connection.close()
     
-    async def _send_message(self, message: Dict[str, Any]) -> None:
+    async def _send_message(self, message: Dict[str, Any]) -> int:
         """
-        Send a message to the WebSocket server.
+        Send a request to the WebSocket server.
         
         Args:
             message: The message to send to the server
+            
+        Returns:
+            Sequence number the server echoes in its reply
         """
         await self._connect()
-        message_json = json.dumps(message)
-        self.logger.debug(f"Sending message: {message_json}")
-        await self.websocket.send(message_json)
+        return await self.connection.send_request(message)
     
-    async def _receive_state(self) -> Dict[str, Any]:
+    async def _receive_state(self, seq: int) -> Dict[str, Any]:
         """
-        Receive state update from the WebSocket server.
+        Receive the state update answering a request.
         
+        Args:
+            seq: Sequence number returned by ``_send_message``
+            
         Returns:
-            The message received from the server
+            The message received from the server. On timeout, a state message
+            without data, which leaves the previous observation in place
             
         Raises:
-            asyncio.TimeoutError: If server doesn't respond within the timeout period
             ConnectionError: If connection issues occur
         """
-        if not self.websocket or not self.connected:
-            await self._connect()
-        
-        try:
-            self.logger.debug("Waiting for message from server")
-            message = await asyncio.wait_for(self.websocket.recv(), timeout=self.timeout)
-            data = json.loads(message)
-            
-            if data.get('agentId') == self.agent_id and data.get('type') == 'state':
-                self.logger.debug(f"Received state update: {data}")
-                return data
-            else:
-                self.logger.debug(f"Received non-state message, waiting for state update: {data}")
-                return await self._receive_state()
-                
-        except asyncio.TimeoutError:
+        self.logger.debug(f"Waiting for reply {seq} from server")
+        message = await self.connection.wait_reply(self.agent_id, seq, self.timeout)
+        if message is None:
             self.logger.warning(f"Timeout waiting for response from server after {self.timeout} seconds")
+            self.metrics.increment('timeouts')
+            self.metrics.increment('stale_observations')
             return {
                 'type': 'state',
                 'agentId': self.agent_id,
-                'data': self._state
+                'data': {},
+                'stale': True
             }
-        except Exception as e:
-            self.logger.error(f"Error receiving state: {e}")
-            raise
+        self.logger.debug(f"Received state update: {message}")
+        return message
     
-    def reset(self, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    async def _exchange(self, message: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
         """
-        Reset the environment to an initial state.
+        Send a request and wait for its reply, recovering from a dropped connection.
+        
+        When the connection drops, it is re-established. Resets are then sent
+        again; actions are replayed only with ``on_disconnect="replay"`` and
+        if the server kept the agent's state, otherwise a state message
+        without data flagged ``connection_lost`` is returned.
         
         Args:
-            seed: Random seed for reproducibility
-            options: Additional options for resetting (unused currently)
+            message: The request to send
             
         Returns:
-            Initial observation and info dictionary
+            The reply and the time at which the request was sent
+            
+        Raises:
+            ConnectionError: If the connection cannot be re-established
         """
-        super().reset(seed=seed)
+        try:
+            seq = await self._send_message(message)
+            sent = time.perf_counter()
+            return await self._receive_state(seq), sent
+        except ConnectionError as e:
+            self.logger.warning(f"Connection lost during {message['type']}: {e}. Reconnecting")
+            await self._connect()
         
+        lost = self.agent_id in self.connection.lost_agents
+        if message['type'] == 'action' and (lost or self.on_disconnect != "replay"):
+            return {
+                'type': 'state',
+                'agentId': self.agent_id,
+                'data': {},
+                'connection_lost': True
+            }, time.perf_counter()
+        seq = await self._send_message(message)
+        sent = time.perf_counter()
+        return await self._receive_state(seq), sent
+    
+    def _run(self, coro) -> Any:
+        """
+        Run a coroutine on the background loop and wait for its result.
+        
+        Args:
+            coro: Coroutine to hand over to the loop thread
+            
+        Returns:
+            The coroutine's result
+        """
         if self.loop is None:
-            self.loop = asyncio.get_event_loop()
+            self.loop = get_background_loop()
+        return self.loop.run(coro)
+    
+    async def _reset(self, options: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """
+        Send a reset request and wait for the initial state.
         
+        Args:
+            options: Reset data sent to the server, e.g. a start ``position``.
+                Defaults to the ``start_position`` of the environment. A
+                ``state`` saved by ``get_state`` restores it instead
+            
+        Returns:
+            Initial observation and info dictionary
+            
+        Raises:
+            ConnectionError: If the connection cannot be re-established
+        """
         self.current_step = 0
         
         self.logger.info(f"Resetting environment. Agent: {self.agent_id}")
         
-        self.loop.run_until_complete(self._send_message({
+        if options and 'state' in options:
+            return await self._restore(options['state'])
+        data = dict(options or {})
+        if self.start_position is not None and 'position' not in data:
+            data['position'] = self.start_position.tolist()
+        state, _ = await self._exchange({
             'type': 'reset',
             'agentId': self.agent_id,
-            'data': {}
-        }))
+            'data': data
+        })
+        self.connection.lost_agents.discard(self.agent_id)
+        info = self._update_state(state.get('data', {}))
+        if self.reward is not None:
+            info.update(self.reward.info(self.reward.reset(self._position), 0))
+        
+        return self._get_obs(), info
+    
+    async def _restore(self, state: Dict[str, Any]) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """
+        Put the agent back into a saved state and wait for it to be applied.
         
-        state = self.loop.run_until_complete(self._receive_state())
-        if 'data' in state:
-            self._state.update(state.get('data', {}))
+        Args:
+            state: State returned by ``get_state``
+            
+        Returns:
+            Observation and info dictionary of the restored state
+            
+        Raises:
+            RuntimeError: If the server refused the state
+        """
+        reply, _ = await self._exchange({
+            'type': 'restore',
+            'agentId': self.agent_id,
+            'data': {'state': state}
+        })
+        if reply.get('type') == 'error':
+            raise RuntimeError(f"Server refused to restore agent {self.agent_id}: {reply.get('data', {}).get('error')}")
+        self.connection.lost_agents.discard(self.agent_id)
+        info = self._update_state(reply.get('data', {}))
+        if self.reward is not None:
+            info.update(self.reward.info(self.reward.reset(self._position), 0))
+        return self._get_obs(), info
+    
+    async def _snapshot(self) -> Dict[str, Any]:
+        """
+        Ask the server for the agent's current state.
         
-        return self._get_obs(), {}
+        Returns:
+            The saved state
+            
+        Raises:
+            TimeoutError: If the server did not answer in time
+            RuntimeError: If the server does not know the agent
+        """
+        reply, _ = await self._exchange({
+            'type': 'snapshot',
+            'agentId': self.agent_id,
+            'data': {}
+        })
+        if reply.get('stale'):
+            raise TimeoutError(f"No snapshot of agent {self.agent_id} after {self.timeout} seconds")
+        state = reply.get('data', {}).get('state')
+        if reply.get('type') == 'error' or state is None:
+            raise RuntimeError(f"Server has no state to snapshot for agent {self.agent_id}")
+        return state
     
-    def step(self, action: Union[np.ndarray, int]) -> Tuple[Dict[str, np.ndarray], float, bool, bool, Dict[str, Any]]:
+    async def _step(self, action: Union[np.ndarray, int]) -> Tuple[Dict[str, np.ndarray], float, bool, bool, Dict[str, Any]]:
         """
-        Take a step in the environment.
+        Send an action and wait for the resulting state.
         
         Args:
-            action: Either a continuous action [x, y, z] or a discrete action index
+            action: Action from the action space
             
         Returns:
             observation, reward, done, truncated, info
         """
         self.current_step += 1
+        return await self._advance(action, self.current_step)
+    
+    async def _advance(self, action: Union[np.ndarray, int], step: int) -> Tuple[Dict[str, np.ndarray], float, bool, bool, Dict[str, Any]]:
+        """
+        Send the action of a given episode step and wait for the resulting state.
         
-        if isinstance(action, (int, np.integer)):
-            continuous_action = np.zeros(3, dtype=np.float32)
-            if action == 0:
-                continuous_action[2] = -1.0
-            elif action == 1:
-                continuous_action[2] = 1.0
-            elif action == 2:
-                continuous_action[0] = -1.0
-            elif action == 3:
-                continuous_action[0] = 1.0
-            action_data = {'position': continuous_action.tolist()}
-        else:
-            if not isinstance(action, np.ndarray):
-                action = np.array(action, dtype=np.float32)
-            action_data = {'position': action.tolist()}
-        
-        self.loop.run_until_complete(self._send_message({
+        Args:
+            action: Action from the action space
+            step: Episode step the action belongs to
+            
+        Returns:
+            observation, reward, done, truncated, info. With ``timings``,
+            ``info['timings']`` holds the duration in seconds of each phase
+            of the step
+        """
+        start = time.perf_counter()
+        data = self.action_encoder.encode(action)
+        if self.frame_skip > 1:
+            data['repeat'] = self.frame_skip
+        state, sent = await self._exchange({
             'type': 'action',
             'agentId': self.agent_id,
-            'data': action_data
-        }))
+            'data': data
+        })
+        received = time.perf_counter()
+        state_data = state.get('data', {})
+        info = self._update_state(state_data)
+        obs = self._get_obs()
+        done = step >= self.max_episode_steps or bool(state_data.get('done', False))
+        if self.reward is not None:
+            rewards, terminated, fields = self.reward.step(self._position)
+            self._reward = float(rewards[0])
+            done = done or bool(terminated[0])
+            info.update(self.reward.info(fields, 0))
+        end = time.perf_counter()
         
-        state = self.loop.run_until_complete(self._receive_state())
-        if 'data' in state:
-            self._state.update(state.get('data', {}))
+        connection = self.connection
+        self.metrics.record('wait', received - sent)
+        self.metrics.record('observation', end - received)
+        self.metrics.record('step', end - start)
+        if self.timings:
+            info['timings'] = {
+                'serialize': connection.last_serialize,
+                'send': connection.last_send,
+                'wait': received - sent,
+                'parse': connection.last_parse,
+                'observation': end - received,
+                'step': end - start,
+            }
+        if state.get('stale'):
+            info['stale_observation'] = True
         
-        done = self.current_step >= self.max_episode_steps
-        self._state['done'] = done
+        # The server no longer knows the episode: end it rather than train on
+        # observations that do not follow from the actions taken
+        connection_lost = state.get('connection_lost', False) or self.agent_id in self.connection.lost_agents
+        if connection_lost:
+            info['connection_lost'] = True
         
         return (
-            self._get_obs(),
-            self._state.get('reward', 0.0),
+            obs,
+            0.0 if connection_lost else self._reward,
             done,
-            False,
-            {}
+            connection_lost,
+            info
         )
     
+    def reset(self, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """
+        Reset the environment to an initial state.
+        
+        Args:
+            seed: Random seed for reproducibility
+            options: Reset data sent to the server, e.g. a start ``position``,
+                or ``{'state': ...}`` to start from a state saved by
+                ``get_state``
+            
+        Returns:
+            Initial observation and info dictionary
+        """
+        super().reset(seed=seed)
+        self._drain_inflight()
+        return self._run(self._reset(options))
+    
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Save the agent's current state, as the server and scene know it.
+        
+        The state is a JSON-serializable dictionary that can be stored, e.g.
+        as a start state pool or a checkpoint to branch rollouts from.
+        
+        Returns:
+            The saved state
+        """
+        self._drain_inflight()
+        return self._run(self._snapshot())
+    
+    def set_state(self, state: Dict[str, Any]) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """
+        Put the agent back into a state saved by ``get_state``.
+        
+        Unlike ``reset(options={'state': ...})``, the episode goes on: its
+        step count is kept.
+        
+        Args:
+            state: State returned by ``get_state``
+            
+        Returns:
+            Observation and info dictionary of the restored state
+        """
+        self._drain_inflight()
+        return self._run(self._restore(state))
+    
+    def step(self, action: Union[np.ndarray, int]) -> Tuple[Dict[str, np.ndarray], float, bool, bool, Dict[str, Any]]:
+        """
+        Take a step in the environment.
+        
+        Args:
+            action: Action from the action space
+            
+        Returns:
+            observation, reward, done, truncated, info
+            
+        Raises:
+            RuntimeError: If steps sent with ``step_async`` are still in flight
+        """
+        if self._inflight:
+            raise RuntimeError("step() called with steps in flight, collect them with step_wait() first")
+        return self._run(self._step(action))
+    
+    def step_async(self, action: Union[np.ndarray, int]) -> None:
+        """
+        Send an action without waiting for the resulting state.
+        
+        Up to ``max_inflight`` actions can be in flight at once, each tracked
+        by its own sequence number, so the policy can compute the next action
+        while earlier ones travel to the scene and back. Their results are
+        collected in order with ``step_wait``.
+        
+        Args:
+            action: Action from the action space
+            
+        Raises:
+            RuntimeError: If ``max_inflight`` actions are already in flight
+        """
+        if len(self._inflight) >= self.max_inflight:
+            raise RuntimeError(f"{len(self._inflight)} step(s) already in flight, call step_wait() first")
+        if self.loop is None:
+            self.loop = get_background_loop()
+        self.current_step += 1
+        self._inflight.append(self.loop.submit(self._advance(action, self.current_step)))
+    
+    def step_wait(self) -> Tuple[Dict[str, np.ndarray], float, bool, bool, Dict[str, Any]]:
+        """
+        Wait for the result of the oldest action sent with ``step_async``.
+        
+        Returns:
+            observation, reward, done, truncated, info
+            
+        Raises:
+            RuntimeError: If no step is in flight
+        """
+        if not self._inflight:
+            raise RuntimeError("step_wait() called without a pending step_async()")
+        return self._inflight.popleft().result()
+    
+    def _drain_inflight(self) -> None:
+        """Wait for and discard the results of every step still in flight."""
+        while self._inflight:
+            try:
+                self._inflight.popleft().result()
+            except Exception as e:
+                self.logger.warning(f"Discarding failed in-flight step: {e}")
+    
+    def _update_state(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Write a state update into the observation buffer.
+        
+        Args:
+            data: State data received from the server
+            
+        Returns:
+            Fields outside the observation space, for the info dictionary
+        """
+        if 'reward' in data:
+            self._reward = float(data['reward'])
+        if 'position' in data:
+            self._position[0] = data['position']
+        extras = self._obs.write(0, data)
+        if self._frames is not None:
+            extras['camera_frame'] = self._frames.frame
+        return extras
+    
     def _get_obs(self) -> Dict[str, np.ndarray]:
         """
         Convert agent state to observation dictionary.
@@ -249,34 +593,148 @@ class R3FEnv(gym.Env):
         Returns:
             Observation dictionary formatted according to the observation space
         """
-        if isinstance(self.observation_space, spaces.Dict):
-            obs = {}
-            for key in self.observation_space.spaces:
-                if key in self._state:
-                    value = self._state[key]
-                    if isinstance(value, list):
-                        obs[key] = np.array(value, dtype=np.float32)
-                    else:
-                        obs[key] = np.array([value], dtype=np.float32)
-                else:
-                    shape = self.observation_space.spaces[key].shape
-                    obs[key] = np.zeros(shape, dtype=np.float32)
-            return obs
-        else:
-            return np.array(self._state.get('position', [0, 0, 0]), dtype=np.float32)
+        obs = self._obs.observation(0, copy=self.copy_obs)
+        if self._frames is not None:
+            obs[CAMERA_KEY] = self._frames.latest(copy=self.copy_obs)
+        return obs
     
     def close(self) -> None:
         """Close the environment and clean up resources."""
         self.logger.info("Closing R3F environment")
+        self.metrics.close()
         if self.loop:
-            self.loop.run_until_complete(self._disconnect())
+            self._drain_inflight()
+            self.loop.run(self._disconnect())
             self.loop = None
     
-    def render(self) -> None:
+    def render(self) -> Optional[np.ndarray]:
         """
         Render the environment.
         
-        Since the environment is rendered in the React Three Fiber scene,
-        this method doesn't need to do anything.
+        The environment is rendered in the React Three Fiber scene. With a
+        camera configured, its latest frame is returned.
+        
+        Returns:
+            The latest camera frame, or None without a camera
         """
-        pass 
\ No newline at end of file
+        if self._frames is None:
+            return None
+        return self._frames.latest()
+
+
+class AsyncR3FEnv(R3FEnv):
+    """
+    Asyncio-native variant of R3FEnv.
+    
+    ``reset``, ``step`` and ``close`` are coroutines that run on the caller's
+    event loop, so asyncio-based trainers can drive many environments
+    concurrently without going through the background loop thread.
+    
+    Example:
+        ```python
+        env = AsyncR3FEnv(websocket_url="ws://localhost:8765", agent_id="main")
+        obs, info = await env.reset()
+        obs, reward, done, truncated, info = await env.step(env.action_space.sample())
+        await env.close()
+        ```
+    """
+    
+    async def reset(self, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """
+        Reset the environment to an initial state.
+        
+        Args:
+            seed: Random seed for reproducibility
+            options: Reset data sent to the server, e.g. a start ``position``,
+                or ``{'state': ...}`` to start from a saved state
+            
+        Returns:
+            Initial observation and info dictionary
+        """
+        gym.Env.reset(self, seed=seed)
+        await self._drain_inflight_async()
+        return await self._reset(options)
+    
+    async def get_state(self) -> Dict[str, Any]:
+        """
+        Save the agent's current state, see ``R3FEnv.get_state``.
+        
+        Returns:
+            The saved state
+        """
+        await self._drain_inflight_async()
+        return await self._snapshot()
+    
+    async def set_state(self, state: Dict[str, Any]) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """
+        Put the agent back into a saved state, see ``R3FEnv.set_state``.
+        
+        Args:
+            state: State returned by ``get_state``
+            
+        Returns:
+            Observation and info dictionary of the restored state
+        """
+        await self._drain_inflight_async()
+        return await self._restore(state)
+    
+    async def step(self, action: Union[np.ndarray, int]) -> Tuple[Dict[str, np.ndarray], float, bool, bool, Dict[str, Any]]:
+        """
+        Take a step in the environment.
+        
+        Args:
+            action: Action from the action space
+            
+        Returns:
+            observation, reward, done, truncated, info
+            
+        Raises:
+            RuntimeError: If steps sent with ``step_async`` are still in flight
+        """
+        if self._inflight:
+            raise RuntimeError("step() called with steps in flight, collect them with step_wait() first")
+        return await self._step(action)
+    
+    def step_async(self, action: Union[np.ndarray, int]) -> None:
+        """
+        Send an action from a task on the running loop without waiting for the result.
+        
+        Args:
+            action: Action from the action space
+            
+        Raises:
+            RuntimeError: If ``max_inflight`` actions are already in flight
+        """
+        if len(self._inflight) >= self.max_inflight:
+            raise RuntimeError(f"{len(self._inflight)} step(s) already in flight, call step_wait() first")
+        self.current_step += 1
+        self._inflight.append(asyncio.ensure_future(self._advance(action, self.current_step)))
+    
+    async def step_wait(self) -> Tuple[Dict[str, np.ndarray], float, bool, bool, Dict[str, Any]]:
+        """
+        Wait for the result of the oldest action sent with ``step_async``.
+        
+        Returns:
+            observation, reward, done, truncated, info
+            
+        Raises:
+            RuntimeError: If no step is in flight
+        """
+        if not self._inflight:
+            raise RuntimeError("step_wait() called without a pending step_async()")
+        return await self._inflight.popleft()
+    
+    async def _drain_inflight_async(self) -> None:
+        """Wait for and discard the results of every step still in flight."""
+        while self._inflight:
+            try:
+                await self._inflight.popleft()
+            except Exception as e:
+                self.logger.warning(f"Discarding failed in-flight step: {e}")
+    
+    async def close(self) -> None:
+        """Close the environment and clean up resources."""
+        self.logger.info("Closing R3F environment")
+        self.metrics.close()
+        await self._drain_inflight_async()
+        await self._disconnect()
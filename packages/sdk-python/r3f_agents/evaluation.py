@@ -0,0 +1,381 @@
+"""
+Batched policy evaluation over the agent slots of a vectorized environment.
+
+``EvaluationRunner`` plays many episodes at once, one per agent slot of a
+``VecEnv`` such as ``R3FVecEnv``, with a single batched policy call per step
+for all of them. Slot ``i`` plays episodes ``i``, ``i + num_envs``, ... so
+every episode has a fixed seed, ``seed + episode``, whatever order episodes
+finish in. With a pool of start states, the seed picks the state the episode
+is restored to, which makes evaluations repeatable across checkpoints.
+
+``AsyncEvalCallback`` runs the same evaluation as a Stable Baselines3
+callback on a worker thread, with a copy of the policy, so the learner keeps
+training while a checkpoint is evaluated.
+
+Example:
+    ```python
+    env = R3FVecEnv(websocket_url="ws://localhost:8765", agent_ids=[f"eval_{i}" for i in range(8)])
+    runner = EvaluationRunner(env, n_episodes=32, seed=0)
+    for result in runner.episodes(model):
+        print(result.episode, result.episode_return, result.success)
+    ```
+"""
+import os
+import copy
+import json
+import time
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Sequence, Callable, Iterator
+import logging
+
+logger = logging.getLogger("r3f_agents")
+
+try:
+    from stable_baselines3.common.callbacks import BaseCallback
+except ImportError:
+    BaseCallback = object
+
+
+class EpisodeResult:
+    """Outcome of one evaluation episode."""
+
+    def __init__(self, episode: int, seed: Optional[int], slot: int, episode_return: float, length: int,
+                 success: Optional[bool], truncated: bool, step_latency: float, duration: float):
+        """
+        Args:
+            episode: Episode number within the evaluation
+            seed: Seed of the episode, None when the evaluation is not seeded
+            slot: Agent slot that played the episode
+            episode_return: Sum of the episode's rewards
+            length: Number of steps
+            success: ``success`` (or ``is_success``) of the last step's
+                info, None if the environment does not report it
+            truncated: Whether the episode was cut by a time limit
+            step_latency: Mean wall time of a batched step during the
+                episode, in seconds, policy inference excluded
+            duration: Wall time of the whole episode, in seconds
+        """
+        self.episode = episode
+        self.seed = seed
+        self.slot = slot
+        self.episode_return = episode_return
+        self.length = length
+        self.success = success
+        self.truncated = truncated
+        self.step_latency = step_latency
+        self.duration = duration
+
+    def as_dict(self) -> Dict[str, Any]:
+        """JSON-serializable form of the result."""
+        return dict(vars(self))
+
+    def __repr__(self) -> str:
+        return (f"EpisodeResult(episode={self.episode}, return={self.episode_return:.3f}, "
+                f"length={self.length}, success={self.success})")
+
+
+def summarize(results: Sequence[EpisodeResult]) -> Dict[str, float]:
+    """
+    Aggregate episode results.
+
+    Args:
+        results: Results of an evaluation
+
+    Returns:
+        ``episodes``, ``mean_return``, ``std_return``, ``mean_length``,
+        ``success_rate`` (NaN if no episode reports success) and
+        ``step_latency``, the mean step wall time in seconds
+    """
+    if not results:
+        return {'episodes': 0}
+    returns = np.array([result.episode_return for result in results], dtype=np.float64)
+    successes = [result.success for result in results if result.success is not None]
+    steps = sum(result.length for result in results)
+    return {
+        'episodes': len(results),
+        'mean_return': float(returns.mean()),
+        'std_return': float(returns.std()),
+        'mean_length': steps / len(results),
+        'success_rate': float(np.mean(successes)) if successes else float('nan'),
+        'step_latency': sum(result.step_latency * result.length for result in results) / max(steps, 1),
+    }
+
+
+class EvaluationRunner:
+    """
+    Plays evaluation episodes concurrently across the slots of a VecEnv.
+    """
+
+    def __init__(self,
+                 env: Any,
+                 n_episodes: int = 16,
+                 seed: Optional[int] = None,
+                 deterministic: bool = True,
+                 start_states: Optional[Sequence[Dict[str, Any]]] = None,
+                 reset_options: Optional[Callable[[Optional[int]], Dict[str, Any]]] = None):
+        """
+        Initialize the runner.
+
+        Args:
+            env: Vectorized environment to play in. It is stepped from
+                whichever thread calls ``episodes`` or ``run``
+            n_episodes: Number of episodes per evaluation
+            seed: Seed of the first episode. Episode ``k`` is seeded with
+                ``seed + k``
+            deterministic: Ask ``predict`` policies for deterministic actions
+            start_states: Pool of states saved with ``get_states``. Each
+                episode is restored to the state its seed draws from it
+            reset_options: Reset options of an episode, from its seed, in
+                place of ``start_states``. They reach the episodes a slot
+                starts automatically only with environments that use their
+                options for those resets, such as ``R3FVecEnv``
+
+        Raises:
+            ValueError: If options are asked for and the environment does
+                not support them
+        """
+        if start_states is not None and reset_options is None:
+            pool = list(start_states)
+
+            def reset_options(seed: Optional[int]) -> Dict[str, Any]:
+                return {'state': pool[np.random.default_rng(seed).integers(len(pool))]}
+        if reset_options is not None and not hasattr(env, 'set_options'):
+            raise ValueError(f"{type(env).__name__} does not take reset options")
+        self.env = env
+        self.n_episodes = n_episodes
+        self.seed = seed
+        self.deterministic = deterministic
+        self.reset_options = reset_options
+
+    def _episode_seed(self, episode: int) -> Optional[int]:
+        return None if self.seed is None else self.seed + episode
+
+    def _set_options(self, episodes: Sequence[int]) -> None:
+        """Give every slot the reset options of the episode it plays next."""
+        if self.reset_options is not None:
+            self.env.set_options([self.reset_options(self._episode_seed(episode)) for episode in episodes])
+
+    def _predict(self, policy: Any, obs: Any) -> np.ndarray:
+        """One batched policy call for every slot."""
+        if hasattr(policy, 'predict'):
+            actions, _ = policy.predict(obs, deterministic=self.deterministic)
+            return actions
+        return policy(obs)
+
+    def episodes(self, policy: Any) -> Iterator[EpisodeResult]:
+        """
+        Play the evaluation, yielding each episode's result as it ends.
+
+        Slots whose episodes are all done keep being stepped until the
+        others finish, and their results are discarded.
+
+        Args:
+            policy: Stable Baselines3 model or policy, or any callable
+                mapping a batch of observations to a batch of actions
+
+        Yields:
+            Episode results, in the order episodes end
+        """
+        env = self.env
+        num_slots = env.num_envs
+        current = np.arange(num_slots)
+        if self.seed is not None and hasattr(env, 'seed'):
+            env.seed(self.seed)
+        self._set_options(current)
+        obs = env.reset()
+        # Options now belong to the episode each slot starts after this one
+        self._set_options(current + num_slots)
+
+        returns = np.zeros(num_slots, dtype=np.float64)
+        lengths = np.zeros(num_slots, dtype=np.int64)
+        latencies = np.zeros(num_slots, dtype=np.float64)
+        started = np.full(num_slots, time.perf_counter())
+        finished = 0
+        while finished < self.n_episodes:
+            actions = self._predict(policy, obs)
+            start = time.perf_counter()
+            obs, rewards, dones, infos = env.step(actions)
+            end = time.perf_counter()
+            active = current < self.n_episodes
+            returns += np.where(active, rewards, 0.0)
+            lengths += active
+            latencies += np.where(active, end - start, 0.0)
+
+            ended = np.flatnonzero(np.asarray(dones) & active)
+            for i in ended.tolist():
+                info = infos[i]
+                success = info.get('success', info.get('is_success'))
+                yield EpisodeResult(
+                    episode=int(current[i]),
+                    seed=self._episode_seed(int(current[i])),
+                    slot=i,
+                    episode_return=float(returns[i]),
+                    length=int(lengths[i]),
+                    success=None if success is None else bool(success),
+                    truncated=bool(info.get('TimeLimit.truncated', False)),
+                    step_latency=float(latencies[i] / lengths[i]),
+                    duration=end - float(started[i]),
+                )
+                finished += 1
+                current[i] += num_slots
+                returns[i] = lengths[i] = latencies[i] = 0
+                started[i] = end
+            if len(ended):
+                self._set_options(current + num_slots)
+
+    def run(self, policy: Any,
+            on_episode: Optional[Callable[[EpisodeResult], None]] = None) -> List[EpisodeResult]:
+        """
+        Play the whole evaluation.
+
+        Args:
+            policy: See ``episodes``
+            on_episode: Called with each result as its episode ends
+
+        Returns:
+            Episode results, sorted by episode number
+        """
+        results = []
+        for result in self.episodes(policy):
+            if on_episode is not None:
+                on_episode(result)
+            results.append(result)
+        return sorted(results, key=lambda result: result.episode)
+
+
+class AsyncEvalCallback(BaseCallback):
+    """
+    Stable Baselines3 callback evaluating the policy without pausing training.
+
+    Every ``eval_freq`` calls, the policy is copied and evaluated by an
+    ``EvaluationRunner`` on a worker thread while the learner goes on. The
+    results are logged under ``eval/`` at the first step after they are in,
+    with ``eval/timesteps`` giving the step the evaluated policy is from. An
+    evaluation that comes due while the previous one still runs is skipped.
+
+    Example:
+        ```python
+        eval_env = R3FVecEnv(websocket_url="ws://localhost:8765", agent_ids=[f"eval_{i}" for i in range(8)])
+        model.learn(100_000, callback=AsyncEvalCallback(eval_env, eval_freq=5_000, best_model_save_path="./models"))
+        ```
+    """
+
+    def __init__(self,
+                 eval_env: Any,
+                 n_eval_episodes: int = 16,
+                 eval_freq: int = 10000,
+                 seed: Optional[int] = 0,
+                 deterministic: bool = True,
+                 start_states: Optional[Sequence[Dict[str, Any]]] = None,
+                 best_model_save_path: Optional[str] = None,
+                 log_path: Optional[str] = None,
+                 verbose: int = 1):
+        """
+        Initialize the callback.
+
+        Args:
+            eval_env: Vectorized environment used only for evaluation, with
+                agents of its own
+            n_eval_episodes: Episodes per evaluation
+            eval_freq: Calls of the callback between two evaluations
+            seed: Seed of the first episode, the same for every evaluation so
+                that checkpoints are compared on the same episodes
+            deterministic: Evaluate deterministic actions
+            start_states: Pool of start states, see ``EvaluationRunner``
+            best_model_save_path: Directory ``best_model.zip`` is saved to,
+                with the weights of the best evaluated policy
+            log_path: Directory ``evaluations.jsonl`` is written to, one line
+                per episode
+            verbose: Print a summary of every evaluation when 1
+
+        Raises:
+            ImportError: If stable-baselines3 is not installed
+        """
+        if BaseCallback is object:
+            raise ImportError("AsyncEvalCallback requires stable-baselines3")
+        super().__init__(verbose)
+        self.runner = EvaluationRunner(eval_env, n_eval_episodes, seed=seed, deterministic=deterministic,
+                                       start_states=start_states)
+        self.eval_freq = eval_freq
+        self.best_model_save_path = best_model_save_path
+        self.log_path = log_path
+        self.best_mean_reward = -np.inf
+        self.last_summary: Dict[str, float] = {}
+        self.skipped = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._future: Optional[Future] = None
+        self._policy = None
+        self._timesteps = 0
+
+    def _init_callback(self) -> None:
+        for path in (self.best_model_save_path, self.log_path):
+            if path is not None:
+                os.makedirs(path, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="r3f-eval")
+
+    def _on_step(self) -> bool:
+        self._collect()
+        if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
+            self._launch()
+        return True
+
+    def _on_training_end(self) -> None:
+        if self._future is not None:
+            self._future.exception()
+            self._collect()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _launch(self) -> None:
+        """Start evaluating a copy of the current policy."""
+        if self._future is not None:
+            self.skipped += 1
+            return
+        self._policy = copy.deepcopy(self.model.policy)
+        self._policy.set_training_mode(False)
+        self._timesteps = self.num_timesteps
+        self._future = self._executor.submit(self._evaluate, self._policy, self._timesteps)
+
+    def _evaluate(self, policy: Any, timesteps: int) -> List[EpisodeResult]:
+        """Run on the worker thread."""
+        if self.log_path is None:
+            return self.runner.run(policy)
+        with open(os.path.join(self.log_path, "evaluations.jsonl"), "a") as log:
+            def write(result: EpisodeResult) -> None:
+                log.write(json.dumps({'timesteps': timesteps, **result.as_dict()}) + "\n")
+                log.flush()
+            return self.runner.run(policy, on_episode=write)
+
+    def _collect(self) -> None:
+        """Log the results of a finished evaluation."""
+        if self._future is None or not self._future.done():
+            return
+        future, policy, self._future, self._policy = self._future, self._policy, None, None
+        try:
+            results = future.result()
+        except Exception as e:
+            logger.error(f"Evaluation at {self._timesteps} timesteps failed: {e}")
+            return
+        summary = summarize(results)
+        self.last_summary = summary
+        for key in ('mean_return', 'std_return', 'mean_length', 'success_rate', 'step_latency'):
+            self.logger.record(f"eval/{key}", summary[key])
+        self.logger.record("eval/timesteps", self._timesteps)
+        if self.verbose >= 1:
+            print(f"Eval at {self._timesteps} timesteps: return={summary['mean_return']:.2f} "
+                  f"+/- {summary['std_return']:.2f}, length={summary['mean_length']:.1f}, "
+                  f"success={summary['success_rate']:.2f}")
+        if summary['mean_return'] > self.best_mean_reward:
+            self.best_mean_reward = summary['mean_return']
+            if self.best_model_save_path is not None:
+                self._save_best(policy)
+
+    def _save_best(self, policy: Any) -> None:
+        """Save the model with the weights of the evaluated policy."""
+        current = copy.deepcopy(self.model.policy.state_dict())
+        self.model.policy.load_state_dict(policy.state_dict())
+        try:
+            self.model.save(os.path.join(self.best_model_save_path, "best_model"))
+        finally:
+            self.model.policy.load_state_dict(current)
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional, TypeVar
+
+logger = logging.getLogger("r3f_agents")
+
+T = TypeVar("T")
+
+
+class BackgroundLoop:
+    """
+    Long-lived asyncio event loop running in a daemon thread.
+
+    The loop owns every WebSocket created by the synchronous environments, so
+    connections stay bound to a single loop for their whole lifetime. Work is
+    handed to it from the caller's thread with ``run_coroutine_threadsafe``,
+    which makes the sync Gymnasium API usable from Jupyter or any host that is
+    already running its own event loop.
+    """
+
+    def __init__(self, name: str = "r3f-agents-loop"):
+        """
+        Start the loop thread.
+
+        Args:
+            name: Name given to the background thread
+        """
+        self.loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run_forever, name=name, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        logger.debug(f"Background event loop started in thread {name}")
+
+    def _run_forever(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._started.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the loop thread is alive and accepting work."""
+        return self._thread.is_alive() and not self.loop.is_closed()
+
+    def in_loop_thread(self) -> bool:
+        """Whether the caller is executing on the loop thread itself."""
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> "Future[T]":
+        """
+        Schedule a coroutine on the loop without waiting for it.
+
+        Args:
+            coro: Coroutine to run on the background loop
+
+        Returns:
+            A concurrent future resolved with the coroutine's result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """
+        Run a coroutine on the loop and block until it completes.
+
+        Args:
+            coro: Coroutine to run on the background loop
+            timeout: Maximum number of seconds to wait for the result
+
+        Returns:
+            The coroutine's result
+
+        Raises:
+            RuntimeError: If called from the loop thread, which would deadlock
+        """
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError(
+                "Cannot block on the R3F background loop from inside it; "
+                "use AsyncR3FEnv from asyncio code instead"
+            )
+        return self.submit(coro).result(timeout)
+
+    def stop(self) -> None:
+        """Stop the loop and join its thread."""
+        if self.is_running:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            logger.debug("Background event loop stopped")
+
+
+_default_loop: Optional[BackgroundLoop] = None
+_default_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """
+    Return the process-wide background loop, starting it on first use.
+
+    Returns:
+        The shared BackgroundLoop instance
+    """
+    global _default_loop
+    with _default_loop_lock:
+        if _default_loop is None or not _default_loop.is_running:
+            _default_loop = BackgroundLoop()
+        return _default_loop
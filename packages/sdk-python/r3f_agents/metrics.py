@@ -0,0 +1,268 @@
+"""
+Hot-path instrumentation for the R3F environments.
+
+Every connection owns a ``Metrics`` object recording per-phase latency
+histograms and event counters. Environments expose it as ``env.metrics``,
+can add the phase timings of each step to its ``info`` dictionary, and can
+serve it in the Prometheus text format from a local HTTP port.
+"""
+import math
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+logger = logging.getLogger("r3f_agents")
+
+# Step phases timed on the hot path
+PHASES = ('serialize', 'send', 'wait', 'parse', 'observation', 'step')
+
+# Events counted on the hot path
+COUNTERS = ('timeouts', 'stale_observations', 'dropped_messages', 'stale_replies', 'reconnects', 'resyncs',
+            'camera_frames', 'shard_failures', 'shard_moves', 'bytes_sent', 'bytes_received', 'frames_received',
+            'binary_frames_received')
+
+# Quantiles reported in snapshots and Prometheus summaries
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram in the style of HdrHistogram.
+
+    Values are recorded in microseconds. Values below ``2 * sub_buckets`` are
+    counted exactly; above that, every power of two is split into
+    ``sub_buckets`` linear buckets, which bounds the relative error of any
+    reported quantile by ``1 / sub_buckets`` while using a fixed, small array.
+    """
+
+    def __init__(self, sub_buckets: int = 64, max_seconds: float = 3600.0):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            sub_buckets: Linear buckets per power of two. Must be a power of two
+            max_seconds: Largest value that can be recorded; larger values are
+                clamped to it
+        """
+        self.sub_buckets = sub_buckets
+        self._shift = sub_buckets.bit_length() - 1
+        self._exact = 2 * sub_buckets
+        self.max_value = int(max_seconds * 1e6)
+        self.counts = np.zeros(self._index(self.max_value) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _index(self, value: int) -> int:
+        if value < self._exact:
+            return value
+        exponent = value.bit_length() - self._shift - 1
+        return self._exact + (exponent - 1) * self.sub_buckets + (value >> exponent) - self.sub_buckets
+
+    def _lower_bound(self, index: int) -> int:
+        if index < self._exact:
+            return index
+        exponent, offset = divmod(index - self._exact, self.sub_buckets)
+        return (offset + self.sub_buckets) << (exponent + 1)
+
+    def record(self, seconds: float) -> None:
+        """
+        Record one latency.
+
+        Args:
+            seconds: Measured latency in seconds
+        """
+        value = min(int(seconds * 1e6), self.max_value)
+        self.counts[self._index(max(value, 0))] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        Latency below which a fraction ``q`` of the recorded values fall.
+
+        Args:
+            q: Quantile in ``[0, 1]``
+
+        Returns:
+            The quantile in seconds, or 0.0 if nothing was recorded
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self._lower_bound(index) / 1e6, self.max)
+
+    @property
+    def mean(self) -> float:
+        """Mean recorded latency in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self) -> None:
+        """Forget every recorded value."""
+        self.counts.fill(0)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Summary of the recorded latencies.
+
+        Returns:
+            count, mean, min, max and the ``QUANTILES``, in seconds
+        """
+        summary = {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min if self.count else 0.0,
+            'max': self.max,
+        }
+        for q in QUANTILES:
+            summary[f'p{q * 100:g}'] = self.quantile(q)
+        return summary
+
+
+class Metrics:
+    """
+    Latency histograms and event counters of one connection.
+
+    Example:
+        ```python
+        env = R3FEnv(websocket_url="ws://localhost:8765", metrics_port=9100)
+        ...
+        print(env.metrics.snapshot()['phases']['wait']['p99'])
+        ```
+    """
+
+    def __init__(self, labels: Optional[Dict[str, str]] = None):
+        """
+        Initialize empty metrics.
+
+        Args:
+            labels: Prometheus labels added to every exported sample
+        """
+        self.labels = dict(labels or {})
+        self.phases: Dict[str, LatencyHistogram] = {phase: LatencyHistogram() for phase in PHASES}
+        self.counters: Dict[str, int] = {name: 0 for name in COUNTERS}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def record(self, phase: str, seconds: float) -> None:
+        """
+        Record the duration of a phase.
+
+        Args:
+            phase: One of ``PHASES``
+            seconds: Measured duration in seconds
+        """
+        self.phases[phase].record(seconds)
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        """
+        Increment an event counter.
+
+        Args:
+            counter: One of ``COUNTERS``
+            amount: Number of events
+        """
+        self.counters[counter] += amount
+
+    def reset(self) -> None:
+        """Zero every histogram and counter."""
+        for histogram in self.phases.values():
+            histogram.reset()
+        for name in self.counters:
+            self.counters[name] = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Current metrics as plain Python values.
+
+        Returns:
+            ``{'phases': {phase: summary}, 'counters': {name: value}}``
+        """
+        return {
+            'phases': {phase: histogram.snapshot() for phase, histogram in self.phases.items()},
+            'counters': dict(self.counters),
+        }
+
+    def to_prometheus(self, prefix: str = "r3f") -> str:
+        """
+        Format the metrics in the Prometheus text exposition format.
+
+        Phases are exported as summaries of seconds, counters as counters.
+
+        Args:
+            prefix: Prefix of every metric name
+
+        Returns:
+            The exposition text
+        """
+        lines = [f"# TYPE {prefix}_phase_seconds summary"]
+        for phase, histogram in self.phases.items():
+            labels = self._labels(('phase', phase))
+            for q in QUANTILES:
+                lines.append(f'{prefix}_phase_seconds{{{self._labels(("phase", phase), ("quantile", f"{q:g}"))}}} '
+                             f'{histogram.quantile(q):.9g}')
+            lines.append(f"{prefix}_phase_seconds_sum{{{labels}}} {histogram.total:.9g}")
+            lines.append(f"{prefix}_phase_seconds_count{{{labels}}} {histogram.count}")
+        for name, value in self.counters.items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            labels = self._labels()
+            lines.append(f"{prefix}_{name}_total{{{labels}}} {value}" if labels else f"{prefix}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def _labels(self, *extra: Tuple[str, str]) -> str:
+        pairs = list(self.labels.items()) + list(extra)
+        return ",".join(f'{key}="{value}"' for key, value in pairs)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Serve the metrics on ``/metrics`` for Prometheus to scrape, from a
+        daemon thread.
+
+        Args:
+            port: Port to listen on. 0 picks a free port
+            host: Interface to listen on
+
+        Returns:
+            The running HTTP server
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.close()
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="r3f-metrics", daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def close(self) -> None:
+        """Stop the HTTP server started by ``serve``, if any."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,178 @@
+import numpy as np
+from gymnasium import spaces
+from typing import Dict, Any, Optional, Tuple, Union
+import logging
+
+logger = logging.getLogger("r3f_agents")
+
+# State fields handled by the environments themselves rather than observed
+STATE_FIELDS = ('reward', 'done', 'action')
+
+# Key a non-Dict observation space is read from in the agent state
+DEFAULT_KEY = 'position'
+
+
+class ObservationBuffer:
+    """
+    Fixed observation layout backed by one contiguous float32 buffer.
+
+    The layout is computed once from the observation space: every key gets a
+    slice of a single ``(num_agents, width)`` array and a view reshaped to
+    ``(num_agents, *shape)``. Incoming states are written into those views in
+    place, so building an observation never allocates unless a copy is asked
+    for.
+
+    Example:
+        ```python
+        buffer = ObservationBuffer(env.observation_space, num_agents=4)
+        extras = buffer.write(0, {'position': [1, 2, 3], 'sensor': 7})
+        obs = buffer.observation(0)
+        ```
+    """
+
+    def __init__(self, observation_space: spaces.Space, num_agents: int = 1, data: Optional[np.ndarray] = None):
+        """
+        Build the layout and allocate the buffer.
+
+        Args:
+            observation_space: Per-agent observation space. Either a Box, or a
+                Dict of Box and Discrete spaces
+            num_agents: Number of agents stored side by side
+            data: Existing ``(num_agents, width)`` float32 array to use as the
+                backing store, e.g. one living in shared memory
+
+        Raises:
+            ValueError: If the observation space contains unsupported spaces
+                or ``data`` does not match the layout
+        """
+        self.observation_space = observation_space
+        self.num_agents = num_agents
+        self.is_dict = isinstance(observation_space, spaces.Dict)
+
+        subspaces = observation_space.spaces if self.is_dict else {DEFAULT_KEY: observation_space}
+        self.fields: Dict[str, Tuple[int, Tuple[int, ...]]] = {}
+        width = 0
+        for key, space in subspaces.items():
+            if not isinstance(space, (spaces.Box, spaces.Discrete)):
+                raise ValueError(f"Unsupported observation space for key '{key}': {space}")
+            shape = tuple(space.shape)
+            self.fields[key] = (width, shape)
+            width += int(np.prod(shape, dtype=np.int64))
+
+        self.width = width
+        if data is None:
+            data = np.zeros((num_agents, width), dtype=np.float32)
+        elif data.shape != (num_agents, width) or data.dtype != np.float32:
+            raise ValueError(f"Backing array must be float32 with shape {(num_agents, width)}")
+        self.data = data
+        self.views: Dict[str, np.ndarray] = {}
+        for key, (offset, shape) in self.fields.items():
+            size = int(np.prod(shape, dtype=np.int64))
+            view = self.data[:, offset:offset + size]
+            view.shape = (num_agents,) + shape
+            self.views[key] = view
+
+    def write(self, index: int, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Write an agent state into the buffer in place.
+
+        Args:
+            index: Agent slot to write
+            state: Agent state as received from the server
+
+        Returns:
+            Fields that are not part of the observation space, to be surfaced
+            in the step ``info`` dictionary
+        """
+        extras = {}
+        for key, value in state.items():
+            view = self.views.get(key)
+            if view is None:
+                if key not in STATE_FIELDS:
+                    extras[key] = value
+                continue
+            try:
+                view[index] = value
+            except (ValueError, TypeError):
+                logger.warning(f"Ignoring '{key}' with unexpected shape for observation {view.shape[1:]}")
+                extras[key] = value
+        return extras
+
+    def write_observation(self, index: int, obs: Union[Dict[str, np.ndarray], np.ndarray]) -> None:
+        """
+        Write an already formatted observation into the buffer in place.
+
+        Args:
+            index: Agent slot to write
+            obs: Observation formatted according to the observation space
+        """
+        if self.is_dict:
+            for key, view in self.views.items():
+                view[index] = obs[key]
+        else:
+            self.views[DEFAULT_KEY][index] = obs
+
+    @staticmethod
+    def width_of(observation_space: spaces.Space) -> int:
+        """
+        Number of float32 values one agent occupies in the buffer.
+
+        Args:
+            observation_space: Per-agent observation space
+
+        Returns:
+            The row width of the buffer
+        """
+        subspaces = observation_space.spaces if isinstance(observation_space, spaces.Dict) else {DEFAULT_KEY: observation_space}
+        return sum(int(np.prod(space.shape, dtype=np.int64)) for space in subspaces.values())
+
+    def clear(self, index: Optional[int] = None) -> None:
+        """
+        Zero one agent slot, or every slot.
+
+        Args:
+            index: Agent slot to clear, or None for all agents
+        """
+        if index is None:
+            self.data.fill(0.0)
+        else:
+            self.data[index].fill(0.0)
+
+    def observation(self, index: int, copy: bool = True) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Observation of one agent.
+
+        Args:
+            index: Agent slot to read
+            copy: Return copies. Otherwise return read-only views that are
+                overwritten by the next state update
+
+        Returns:
+            Observation formatted according to the observation space
+        """
+        return self._read(lambda view: view[index], copy)
+
+    def batch(self, copy: bool = True) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Observations of all agents stacked as ``(num_agents, ...)``.
+
+        Args:
+            copy: Return copies. Otherwise return read-only views that are
+                overwritten by the next state update
+
+        Returns:
+            Stacked observations formatted according to the observation space
+        """
+        return self._read(lambda view: view, copy)
+
+    def _read(self, select, copy: bool) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        obs = {}
+        for key, view in self.views.items():
+            value = select(view)
+            if copy:
+                value = value.copy()
+            else:
+                value = value.view()
+                value.flags.writeable = False
+            obs[key] = value
+        return obs if self.is_dict else obs[DEFAULT_KEY]
@@ -0,0 +1,281 @@
+"""
+Compact binary wire format for R3F agent messages.
+
+A binary WebSocket frame holds one or more records laid out back to back.
+Each record is a fixed 12-byte little-endian header followed by ``count``
+float32 values:
+
+    offset  size  field
+    0       1     kind      (KIND_STATE, KIND_ACTION or KIND_RESET)
+    1       1     flags     (FLAG_POSITION, FLAG_ROTATION, ...)
+    2       2     agent     index of the agent in the negotiated agent list
+    4       4     seq       request sequence number, NO_SEQ when absent
+    8       2     count     number of float32 values in the payload
+    10      2     repeat    ticks an action is applied for, 0 when absent
+
+State payloads are ``position[3], rotation[3], reward, done``. Action
+payloads hold ``position[3]`` and/or ``rotation[3]`` as announced by the
+flags. Reset records carry no payload.
+
+Camera frame records (KIND_FRAME) put the frame number in ``seq`` and 0 in
+``count``, and are followed by an 8-byte frame header (width u16, height u16,
+channels u8, 3 reserved bytes) and ``width * height * channels`` uint8 pixels,
+rows top to bottom. They are decoded into ``camera`` messages.
+
+The format is opt-in: the client announces it with an ``info`` message
+``{"protocol": "binary", "agents": [...]}`` and switches only once the server
+acknowledges with the same protocol. Anything that cannot be expressed as a
+record (named actions, reset options, extra state fields) keeps using JSON.
+
+JSON states can also be delta-encoded, announced with ``"delta": true`` in
+the same ``info`` message. Each such state carries a ``version`` counting up
+per agent; keyframes hold the full state and messages flagged ``delta`` only
+the fields that changed since the previous version. A client that misses a
+version asks for a keyframe with an ``info`` message ``{"resync": [...]}``.
+"""
+import struct
+import numpy as np
+from typing import Dict, Any, Optional, List, Sequence
+
+PROTOCOL_JSON = "json"
+PROTOCOL_BINARY = "binary"
+
+KIND_STATE = 1
+KIND_ACTION = 2
+KIND_RESET = 3
+KIND_FRAME = 4
+
+FLAG_POSITION = 0x01
+FLAG_ROTATION = 0x02
+FLAG_DONE = 0x04
+
+NO_SEQ = 0xFFFFFFFF
+
+KEYFRAME_INTERVAL = 100
+
+HEADER = struct.Struct("<BBHIHH")
+FRAME_HEADER = struct.Struct("<HHB3x")
+STATE_SIZE = 8
+
+_KIND_BY_TYPE = {'state': KIND_STATE, 'action': KIND_ACTION, 'reset': KIND_RESET}
+_TYPE_BY_KIND = {kind: message_type for message_type, kind in _KIND_BY_TYPE.items()}
+_ACTION_FIELDS = (('position', FLAG_POSITION), ('rotation', FLAG_ROTATION))
+
+
+class ProtocolError(ValueError):
+    """Raised when a binary frame is malformed."""
+
+
+def encode_record(message_type: str, agent_index: int, data: Dict[str, Any], seq: Optional[int] = None) -> Optional[bytes]:
+    """
+    Encode one message as a binary record.
+
+    Args:
+        message_type: ``state``, ``action`` or ``reset``
+        agent_index: Index of the agent in the negotiated agent list
+        data: Message payload
+        seq: Request sequence number
+
+    Returns:
+        The encoded record, or None if the message has no binary form and
+        must be sent as JSON
+    """
+    kind = _KIND_BY_TYPE.get(message_type)
+    if kind is None:
+        return None
+    seq = NO_SEQ if seq is None else seq
+
+    if kind == KIND_RESET:
+        if data:
+            return None
+        return HEADER.pack(kind, 0, agent_index, seq, 0, 0)
+
+    if kind == KIND_ACTION:
+        if any(key not in ('position', 'rotation', 'repeat') for key in data):
+            return None
+        flags = 0
+        parts = []
+        for key, flag in _ACTION_FIELDS:
+            if key in data:
+                flags |= flag
+                parts.append(np.asarray(data[key], dtype='<f4').reshape(3))
+        payload = np.concatenate(parts) if parts else np.empty(0, dtype='<f4')
+        repeat = int(data.get('repeat', 0))
+        return HEADER.pack(kind, flags, agent_index, seq, payload.size, repeat) + payload.tobytes()
+
+    if any(key not in ('position', 'rotation', 'reward', 'done', 'action') for key in data):
+        return None
+    payload = np.zeros(STATE_SIZE, dtype='<f4')
+    payload[0:3] = data.get('position', (0.0, 0.0, 0.0))
+    payload[3:6] = data.get('rotation', (0.0, 0.0, 0.0))
+    payload[6] = data.get('reward', 0.0)
+    payload[7] = 1.0 if data.get('done') else 0.0
+    flags = FLAG_POSITION | FLAG_ROTATION | (FLAG_DONE if data.get('done') else 0)
+    return HEADER.pack(kind, flags, agent_index, seq, STATE_SIZE, 0) + payload.tobytes()
+
+
+def encode_camera_frame(agent_index: int, frame: int, pixels: np.ndarray) -> bytes:
+    """
+    Encode a camera image as a binary record.
+
+    Args:
+        agent_index: Index of the agent in the negotiated agent list
+        frame: Frame number
+        pixels: ``(height, width, channels)`` uint8 image
+
+    Returns:
+        The encoded record
+    """
+    height, width, channels = pixels.shape
+    header = HEADER.pack(KIND_FRAME, 0, agent_index, frame, 0, 0) + FRAME_HEADER.pack(width, height, channels)
+    return header + np.ascontiguousarray(pixels, dtype=np.uint8).tobytes()
+
+
+def decode_frame(frame: bytes, agent_ids: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Decode a binary frame into messages.
+
+    Payload arrays are read-only float32 views into ``frame`` created with
+    ``np.frombuffer``, so no per-value Python objects are built. Camera
+    frames become ``camera`` messages whose ``data`` is a read-only
+    ``(height, width, channels)`` uint8 view into ``frame``.
+
+    Args:
+        frame: Binary WebSocket frame
+        agent_ids: Negotiated agent list used to resolve agent indices
+
+    Returns:
+        Decoded messages in JSON message form
+
+    Raises:
+        ProtocolError: If the frame is truncated or references an unknown
+            agent index or record kind
+    """
+    messages = []
+    offset = 0
+    size = len(frame)
+    while offset < size:
+        if size - offset < HEADER.size:
+            raise ProtocolError(f"Truncated record header at byte {offset}")
+        kind, flags, agent_index, seq, count, repeat = HEADER.unpack_from(frame, offset)
+        offset += HEADER.size
+        if kind == KIND_FRAME:
+            if size - offset < FRAME_HEADER.size:
+                raise ProtocolError(f"Truncated camera frame header at byte {offset}")
+            if agent_index >= len(agent_ids):
+                raise ProtocolError(f"Unknown agent index {agent_index}")
+            width, height, channels = FRAME_HEADER.unpack_from(frame, offset)
+            offset += FRAME_HEADER.size
+            end = offset + width * height * channels
+            if end > size:
+                raise ProtocolError(f"Truncated camera frame at byte {offset}")
+            pixels = np.frombuffer(frame, dtype=np.uint8, count=end - offset, offset=offset)
+            messages.append({
+                'type': 'camera',
+                'agentId': agent_ids[agent_index],
+                'frame': seq,
+                'data': pixels.reshape(height, width, channels),
+            })
+            offset = end
+            continue
+        end = offset + 4 * count
+        if end > size:
+            raise ProtocolError(f"Truncated record payload at byte {offset}")
+        if agent_index >= len(agent_ids):
+            raise ProtocolError(f"Unknown agent index {agent_index}")
+        message_type = _TYPE_BY_KIND.get(kind)
+        if message_type is None:
+            raise ProtocolError(f"Unknown record kind {kind}")
+
+        values = np.frombuffer(frame, dtype='<f4', count=count, offset=offset)
+        offset = end
+
+        if kind == KIND_STATE:
+            if count < STATE_SIZE:
+                raise ProtocolError(f"State record holds {count} values, expected {STATE_SIZE}")
+            data = {
+                'position': values[0:3],
+                'rotation': values[3:6],
+                'reward': float(values[6]),
+                'done': bool(flags & FLAG_DONE),
+            }
+        elif kind == KIND_ACTION:
+            data = {}
+            cursor = 0
+            for key, flag in _ACTION_FIELDS:
+                if flags & flag:
+                    data[key] = values[cursor:cursor + 3]
+                    cursor += 3
+            if repeat:
+                data['repeat'] = repeat
+        else:
+            data = {}
+
+        message = {'type': message_type, 'agentId': agent_ids[agent_index], 'data': data}
+        if seq != NO_SEQ:
+            message['seq'] = seq
+        messages.append(message)
+    return messages
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    return a == b
+
+
+class DeltaEncoder:
+    """
+    Sender side of delta-encoded states for one connection.
+
+    Keeps the last state sent for every agent and turns each new state into
+    a versioned keyframe or delta message, mirroring the relay server.
+    """
+
+    def __init__(self, keyframe_interval: int = KEYFRAME_INTERVAL):
+        """
+        Initialize the encoder.
+
+        Args:
+            keyframe_interval: Number of deltas sent between two keyframes
+        """
+        self.keyframe_interval = keyframe_interval
+        # agent ID -> [version, state, deltas since the last keyframe]
+        self._baselines: Dict[str, list] = {}
+
+    def encode(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Version a state message against the agent's baseline.
+
+        Args:
+            message: ``state`` message holding the agent's state
+
+        Returns:
+            A new message holding either the full state or the changed fields
+        """
+        agent_id = message['agentId']
+        data = message['data']
+        baseline = self._baselines.get(agent_id)
+        version = 1 if baseline is None else baseline[0] + 1
+        # States only ever gain fields, so partial updates merge into the baseline
+        state = data if baseline is None else {**baseline[1], **data}
+        if baseline is not None and baseline[2] < self.keyframe_interval:
+            previous = baseline[1]
+            delta = {
+                key: value for key, value in data.items()
+                if key not in previous or not _same_value(previous[key], value)
+            }
+            if len(delta) < len(state):
+                self._baselines[agent_id] = [version, state, baseline[2] + 1]
+                return {**message, 'data': delta, 'version': version, 'delta': True}
+        self._baselines[agent_id] = [version, state, 0]
+        return {**message, 'data': state, 'version': version}
+
+    def forget(self, agent_id: str) -> None:
+        """
+        Make the next state of an agent a keyframe.
+
+        Args:
+            agent_id: Agent whose baseline is dropped
+        """
+        self._baselines.pop(agent_id, None)
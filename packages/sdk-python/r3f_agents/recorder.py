@@ -0,0 +1,446 @@
+"""
+Recording of every transition to memory-mapped column files.
+
+A run directory holds one subdirectory per column, such as ``action`` or
+``observation.position``, each split into fixed-size chunks stored as
+``.npy`` files, plus two small files:
+
+- ``meta.json``: the dtype and shape of every column, the chunk size and the
+  number of transitions written so far
+- ``episodes.jsonl``: one line per episode with its first transition, length
+  and return, appended when the episode ends
+
+Chunks are preallocated and filled through memory maps by a background
+thread. The step loop only copies each transition into an in-memory block of
+``batch_size`` rows, and full blocks are handed to the thread. ``TrajectoryReader``
+memory-maps the chunks and slices single episodes without loading the run.
+"""
+import os
+import json
+import time
+import queue
+import threading
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+from typing import Dict, Any, Optional, List, Tuple
+import logging
+
+logger = logging.getLogger("r3f_agents")
+
+FORMAT_VERSION = 1
+
+# Columns recorded besides the observations and the action
+SCALAR_COLUMNS = {
+    'reward': np.float32,
+    'terminated': np.bool_,
+    'truncated': np.bool_,
+    'timestamp': np.float64,
+}
+
+
+def _leaf_spaces(space: spaces.Space, prefix: str) -> List[Tuple[str, spaces.Space]]:
+    """List the non-Dict subspaces of a space with dotted column names."""
+    if isinstance(space, spaces.Dict):
+        leaves = []
+        for key, subspace in space.spaces.items():
+            leaves.extend(_leaf_spaces(subspace, f"{prefix}.{key}"))
+        return leaves
+    if space.dtype is None:
+        raise ValueError(f"Cannot record values of {space}")
+    return [(prefix, space)]
+
+
+def _flatten(value: Any, prefix: str, out: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Copy a possibly nested observation into ``out`` under dotted column names."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(item, f"{prefix}.{key}", out)
+    else:
+        out[prefix] = np.array(value, copy=True)
+    return out
+
+
+def _unflatten(columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Nest dotted column names back into dictionaries."""
+    nested: Dict[str, Any] = {}
+    for name, value in columns.items():
+        *parents, leaf = name.split('.')
+        node = nested
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = value
+    return nested
+
+
+class TrajectoryWriter:
+    """
+    Append-only writer of a run directory.
+
+    ``append`` copies a transition into the current block; full blocks are
+    written into the chunk files by a background thread. Opening an existing
+    run directory with the same columns continues it.
+    """
+
+    def __init__(self, directory: str, columns: Dict[str, Tuple[Any, Tuple[int, ...]]],
+                 chunk_size: int = 65536, batch_size: int = 64, queue_size: int = 64):
+        """
+        Initialize the writer and start its thread.
+
+        Args:
+            directory: Run directory, created if needed
+            columns: dtype and per-transition shape keyed by column name
+            chunk_size: Transitions per chunk file
+            batch_size: Transitions per block handed to the writer thread
+            queue_size: Blocks that may wait for the writer thread before
+                ``append`` blocks
+
+        Raises:
+            ValueError: If the directory holds a run with different columns
+        """
+        self.directory = directory
+        self.columns = {name: (np.dtype(dtype), tuple(shape)) for name, (dtype, shape) in columns.items()}
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.num_transitions = 0
+        self.error: Optional[BaseException] = None
+
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['columns'] != self._column_meta() or meta['chunk_size'] != chunk_size:
+                raise ValueError(f"{directory} holds a recording with different columns or chunk size")
+            self.num_transitions = meta['num_transitions']
+        self.submitted = self.num_transitions
+        self._block = self._new_block()
+        self._fill = 0
+
+        self._chunks: Dict[str, np.memmap] = {}
+        self._chunk_index = -1
+        self._episodes = open(os.path.join(directory, "episodes.jsonl"), "a")
+        self._write_meta()
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="r3f-recorder", daemon=True)
+        self._thread.start()
+
+    def _column_meta(self) -> Dict[str, Any]:
+        return {name: {'dtype': dtype.str, 'shape': list(shape)} for name, (dtype, shape) in self.columns.items()}
+
+    def _new_block(self) -> Dict[str, np.ndarray]:
+        return {name: np.empty((self.batch_size,) + shape, dtype=dtype) for name, (dtype, shape) in self.columns.items()}
+
+    def append(self, transition: Dict[str, Any]) -> int:
+        """
+        Copy one transition into the current block.
+
+        Args:
+            transition: Value of every column
+
+        Returns:
+            Index of the transition in the run
+
+        Raises:
+            RuntimeError: If the writer thread failed
+        """
+        if self.error is not None:
+            raise RuntimeError("Trajectory writer failed") from self.error
+        for name, column in self._block.items():
+            column[self._fill] = transition[name]
+        self._fill += 1
+        self.submitted += 1
+        if self._fill == self.batch_size:
+            self._submit()
+        return self.submitted - 1
+
+    def _submit(self) -> None:
+        """Hand the current block to the writer thread."""
+        if self._fill:
+            self._queue.put(('transitions', (self._block, self._fill)))
+            self._block = self._new_block()
+            self._fill = 0
+
+    def end_episode(self, entry: Dict[str, Any]) -> None:
+        """
+        Queue an entry of the episode index, written after the transitions
+        queued before it.
+
+        Args:
+            entry: JSON-serializable description of the episode
+        """
+        self._submit()
+        self._queue.put(('episode', entry))
+
+    def close(self) -> None:
+        """Write everything queued, flush the chunks and stop the thread."""
+        if self._thread.is_alive():
+            self._submit()
+            self._queue.put(None)
+            self._thread.join()
+        self._episodes.close()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            kind, payload = item
+            try:
+                if kind == 'transitions':
+                    self._write(*payload)
+                else:
+                    self._episodes.write(json.dumps(payload) + "\n")
+                    self._episodes.flush()
+                    self._write_meta()
+            except Exception as e:
+                self.error = e
+                logger.error(f"Trajectory writer failed: {e}")
+        try:
+            self._flush()
+            self._write_meta()
+        except Exception as e:
+            logger.error(f"Failed to finalize recording in {self.directory}: {e}")
+
+    def _write(self, block: Dict[str, np.ndarray], count: int) -> None:
+        offset = 0
+        while offset < count:
+            chunk, row = divmod(self.num_transitions, self.chunk_size)
+            if chunk != self._chunk_index:
+                self._open_chunk(chunk)
+            rows = min(count - offset, self.chunk_size - row)
+            for name, column in self._chunks.items():
+                column[row:row + rows] = block[name][offset:offset + rows]
+            offset += rows
+            self.num_transitions += rows
+
+    def _open_chunk(self, chunk: int) -> None:
+        self._flush()
+        self._chunks = {}
+        for name, (dtype, shape) in self.columns.items():
+            column_dir = os.path.join(self.directory, name)
+            os.makedirs(column_dir, exist_ok=True)
+            path = os.path.join(column_dir, f"{chunk:06d}.npy")
+            if os.path.exists(path):
+                self._chunks[name] = np.lib.format.open_memmap(path, mode='r+')
+            else:
+                self._chunks[name] = np.lib.format.open_memmap(
+                    path, mode='w+', dtype=dtype, shape=(self.chunk_size,) + shape
+                )
+        self._chunk_index = chunk
+        self._write_meta()
+
+    def _flush(self) -> None:
+        for column in self._chunks.values():
+            column.flush()
+
+    def _write_meta(self) -> None:
+        meta = {
+            'version': FORMAT_VERSION,
+            'chunk_size': self.chunk_size,
+            'num_transitions': self.num_transitions,
+            'columns': self._column_meta(),
+        }
+        path = os.path.join(self.directory, "meta.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    """
+    Wrapper recording every transition of an environment to a run directory.
+
+    Each row holds the observation an action was taken in, the action, the
+    reward, the ``terminated`` and ``truncated`` flags, the next observation
+    and the wall-clock time the step returned. Dict observations are stored
+    one column per key, e.g. ``observation.position``.
+
+    The step loop only copies the transition into memory; a background
+    thread writes it to disk. Read the run with ``TrajectoryReader``.
+
+    Example:
+        ```python
+        env = TrajectoryRecorder(R3FEnv(websocket_url="ws://localhost:8765"), "runs/ppo-1")
+        ...
+        env.close()
+        episode = TrajectoryReader("runs/ppo-1").episode(0)
+        ```
+    """
+
+    def __init__(self, env: gym.Env, directory: str, chunk_size: int = 65536, batch_size: int = 64):
+        """
+        Initialize the recorder.
+
+        Args:
+            env: Environment to record
+            directory: Run directory. An existing recording with the same
+                spaces is continued
+            chunk_size: Transitions per chunk file
+            batch_size: Transitions handed to the writer thread at once.
+                Episodes are handed over when they end
+        """
+        super().__init__(env)
+        columns: Dict[str, Tuple[Any, Tuple[int, ...]]] = {}
+        for prefix in ('observation', 'next_observation'):
+            for name, space in _leaf_spaces(env.observation_space, prefix):
+                columns[name] = (space.dtype, space.shape)
+        for name, space in _leaf_spaces(env.action_space, 'action'):
+            columns[name] = (space.dtype, space.shape)
+        for name, dtype in SCALAR_COLUMNS.items():
+            columns[name] = (dtype, ())
+        self.writer = TrajectoryWriter(directory, columns, chunk_size, batch_size)
+
+        self._obs: Optional[Dict[str, np.ndarray]] = None
+        self._episode_start = 0
+        self._episode_length = 0
+        self._episode_return = 0.0
+
+    def reset(self, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+        """Reset the environment, ending the current episode's record early if needed."""
+        self._end_episode(complete=False)
+        obs, info = self.env.reset(**kwargs)
+        self._obs = _flatten(obs, 'observation', {})
+        self._episode_start = self.writer.submitted
+        return obs, info
+
+    def step(self, action: Any) -> Tuple[Any, float, bool, bool, Dict[str, Any]]:
+        """
+        Step the environment and queue the transition for writing.
+
+        Raises:
+            RuntimeError: If called before ``reset``, or if the writer thread failed
+        """
+        if self._obs is None:
+            raise RuntimeError("Call reset() before step()")
+        obs, reward, terminated, truncated, info = self.env.step(action)
+
+        transition = self._obs
+        next_obs = _flatten(obs, 'next_observation', {})
+        transition.update(next_obs)
+        _flatten(action, 'action', transition)
+        transition['reward'] = reward
+        transition['terminated'] = terminated
+        transition['truncated'] = truncated
+        transition['timestamp'] = time.time()
+        self.writer.append(transition)
+
+        # The next observation is the next transition's observation
+        self._obs = {'observation' + name[len('next_observation'):]: value for name, value in next_obs.items()}
+        self._episode_length += 1
+        self._episode_return += float(reward)
+        if terminated or truncated:
+            self._end_episode(complete=True)
+        return obs, reward, terminated, truncated, info
+
+    def _end_episode(self, complete: bool) -> None:
+        if self._episode_length == 0:
+            return
+        self.writer.end_episode({
+            'start': self._episode_start,
+            'length': self._episode_length,
+            'return': self._episode_return,
+            'complete': complete,
+        })
+        self._episode_start = self.writer.submitted
+        self._episode_length = 0
+        self._episode_return = 0.0
+
+    def close(self) -> None:
+        """Write the pending transitions and close the environment."""
+        self._end_episode(complete=False)
+        self.writer.close()
+        super().close()
+
+
+class TrajectoryReader:
+    """
+    Reader of a run directory written by ``TrajectoryRecorder``.
+
+    Chunks are memory-mapped on first access, so slicing an episode only
+    reads the pages it covers. A run that is still being recorded can be read
+    too; call ``refresh`` to see the episodes finished since.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Open a run directory.
+
+        Args:
+            directory: Run directory
+        """
+        self.directory = directory
+        self._chunks: Dict[Tuple[str, int], np.ndarray] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Reload the metadata and the episode index."""
+        with open(os.path.join(self.directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.chunk_size: int = meta['chunk_size']
+        self.columns: List[str] = list(meta['columns'])
+        self.column_meta: Dict[str, Any] = meta['columns']
+        self.episodes: List[Dict[str, Any]] = []
+        with open(os.path.join(self.directory, "episodes.jsonl")) as f:
+            for line in f:
+                if line.endswith("\n"):
+                    self.episodes.append(json.loads(line))
+        ends = [episode['start'] + episode['length'] for episode in self.episodes]
+        self.num_transitions: int = max([meta['num_transitions']] + ends)
+
+    def __len__(self) -> int:
+        return len(self.episodes)
+
+    def _chunk(self, name: str, chunk: int) -> np.ndarray:
+        key = (name, chunk)
+        if key not in self._chunks:
+            path = os.path.join(self.directory, name, f"{chunk:06d}.npy")
+            self._chunks[key] = np.load(path, mmap_mode='r')
+        return self._chunks[key]
+
+    def read(self, name: str, start: int, stop: int) -> np.ndarray:
+        """
+        Read a range of transitions of one column.
+
+        Args:
+            name: Column name
+            start: First transition
+            stop: Transition after the last one
+
+        Returns:
+            A read-only memory-mapped view if the range lies in one chunk,
+            otherwise a copy
+        """
+        if name not in self.columns:
+            raise KeyError(f"Unknown column: {name}")
+        stop = min(stop, self.num_transitions)
+        parts = []
+        position = start
+        while position < stop:
+            chunk, row = divmod(position, self.chunk_size)
+            count = min(stop - position, self.chunk_size - row)
+            parts.append(self._chunk(name, chunk)[row:row + count])
+            position += count
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            column = self.column_meta[name]
+            return np.empty([0] + column['shape'], dtype=np.dtype(column['dtype']))
+        return np.concatenate(parts)
+
+    def episode(self, index: int) -> Dict[str, Any]:
+        """
+        Read one episode.
+
+        Args:
+            index: Episode index in the run
+
+        Returns:
+            Every column over the episode's transitions, with observations
+            nested like the environment's Dict observations
+        """
+        entry = self.episodes[index]
+        start, stop = entry['start'], entry['start'] + entry['length']
+        return _unflatten({name: self.read(name, start, stop) for name in self.columns})
@@ -0,0 +1,416 @@
+"""
+Replay of recorded trajectories through the regular environment code path.
+
+A run directory written by ``TrajectoryRecorder`` is served back by a
+``ReplayBackend``, reachable with the ``replay://`` URL scheme, so R3FEnv and
+R3FVecEnv step through recorded states exactly as they would through a live
+scene. ``R3FReplayEnv`` and ``R3FReplayVecEnv`` pick the episodes to replay,
+in order or shuffled, and end them where the recording does.
+
+Example:
+    ```python
+    env = R3FReplayVecEnv("runs/ppo-1", num_agents=64, shuffle=True, seed=0)
+    obs = env.reset()
+    for _ in range(10_000):
+        obs, rewards, dones, infos = env.step(policy(obs))
+    ```
+"""
+import asyncio
+import numpy as np
+from collections import OrderedDict
+from gymnasium import spaces
+from typing import Dict, Any, Optional, List, Sequence, Tuple, Union
+import logging
+
+from .environment import R3FEnv
+from .observation import DEFAULT_KEY
+from .recorder import TrajectoryReader
+from .transport import TRANSPORTS, InProcessTransport
+from .vec_env import R3FVecEnv
+
+logger = logging.getLogger("r3f_agents")
+
+
+def replay_spaces(reader: TrajectoryReader) -> Tuple[spaces.Space, spaces.Space]:
+    """
+    Observation and action spaces matching a recording.
+
+    Every column becomes an unbounded Box of its recorded dtype and shape.
+    Pass the original spaces to the replay environments when bounds or a
+    Discrete action space matter.
+
+    Args:
+        reader: Reader of the recording
+
+    Returns:
+        The observation space and the action space
+    """
+    def box(column: Dict[str, Any]) -> spaces.Box:
+        dtype = np.dtype(column['dtype'])
+        if np.issubdtype(dtype, np.integer):
+            info = np.iinfo(dtype)
+            return spaces.Box(low=info.min, high=info.max, shape=tuple(column['shape']), dtype=dtype)
+        return spaces.Box(low=-np.inf, high=np.inf, shape=tuple(column['shape']), dtype=dtype)
+
+    columns = reader.column_meta
+    if 'observation' in columns:
+        observation_space = box(columns['observation'])
+    else:
+        observation_space = spaces.Dict({
+            name[len('observation.'):]: box(column)
+            for name, column in columns.items() if name.startswith('observation.')
+        })
+    return observation_space, box(columns['action'])
+
+
+class EpisodeSampler:
+    """
+    Endless sequence of episode indices, in order or reshuffled every pass.
+    """
+
+    def __init__(self, episodes: Sequence[int], shuffle: bool = False, seed: Optional[int] = None):
+        """
+        Initialize the sampler.
+
+        Args:
+            episodes: Episode indices to draw from
+            shuffle: Visit the episodes in a new random order on every pass
+            seed: Seed of the shuffling
+        """
+        if len(episodes) == 0:
+            raise ValueError("No episodes to replay")
+        self.episodes = np.asarray(episodes, dtype=np.int64)
+        self.shuffle = shuffle
+        self.seed(seed)
+
+    def seed(self, seed: Optional[int] = None) -> None:
+        """
+        Restart from the first pass.
+
+        Args:
+            seed: Seed of the shuffling
+        """
+        self._rng = np.random.default_rng(seed)
+        self._order = self.episodes
+        self._position = len(self.episodes)
+
+    def next(self) -> int:
+        """Next episode index."""
+        if self._position == len(self._order):
+            self._order = self._rng.permutation(self.episodes) if self.shuffle else self.episodes
+            self._position = 0
+        episode = int(self._order[self._position])
+        self._position += 1
+        return episode
+
+    def batch(self, size: int) -> List[int]:
+        """
+        Next ``size`` episode indices.
+
+        Args:
+            size: Number of episodes
+        """
+        return [self.next() for _ in range(size)]
+
+
+class ReplayBackend:
+    """
+    In-process backend answering ``reset`` and ``action`` messages with
+    recorded states.
+
+    A reset starts the episode named by its ``episode`` field, or the next
+    one in order. Each action then advances the agent by one recorded
+    transition, or by ``repeat`` of them, whatever the action is, and answers
+    with the next observation, the summed reward and the
+    ``terminated``/``truncated`` flags. Actions past the end of the episode
+    keep the final observation with zero reward.
+    Episodes are read from the memory-mapped columns when an agent starts
+    them and the most recent ones are kept in memory.
+    """
+
+    def __init__(self, reader: TrajectoryReader, cache_size: int = 64):
+        """
+        Initialize the backend.
+
+        Args:
+            reader: Reader of the recording to serve
+            cache_size: Number of episodes kept in memory
+        """
+        self.reader = reader
+        self.cache_size = cache_size
+        self._next_episode = 0
+        self._agents: Dict[str, List[int]] = {}
+        self._cache: "OrderedDict[int, Dict[str, np.ndarray]]" = OrderedDict()
+        self._state_keys = {
+            name: DEFAULT_KEY if name == 'observation' else name[len('observation.'):]
+            for name in reader.columns if name == 'observation' or name.startswith('observation.')
+        }
+
+    def _episode(self, index: int) -> Dict[str, np.ndarray]:
+        episode = self._cache.get(index)
+        if episode is None:
+            entry = self.reader.episodes[index]
+            start, stop = entry['start'], entry['start'] + entry['length']
+            names = list(self._state_keys) + ['next_' + name for name in self._state_keys]
+            names += ['reward', 'terminated', 'truncated']
+            episode = {name: np.array(self.reader.read(name, start, stop)) for name in names}
+            self._cache[index] = episode
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(index)
+        return episode
+
+    def _start(self, agent_id: str, episode: Optional[int]) -> Dict[str, Any]:
+        if episode is None:
+            episode = self._next_episode % len(self.reader.episodes)
+            self._next_episode += 1
+        columns = self._episode(episode)
+        self._agents[agent_id] = [episode, 0]
+        state = {key: columns[name][0] for name, key in self._state_keys.items()}
+        state['reward'] = 0.0
+        state['episode'] = episode
+        return state
+
+    def _advance(self, agent_id: str, repeat: int = 1) -> Dict[str, Any]:
+        cursor = self._agents.get(agent_id)
+        if cursor is None:
+            return self._start(agent_id, None)
+        columns = self._episode(cursor[0])
+        row = cursor[1]
+        length = len(columns['reward'])
+        if row >= length:
+            state = {key: columns['next_' + name][length - 1] for name, key in self._state_keys.items()}
+            state.update(reward=0.0, terminated=False, truncated=True)
+            return state
+        # Stop early at a recorded episode end, like a scene reporting done
+        stop = min(row + max(1, repeat), length)
+        ends = np.flatnonzero(columns['terminated'][row:stop] | columns['truncated'][row:stop])
+        if len(ends):
+            stop = row + int(ends[0]) + 1
+        last = stop - 1
+        state = {key: columns['next_' + name][last] for name, key in self._state_keys.items()}
+        state['reward'] = float(columns['reward'][row:stop].sum())
+        state['terminated'] = bool(columns['terminated'][last])
+        state['truncated'] = bool(columns['truncated'][last])
+        cursor[1] = stop
+        return state
+
+    def handle(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Process one message, batched or not.
+
+        Args:
+            message: Message sent by a trainer
+
+        Returns:
+            Reply messages
+        """
+        message_type = message.get('type')
+        data = message.get('data') or {}
+        if message_type not in ('action', 'reset'):
+            return []
+
+        if 'batch' in data:
+            entries = [(entry['agentId'], entry.get('seq'), entry.get('data') or {}) for entry in data['batch']]
+        else:
+            entries = [(message['agentId'], message.get('seq'), data)]
+
+        replies = []
+        for agent_id, seq, entry_data in entries:
+            if message_type == 'reset':
+                state = self._start(agent_id, entry_data.get('episode'))
+            else:
+                state = self._advance(agent_id, int(entry_data.get('repeat', 1)))
+            reply = {'type': 'state', 'agentId': agent_id, 'data': state}
+            if seq is not None:
+                reply['seq'] = seq
+            replies.append(reply)
+        return replies
+
+
+class ReplayTransport(InProcessTransport):
+    """
+    Transport serving the recording at ``replay:///path/to/run`` with a
+    ReplayBackend of its own.
+    """
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        self.path = url[len("replay://"):]
+
+    async def connect(self) -> None:
+        self.backend = ReplayBackend(TrajectoryReader(self.path))
+        self._inbox = asyncio.Queue()
+
+
+TRANSPORTS["replay"] = ReplayTransport
+
+
+class R3FReplayEnv(R3FEnv):
+    """
+    R3FEnv stepping through a recording instead of a live scene.
+
+    Every reset starts the next episode from an EpisodeSampler and every step
+    returns the next recorded transition, so ``terminated`` and ``truncated``
+    are those of the recording.
+
+    Example:
+        ```python
+        env = R3FReplayEnv("runs/ppo-1", shuffle=True, seed=0)
+        obs, info = env.reset()
+        ```
+    """
+
+    def __init__(self, directory: str,
+                 episodes: Optional[Sequence[int]] = None,
+                 shuffle: bool = False,
+                 seed: Optional[int] = None,
+                 observation_space: Optional[spaces.Space] = None,
+                 action_space: Optional[spaces.Space] = None,
+                 **kwargs):
+        """
+        Initialize the replay environment.
+
+        Args:
+            directory: Run directory written by ``TrajectoryRecorder``
+            episodes: Episodes to replay. Defaults to every recorded episode
+            shuffle: Replay the episodes in a new random order on every pass
+            seed: Seed of the shuffling
+            observation_space: Observation space. Derived from the recording
+                when None
+            action_space: Action space. Derived from the recording when None
+            **kwargs: Further R3FEnv arguments
+        """
+        self.reader = TrajectoryReader(directory)
+        default_observation_space, default_action_space = replay_spaces(self.reader)
+        super().__init__(
+            websocket_url=f"replay://{directory}",
+            observation_space=observation_space or default_observation_space,
+            action_space=action_space or default_action_space,
+            **kwargs
+        )
+        self.sampler = EpisodeSampler(range(len(self.reader)) if episodes is None else episodes, shuffle, seed)
+        self.episode: Optional[int] = None
+
+    def reset(self, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """
+        Start the next episode, or the one given as ``options['episode']``.
+
+        Args:
+            seed: Reseeds the episode order
+            options: Reset data sent to the backend
+
+        Returns:
+            Initial observation and info dictionary
+        """
+        if seed is not None:
+            self.sampler.seed(seed)
+        options = dict(options or {})
+        if 'episode' not in options:
+            options['episode'] = self.sampler.next()
+        self.episode = options['episode']
+        length = self.reader.episodes[self.episode]['length']
+        self.max_episode_steps = -(-length // self.frame_skip)
+        return super().reset(seed=seed, options=options)
+
+    async def _advance(self, action: Union[np.ndarray, int], step: int) -> Tuple[Dict[str, np.ndarray], float, bool, bool, Dict[str, Any]]:
+        obs, reward, done, truncated, info = await super()._advance(action, step)
+        terminated = bool(info.pop('terminated', False))
+        # Episodes recorded up to a close or reset have neither flag set
+        truncated = truncated or bool(info.pop('truncated', False)) or (done and not terminated)
+        return obs, reward, terminated, truncated, info
+
+
+class R3FReplayVecEnv(R3FVecEnv):
+    """
+    R3FVecEnv replaying many recorded episodes in parallel, one per agent.
+
+    When an agent's episode ends it is reset to the next episode from an
+    EpisodeSampler within the same step, like any other episode end.
+    ``TimeLimit.truncated`` reports whether the recording truncated it.
+    """
+
+    def __init__(self, directory: str,
+                 num_agents: int = 1,
+                 episodes: Optional[Sequence[int]] = None,
+                 shuffle: bool = False,
+                 seed: Optional[int] = None,
+                 observation_space: Optional[spaces.Space] = None,
+                 action_space: Optional[spaces.Space] = None,
+                 **kwargs):
+        """
+        Initialize the vectorized replay environment.
+
+        Args:
+            directory: Run directory written by ``TrajectoryRecorder``
+            num_agents: Number of episodes replayed at once
+            episodes: Episodes to replay. Defaults to every recorded episode
+            shuffle: Replay the episodes in a new random order on every pass
+            seed: Seed of the shuffling
+            observation_space: Per-agent observation space. Derived from the
+                recording when None
+            action_space: Per-agent action space. Derived from the recording
+                when None
+            **kwargs: Further R3FVecEnv arguments
+        """
+        self.reader = TrajectoryReader(directory)
+        default_observation_space, default_action_space = replay_spaces(self.reader)
+        super().__init__(
+            websocket_url=f"replay://{directory}",
+            num_agents=num_agents,
+            observation_space=observation_space or default_observation_space,
+            action_space=action_space or default_action_space,
+            **kwargs
+        )
+        self.sampler = EpisodeSampler(range(len(self.reader)) if episodes is None else episodes, shuffle, seed)
+        self.episodes = np.full(self.num_envs, -1, dtype=np.int64)
+        # Per-agent episode lengths, compared against the step counters
+        self.max_episode_steps = np.ones(self.num_envs, dtype=np.int64)
+
+    def _assign(self, indices: Sequence[int]) -> Dict[int, int]:
+        """Draw the next episode for some agents and pass it in their reset data."""
+        assigned = {}
+        for i in indices:
+            episode = self.sampler.next()
+            self._options[i] = dict(self._options[i] or {}, episode=episode)
+            assigned[i] = episode
+        return assigned
+
+    def _start(self, assigned: Dict[int, int]) -> None:
+        for i, episode in assigned.items():
+            self.episodes[i] = episode
+            self.max_episode_steps[i] = self.reader.episodes[episode]['length']
+
+    def reset(self) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Start a new episode for every agent.
+
+        Returns:
+            Stacked initial observations
+        """
+        assigned = self._assign(range(self.num_envs))
+        self._start(assigned)
+        return super().reset()
+
+    def seed(self, seed: Optional[int] = None) -> List[Optional[int]]:
+        """Reseed the episode order."""
+        self.sampler.seed(seed)
+        return super().seed(seed)
+
+    def _count_steps(self) -> np.ndarray:
+        # The next episodes travel in the reset frame sent with this step
+        ending = np.flatnonzero(self.current_steps + 1 >= self.max_episode_steps)
+        assigned = self._assign(ending)
+        dones = super()._count_steps()
+        self._start(assigned)
+        return dones
+
+    async def _step_all(self, actions: np.ndarray, dones: Optional[np.ndarray] = None, previous=None):
+        obs, rewards, dones, infos = await super()._step_all(actions, dones, previous)
+        for i, info in enumerate(infos):
+            terminated = info.pop('terminated', False)
+            info.pop('truncated', None)
+            if dones[i] and not info.get('connection_lost'):
+                info['TimeLimit.truncated'] = not terminated
+        return obs, rewards, dones, infos
@@ -0,0 +1,217 @@
+"""
+Reward and termination computed in the trainer rather than in the scene.
+
+``TargetReward`` holds a start and a target position per agent and turns a
+``(num_agents, 3)`` batch of positions into rewards, terminations and info
+fields in a few NumPy operations, so reward shaping changes need no scene
+changes and cost no extra round trip. ``R3FEnv`` and ``R3FVecEnv`` use it in
+place of the reward the server sends when given one.
+
+Example:
+    ```python
+    reward = TargetReward(num_agents=8, target_position=[10.0, 0.0, 10.0], bounds=20.0)
+    env = R3FVecEnv(websocket_url="ws://localhost:8765", num_agents=8, reward=reward)
+    ```
+"""
+import copy
+import numpy as np
+from typing import Dict, Any, Optional, Sequence, Tuple, Union
+import logging
+
+logger = logging.getLogger("r3f_agents")
+
+Positions = Union[Sequence[float], np.ndarray]
+
+
+class TargetReward:
+    """
+    Distance-shaped reward towards a target, with success and out-of-bounds
+    termination.
+
+    The reward of a step is the distance to the target gained during the
+    step, times ``progress_weight``, minus ``step_penalty``. Reaching
+    ``success_radius`` of the target adds ``success_bonus`` and terminates
+    the episode. Leaving ``bounds`` subtracts ``out_of_bounds_penalty`` and
+    terminates it too.
+    """
+
+    def __init__(self,
+                 num_agents: int = 1,
+                 target_position: Positions = (0.0, 0.0, 0.0),
+                 start_position: Optional[Positions] = None,
+                 success_radius: float = 0.5,
+                 bounds: Optional[Union[float, Tuple[Positions, Positions]]] = None,
+                 progress_weight: float = 1.0,
+                 success_bonus: float = 10.0,
+                 out_of_bounds_penalty: float = 10.0,
+                 step_penalty: float = 0.0,
+                 ignore_height: bool = False):
+        """
+        Initialize the reward.
+
+        Args:
+            num_agents: Number of agents computed side by side
+            target_position: Target of every agent, ``(3,)``, or one per
+                agent, ``(num_agents, 3)``
+            start_position: Position agents are reset to, ``(3,)`` or
+                ``(num_agents, 3)``. None leaves it to the scene
+            success_radius: Distance to the target at which an episode
+                succeeds
+            bounds: Half-extent of the allowed area around the origin, or
+                its ``(low, high)`` corners. None disables out-of-bounds
+                termination
+            progress_weight: Reward per unit of distance gained
+            success_bonus: Reward added when the target is reached
+            out_of_bounds_penalty: Reward subtracted when leaving the bounds
+            step_penalty: Reward subtracted every step
+            ignore_height: Measure distances in the horizontal x/z plane
+
+        Raises:
+            ValueError: If a position does not have a valid shape
+        """
+        self.num_agents = num_agents
+        self.targets = self._positions(target_position, 'target_position')
+        self.starts = None if start_position is None else self._positions(start_position, 'start_position')
+        self.success_radius = success_radius
+        if bounds is None:
+            self.low = self.high = None
+        elif np.isscalar(bounds):
+            self.high = np.full(3, abs(float(bounds)), dtype=np.float32)
+            self.low = -self.high
+        else:
+            self.low = np.asarray(bounds[0], dtype=np.float32)
+            self.high = np.asarray(bounds[1], dtype=np.float32)
+        self.progress_weight = progress_weight
+        self.success_bonus = success_bonus
+        self.out_of_bounds_penalty = out_of_bounds_penalty
+        self.step_penalty = step_penalty
+        self._axes = np.array([1.0, 0.0, 1.0] if ignore_height else [1.0, 1.0, 1.0], dtype=np.float32)
+        self.distances = np.zeros(num_agents, dtype=np.float32)
+
+    def _positions(self, value: Positions, name: str) -> np.ndarray:
+        """Broadcast one position, or one per agent, to ``(num_agents, 3)``."""
+        array = np.asarray(value, dtype=np.float32)
+        if array.shape not in ((3,), (self.num_agents, 3)):
+            raise ValueError(f"{name} must have shape (3,) or ({self.num_agents}, 3), got {array.shape}")
+        return np.array(np.broadcast_to(array, (self.num_agents, 3)))
+
+    def set_targets(self, target_position: Positions, indices: Optional[Sequence[int]] = None) -> None:
+        """
+        Move the targets of some agents, e.g. before resetting them.
+
+        Args:
+            target_position: ``(3,)`` or one position per selected agent
+            indices: Agents to update, or None for all of them
+        """
+        self.targets[slice(None) if indices is None else indices] = target_position
+
+    def select(self, slots: slice) -> 'TargetReward':
+        """
+        Reward engine for a contiguous range of agents, e.g. one shard.
+
+        The selection shares its targets and start positions with this
+        engine, so ``set_targets`` on either is seen by both, and keeps its
+        own episode distances.
+
+        Args:
+            slots: Agent slots to select
+
+        Returns:
+            A reward engine for ``len(range(num_agents)[slots])`` agents
+        """
+        selection = copy.copy(self)
+        selection.num_agents = len(range(self.num_agents)[slots])
+        selection.targets = self.targets[slots]
+        selection.starts = None if self.starts is None else self.starts[slots]
+        selection.distances = np.zeros(selection.num_agents, dtype=np.float32)
+        return selection
+
+    def reset_data(self, index: int, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Data of the ``reset`` message of an agent, with its start position.
+
+        Args:
+            index: Agent slot
+            options: Reset options. A ``position`` in them wins over the start
+                position
+
+        Returns:
+            The reset data to send
+        """
+        data = dict(options or {})
+        if self.starts is not None and 'position' not in data:
+            data['position'] = self.starts[index].tolist()
+        return data
+
+    def distance(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Distances of positions to the targets.
+
+        Args:
+            positions: ``(num_agents, 3)`` positions
+
+        Returns:
+            ``(num_agents,)`` distances
+        """
+        offsets = (np.asarray(positions, dtype=np.float32) - self.targets) * self._axes
+        return np.sqrt(np.einsum('ij,ij->i', offsets, offsets))
+
+    def reset(self, positions: np.ndarray, indices: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+        """
+        Start new episodes from the given positions.
+
+        Args:
+            positions: ``(num_agents, 3)`` positions of every agent
+            indices: Agents whose episode starts, or None for all of them
+
+        Returns:
+            ``distance`` of every agent, for the info dictionaries
+        """
+        selected = slice(None) if indices is None else np.asarray(indices, dtype=np.int64)
+        self.distances[selected] = self.distance(positions)[selected]
+        return {'distance': self.distances.copy()}
+
+    def step(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Score the positions reached by a step of every agent.
+
+        Args:
+            positions: ``(num_agents, 3)`` positions after the step
+
+        Returns:
+            ``(num_agents,)`` float32 rewards, ``(num_agents,)`` bool
+            terminations, and ``distance``, ``success`` and
+            ``out_of_bounds`` arrays for the info dictionaries
+        """
+        positions = np.asarray(positions, dtype=np.float32)
+        distances = self.distance(positions)
+        success = distances <= self.success_radius
+        if self.low is None:
+            out_of_bounds = np.zeros(self.num_agents, dtype=bool)
+        else:
+            out_of_bounds = np.any((positions < self.low) | (positions > self.high), axis=1)
+
+        rewards = self.progress_weight * (self.distances - distances) - self.step_penalty
+        rewards += self.success_bonus * success
+        rewards -= self.out_of_bounds_penalty * out_of_bounds
+        self.distances = distances
+        terminated = success | out_of_bounds
+        return rewards.astype(np.float32), terminated, {
+            'distance': distances,
+            'success': success,
+            'out_of_bounds': out_of_bounds,
+        }
+
+    @staticmethod
+    def info(fields: Dict[str, np.ndarray], index: int) -> Dict[str, Any]:
+        """
+        Info entries of one agent.
+
+        Args:
+            fields: Arrays returned by ``step`` or ``reset``
+            index: Agent slot
+
+        Returns:
+            The fields of the agent as Python scalars
+        """
+        return {key: value[index].item() for key, value in fields.items()}
@@ -0,0 +1,623 @@
+"""
+Asyncio relay server between trainers and scenes.
+
+``RelayServer`` speaks the same message contract as the Node
+``AgentWebSocketServer``: ``action``, ``state``, ``reset``, ``snapshot``,
+``restore`` and ``info`` messages, batched frames, sequence numbers echoed in
+replies, connection roles, session resume and an ``on_action`` hook for scenes
+running in the same process. It negotiates plain JSON only, so clients asking
+for the binary protocol or delta-encoded states fall back to full JSON states.
+
+Agents are routed through a dictionary from agent ID to owning connection, so
+the cost of a message does not grow with the number of connections. Every
+connection sends from a bounded queue drained by its own task. Replies and
+states wait for room in the queue of a slow trainer, which stops reading from
+the connection that produced them until it catches up. Viewers never hold
+anyone up: updates that do not fit in their queue are dropped and counted.
+
+Without an ``on_action`` hook, actions are relayed to the scene connections,
+which answer with ``state`` messages. A scene's state reaches the agent's
+owner with the sequence number of the action it answers.
+
+Example:
+    ```bash
+    r3f-server --port 8765
+    python -m r3f_agents.server --port 8765 --uvloop
+    ```
+
+    ```python
+    server = RelayServer(port=0)
+    server.on_action(lambda action: server.update_agent_state(action['agentId'], {'reward': 1.0}))
+    await server.start()
+    ...
+    await server.stop()
+    ```
+"""
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from typing import Dict, Any, Optional, List, Sequence, Set, Callable, Iterable
+import websockets
+import logging
+
+logger = logging.getLogger("r3f_agents")
+
+ROLES = ('trainer', 'viewer', 'scene')
+
+# Message types that make a connection a trainer
+TRAINER_MESSAGES = ('action', 'reset', 'snapshot', 'restore')
+
+# Events counted by the server
+SERVER_COUNTERS = ('messages_received', 'invalid_messages', 'messages_sent', 'bytes_sent', 'dropped_frames',
+                   'blocked_sends', 'broadcasts', 'coalesced_updates')
+
+MESSAGE_TYPES = ('state', 'action', 'reset', 'snapshot', 'restore', 'info', 'error')
+
+
+def default_state() -> Dict[str, Any]:
+    """State of an agent the scene has not reported on yet."""
+    return {'position': [0, 0, 0], 'rotation': [0, 0, 0], 'action': '', 'reward': 0, 'done': False}
+
+
+def validate(message: Any) -> List[str]:
+    """
+    Check the shape of a message, as the Node server's ``MessageValidator``.
+
+    Args:
+        message: Parsed message
+
+    Returns:
+        Problems found, empty for a valid message
+    """
+    if not isinstance(message, dict):
+        return ["Message must be an object"]
+    errors = []
+    if message.get('type') not in MESSAGE_TYPES:
+        errors.append(f"Invalid message type: {message.get('type')}. Must be one of: {', '.join(MESSAGE_TYPES)}")
+    if not isinstance(message.get('agentId'), str):
+        errors.append("Message missing 'agentId' field")
+    data = message.get('data')
+    if not isinstance(data, dict):
+        errors.append("Message missing 'data' field")
+    elif 'batch' in data:
+        if not isinstance(data['batch'], list):
+            errors.append("Batch must be an array")
+        elif not all(isinstance(entry, dict) and isinstance(entry.get('agentId'), str) for entry in data['batch']):
+            errors.append("Batch entries must have a string 'agentId'")
+    seq = message.get('seq')
+    if seq is not None and (not isinstance(seq, int) or seq < 0):
+        errors.append("Sequence number must be a non-negative integer")
+    return errors
+
+
+class RelayConnection:
+    """A client of the relay server and its bounded send queue."""
+
+    def __init__(self, websocket, connection_id: str, queue_size: int):
+        """
+        Args:
+            websocket: Server side of the client's WebSocket
+            connection_id: Identifier reported to the client
+            queue_size: Frames that may wait to be sent
+        """
+        self.websocket = websocket
+        self.id = connection_id
+        self.role: Optional[str] = None
+        self.agent_ids: Set[str] = set()
+        self.last_activity = time.monotonic()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: Optional[asyncio.Task] = None
+
+    @property
+    def effective_role(self) -> str:
+        """Role of the connection, a viewer until announced or inferred."""
+        return self.role or 'viewer'
+
+    async def run_sender(self) -> None:
+        """Send queued frames in order until the connection closes."""
+        while True:
+            frame = await self.queue.get()
+            try:
+                await self.websocket.send(frame)
+            except websockets.ConnectionClosed:
+                return
+
+
+class RelayServer:
+    """
+    Python implementation of the R3F relay server.
+
+    See the module documentation for the routing and backpressure rules.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 8765, path: Optional[str] = None,
+                 queue_size: int = 1024, viewer_interval: float = 0.05, connection_timeout: float = 30.0,
+                 resume_grace_period: float = 30.0, heartbeat_interval: float = 10.0):
+        """
+        Initialize the server.
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on. 0 picks a free port
+            path: Unix domain socket to listen on instead of ``host`` and ``port``
+            queue_size: Frames that may wait to be sent on each connection
+            viewer_interval: Seconds between two state updates of an agent
+                sent to viewers; updates in between are merged. 0 sends
+                every update
+            connection_timeout: Seconds without any message after which a
+                connection is closed
+            resume_grace_period: Seconds the state of a closed connection's
+                agents is kept for the trainer to resume them
+            heartbeat_interval: Seconds between two checks for idle connections
+        """
+        self.host = host
+        self.port = port
+        self.path = path
+        self.queue_size = queue_size
+        self.viewer_interval = viewer_interval
+        self.connection_timeout = connection_timeout
+        self.resume_grace_period = resume_grace_period
+        self.heartbeat_interval = heartbeat_interval
+        self.logger = logger
+
+        self.connections: Dict[str, RelayConnection] = {}
+        self.agents: Dict[str, Dict[str, Any]] = {}
+        self.owners: Dict[str, RelayConnection] = {}
+        self.pending_seq: Dict[str, int] = {}
+        self.counters = dict.fromkeys(SERVER_COUNTERS, 0)
+        self._repeats: Dict[str, Dict[str, Any]] = {}
+        self._detached: Dict[str, asyncio.TimerHandle] = {}
+        self._viewer_updates: Dict[str, Dict[str, Any]] = {}
+        self._viewer_flush: Optional[asyncio.TimerHandle] = None
+        self._on_action: Optional[Callable[[Dict[str, Any]], Any]] = None
+        self._ids = itertools.count(1)
+        self._server = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._closing: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        """Start listening."""
+        if self.path is not None:
+            self._server = await websockets.unix_serve(self._handle_connection, self.path)
+            self.logger.info(f"Relay server listening on unix://{self.path}")
+        else:
+            self._server = await websockets.serve(self._handle_connection, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+            self.logger.info(f"Relay server listening on ws://{self.host}:{self.port}")
+        self._heartbeat = asyncio.create_task(self._check_heartbeats())
+
+    async def stop(self) -> None:
+        """Stop listening, close every connection and forget every agent."""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in self._closing:
+            task.cancel()
+        for handle in self._detached.values():
+            handle.cancel()
+        if self._viewer_flush is not None:
+            self._viewer_flush.cancel()
+            self._viewer_flush = None
+        self._detached.clear()
+        self.agents.clear()
+        self.owners.clear()
+        self.pending_seq.clear()
+        self._repeats.clear()
+        self._viewer_updates.clear()
+
+    async def serve_forever(self) -> None:
+        """Start the server and run until cancelled."""
+        await self.start()
+        try:
+            await asyncio.Future()
+        finally:
+            await self.stop()
+
+    def on_action(self, callback: Callable[[Dict[str, Any]], Any]) -> None:
+        """
+        Handle actions in this process instead of relaying them to scenes.
+
+        Args:
+            callback: Called with ``{'agentId': ..., **action}`` for every
+                action tick. It may return an awaitable. The scene reports the
+                resulting state with ``update_agent_state``
+        """
+        self._on_action = callback
+
+    def get_agent_state(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Last known state of an agent, None if it is unknown."""
+        return self.agents.get(agent_id)
+
+    def connected_agents(self) -> List[str]:
+        """Agents with a connected trainer."""
+        return list(self.owners)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Counters and gauges of the server."""
+        return {
+            'connections': len(self.connections),
+            'viewers': sum(1 for connection in self.connections.values() if connection.effective_role == 'viewer'),
+            'agents': len(self.agents),
+            'queue_depth': sum(connection.queue.qsize() for connection in self.connections.values()),
+            **self.counters,
+        }
+
+    async def update_agent_state(self, agent_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Merge a state update of an agent and send it to its owner and viewers.
+
+        An action being repeated, see the ``repeat`` field of actions, is
+        applied again instead until its last tick, whose state is sent with
+        the reward summed over the ticks.
+
+        Args:
+            agent_id: Agent the state belongs to
+            state: Fields that changed
+
+        Returns:
+            The agent's full state
+        """
+        current = self.agents.get(agent_id) or default_state()
+        current.update(state)
+        self.agents[agent_id] = current
+
+        repeat = self._repeats.get(agent_id)
+        if repeat is not None:
+            # Only this tick's report counts; the merged state holds the previous reward
+            repeat['reward'] += state.get('reward') or 0
+            if repeat['remaining'] > 0 and not current.get('done'):
+                repeat['remaining'] -= 1
+                await self._apply_action(agent_id, repeat['action'])
+                return current
+            del self._repeats[agent_id]
+
+        message = {'type': 'state', 'agentId': agent_id,
+                   'data': dict(current, reward=repeat['reward']) if repeat else current}
+        seq = self.pending_seq.pop(agent_id, None)
+        if seq is not None:
+            message['seq'] = seq
+        await self._publish_state(message)
+        return current
+
+    async def _handle_connection(self, websocket) -> None:
+        connection = RelayConnection(websocket, f"conn_{next(self._ids)}", self.queue_size)
+        connection.sender = asyncio.create_task(connection.run_sender())
+        self.connections[connection.id] = connection
+        self.logger.info(f"Client connected: {connection.id}")
+        try:
+            await self._send(connection, {
+                'type': 'info',
+                'agentId': 'server',
+                'data': {'message': f"Connected with ID: {connection.id}"}
+            })
+            async for raw in websocket:
+                connection.last_activity = time.monotonic()
+                self.counters['messages_received'] += 1
+                if isinstance(raw, bytes):
+                    self.counters['invalid_messages'] += 1
+                    await self._send_error(connection, "Binary frames are not supported by this server, use JSON")
+                    continue
+                try:
+                    message = json.loads(raw)
+                except ValueError as e:
+                    self.counters['invalid_messages'] += 1
+                    await self._send_error(connection, f"Failed to process message: {e}")
+                    continue
+                errors = validate(message)
+                if errors:
+                    self.counters['invalid_messages'] += 1
+                    await self._send_error(connection, f"Invalid message schema: {', '.join(errors)}")
+                    continue
+                await self._handle_message(message, connection)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._close(connection)
+
+    async def _handle_message(self, message: Dict[str, Any], connection: RelayConnection) -> None:
+        message_type = message['type']
+        batch = message['data'].get('batch')
+        if connection.role is None:
+            # Requests without a seq, such as a scene's named-action clicks,
+            # imply no role and so never take an agent from its trainer
+            entries = batch if isinstance(batch, list) else [message]
+            if message_type in TRAINER_MESSAGES and any(entry.get('seq') is not None for entry in entries):
+                connection.role = 'trainer'
+            elif message_type == 'state':
+                connection.role = 'scene'
+
+        if isinstance(batch, list):
+            for entry in batch:
+                self._bind(connection, entry['agentId'])
+            for entry in batch:
+                await self._process({
+                    'type': message_type,
+                    'agentId': entry['agentId'],
+                    'data': entry.get('data') or {},
+                    'seq': entry.get('seq'),
+                }, connection)
+            return
+
+        agent_id = message['agentId']
+        if agent_id not in ('*', 'server') and (connection.role == 'trainer' or not connection.agent_ids):
+            self._bind(connection, agent_id)
+        await self._process(message, connection)
+
+    async def _process(self, message: Dict[str, Any], connection: RelayConnection) -> None:
+        message_type = message['type']
+        agent_id = message['agentId']
+        data = message['data']
+        seq = message.get('seq')
+
+        if message_type == 'action':
+            if seq is not None:
+                self.pending_seq[agent_id] = seq
+            action = {key: value for key, value in data.items() if key != 'repeat'}
+            ticks = max(1, int(data.get('repeat') or 1))
+            if ticks > 1:
+                self._repeats[agent_id] = {'action': action, 'remaining': ticks - 1, 'reward': 0.0}
+            else:
+                self._repeats.pop(agent_id, None)
+            await self._apply_action(agent_id, action)
+
+        elif message_type == 'state':
+            await self.update_agent_state(agent_id, data)
+
+        elif message_type in ('reset', 'restore'):
+            if message_type == 'restore':
+                saved = data.get('state')
+                if not isinstance(saved, dict):
+                    await self._send_error(connection, "Restore must carry a 'state' object", agent_id, seq)
+                    return
+                state = {**default_state(), **saved, 'done': False}
+                relayed = {'type': 'restore', 'agentId': agent_id, 'data': {'state': state}}
+            else:
+                state = {**default_state(), **data}
+                relayed = {'type': 'reset', 'agentId': agent_id, 'data': data}
+            self.agents[agent_id] = state
+            self.pending_seq.pop(agent_id, None)
+            self._repeats.pop(agent_id, None)
+            self._viewer_updates.pop(agent_id, None)
+            await self._send_to_roles(relayed, ('scene', 'viewer'), exclude=connection)
+            await self._reply(connection, {'type': 'state', 'agentId': agent_id, 'data': state}, seq)
+
+        elif message_type == 'snapshot':
+            await self._reply(connection, {
+                'type': 'snapshot', 'agentId': agent_id, 'data': {'state': self.agents.get(agent_id)}
+            }, seq)
+
+        elif message_type == 'info':
+            await self._process_info(data, connection, seq)
+
+    async def _process_info(self, data: Dict[str, Any], connection: RelayConnection, seq: Optional[int] = None) -> None:
+        if data.get('keepalive'):
+            return
+        if 'role' in data:
+            if data['role'] in ROLES:
+                connection.role = data['role']
+                if connection.role == 'trainer':
+                    for agent_id in connection.agent_ids:
+                        self.owners[agent_id] = connection
+                else:
+                    self._release(connection)
+            reply = {'role': connection.effective_role}
+        elif data.get('resume'):
+            reply = self._resume(connection, data.get('agents') or [])
+        elif data.get('resync'):
+            # States are always sent whole, there is nothing to resynchronize
+            return
+        elif 'camera' in data:
+            reply = {'camera': []}
+        elif data.get('protocol') or data.get('delta'):
+            reply = {'protocol': 'json', 'delta': False}
+        else:
+            reply = {'message': 'Information received'}
+        await self._reply(connection, {'type': 'info', 'agentId': 'server', 'data': reply}, seq)
+
+    async def _apply_action(self, agent_id: str, action: Dict[str, Any]) -> None:
+        """Hand one action tick to the in-process hook or to the scenes."""
+        if self._on_action is not None:
+            result = self._on_action({'agentId': agent_id, **action})
+            if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+                await result
+            return
+        await self._send_to_roles({'type': 'action', 'agentId': agent_id, 'data': action}, ('scene',))
+
+    async def _publish_state(self, message: Dict[str, Any]) -> None:
+        """Send a state to the agent's owner now and to viewers at the viewer rate."""
+        agent_id = message['agentId']
+        owner = self.owners.get(agent_id)
+        if owner is not None:
+            await self._send(owner, message)
+        update = {'type': 'state', 'agentId': agent_id, 'data': message['data']}
+        if self.viewer_interval <= 0:
+            await self._send_to_roles(update, ('viewer',))
+            return
+        if agent_id in self._viewer_updates:
+            self.counters['coalesced_updates'] += 1
+        self._viewer_updates[agent_id] = update
+        if self._viewer_flush is None:
+            self._viewer_flush = asyncio.get_running_loop().call_later(self.viewer_interval, self._flush_viewers)
+
+    def _flush_viewers(self) -> None:
+        self._viewer_flush = None
+        viewers = [connection for connection in self.connections.values() if connection.effective_role == 'viewer']
+        updates, self._viewer_updates = self._viewer_updates, {}
+        for update in updates.values():
+            self._offer(viewers, json.dumps(update))
+
+    async def _send_to_roles(self, message: Dict[str, Any], roles: Sequence[str],
+                             exclude: Optional[RelayConnection] = None) -> None:
+        """
+        Send a message to every connection with one of the given roles,
+        serialized once. Scenes and trainers are waited for, viewers are not.
+        """
+        recipients = [connection for connection in self.connections.values()
+                      if connection is not exclude and connection.effective_role in roles]
+        if not recipients:
+            return
+        frame = json.dumps(message)
+        self.counters['broadcasts'] += 1
+        self._offer([connection for connection in recipients if connection.effective_role == 'viewer'], frame)
+        for connection in recipients:
+            if connection.effective_role != 'viewer':
+                await self._put(connection, frame)
+
+    def _offer(self, connections: Iterable[RelayConnection], frame: str) -> None:
+        """Queue a frame on connections that may miss it, dropping it where full."""
+        for connection in connections:
+            try:
+                connection.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self.counters['dropped_frames'] += 1
+                continue
+            self.counters['messages_sent'] += 1
+            self.counters['bytes_sent'] += len(frame)
+
+    async def _put(self, connection: RelayConnection, frame: str) -> None:
+        """Queue a frame, waiting while the connection's queue is full."""
+        if connection.queue.full():
+            self.counters['blocked_sends'] += 1
+        await connection.queue.put(frame)
+        self.counters['messages_sent'] += 1
+        self.counters['bytes_sent'] += len(frame)
+
+    async def _send(self, connection: RelayConnection, message: Dict[str, Any]) -> None:
+        await self._put(connection, json.dumps(message))
+
+    async def _reply(self, connection: RelayConnection, message: Dict[str, Any], seq: Optional[int]) -> None:
+        if seq is not None:
+            message['seq'] = seq
+        await self._send(connection, message)
+
+    async def _send_error(self, connection: RelayConnection, error: str,
+                          agent_id: str = 'server', seq: Optional[int] = None) -> None:
+        await self._reply(connection, {'type': 'error', 'agentId': agent_id, 'data': {'error': error}}, seq)
+
+    def _bind(self, connection: RelayConnection, agent_id: str) -> None:
+        """Record that a connection works with an agent; trainers own it."""
+        connection.agent_ids.add(agent_id)
+        if connection.role == 'trainer':
+            self.owners[agent_id] = connection
+
+    def _release(self, connection: RelayConnection) -> None:
+        """Remove a connection from the owner index."""
+        for agent_id in connection.agent_ids:
+            if self.owners.get(agent_id) is connection:
+                del self.owners[agent_id]
+
+    def _resume(self, connection: RelayConnection, agents: List[str]) -> Dict[str, List[str]]:
+        """Re-bind the agents of a reconnected trainer."""
+        resumed, lost = [], []
+        connection.role = connection.role or 'trainer'
+        for agent_id in agents:
+            if not isinstance(agent_id, str):
+                continue
+            handle = self._detached.pop(agent_id, None)
+            if handle is not None:
+                handle.cancel()
+            self._bind(connection, agent_id)
+            (resumed if agent_id in self.agents else lost).append(agent_id)
+        return {'resumed': resumed, 'lost': lost}
+
+    def _close(self, connection: RelayConnection) -> None:
+        """Forget a closed connection, keeping its agents for the grace period."""
+        if self.connections.pop(connection.id, None) is None:
+            return
+        self.logger.info(f"Client disconnected: {connection.id}")
+        if connection.sender is not None:
+            connection.sender.cancel()
+        self._release(connection)
+        loop = asyncio.get_running_loop()
+        for agent_id in connection.agent_ids:
+            if agent_id in self.owners:
+                continue
+            if self.resume_grace_period <= 0:
+                self._remove_agent(agent_id)
+                continue
+            handle = self._detached.pop(agent_id, None)
+            if handle is not None:
+                handle.cancel()
+            self._detached[agent_id] = loop.call_later(self.resume_grace_period, self._remove_agent, agent_id)
+
+    def _remove_agent(self, agent_id: str) -> None:
+        self._detached.pop(agent_id, None)
+        self.agents.pop(agent_id, None)
+        self.pending_seq.pop(agent_id, None)
+        self._repeats.pop(agent_id, None)
+        self._viewer_updates.pop(agent_id, None)
+        self._offer(self.connections.values(), json.dumps({
+            'type': 'info',
+            'agentId': 'server',
+            'data': {'agentDisconnected': agent_id}
+        }))
+
+    async def _check_heartbeats(self) -> None:
+        """Close connections that sent nothing for ``connection_timeout`` seconds."""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            for connection in list(self.connections.values()):
+                if now - connection.last_activity > self.connection_timeout:
+                    self.logger.info(f"Connection {connection.id} timed out, closing")
+                    self._close(connection)
+                    # A dead peer never answers the closing handshake; waiting
+                    # for it here would hold up the sweep for everyone else
+                    task = asyncio.create_task(connection.websocket.close(1000, "Connection timeout"))
+                    self._closing.add(task)
+                    task.add_done_callback(self._closing.discard)
+
+
+def install_uvloop() -> bool:
+    """
+    Use uvloop for the event loops created from now on, if it is installed.
+
+    Returns:
+        Whether uvloop is in use
+    """
+    try:
+        import uvloop
+    except ImportError:
+        logger.warning("uvloop is not installed, using the default asyncio event loop")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run the relay server."""
+    parser = argparse.ArgumentParser(description="R3F agents relay server")
+    parser.add_argument("--host", type=str, default="localhost", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--unix", type=str, default=None, help="Unix domain socket to listen on instead of the port")
+    parser.add_argument("--queue-size", type=int, default=1024, help="Frames that may wait to be sent per connection")
+    parser.add_argument("--viewer-interval", type=float, default=0.05,
+                        help="Seconds between two updates of an agent sent to viewers, 0 for every update")
+    parser.add_argument("--uvloop", action="store_true", help="Run on uvloop if it is installed")
+    parser.add_argument("--log-level", type=str, default="INFO", help="Logging level")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if args.uvloop:
+        install_uvloop()
+    server = RelayServer(
+        args.host,
+        args.port,
+        path=args.unix,
+        queue_size=args.queue_size,
+        viewer_interval=args.viewer_interval
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,604 @@
+"""
+Vectorized training across several R3F server endpoints.
+
+``R3FShardedVecEnv`` splits its agent slots into fixed-size shards and drives
+each shard as an ``R3FVecEnv`` connected to one endpoint. Every step, all
+shards are stepped concurrently on the background loop and their results are
+stacked into one batch, in slot order, for the learner.
+
+Shards are placed where they are expected to step fastest. The step latency
+of every endpoint is measured as it trains, and every ``rebalance_interval``
+steps one shard moves from the endpoint most over its share to the one most
+under it, shares being proportional to each endpoint's measured agent
+throughput. A shard that fails, or whose agents all time out
+``max_strikes`` steps in a row, takes its endpoint out of rotation for
+``retry_after`` seconds and is moved right away. The episodes of a failed
+shard are truncated, with ``info['shard_moved']`` set. A shard moved for
+load balancing takes its agents' states with it, so their episodes go on.
+
+Example:
+    ```python
+    env = R3FShardedVecEnv(
+        ["ws://node-1:8765", "ws://node-1:8766", "ws://node-2:8765"],
+        num_agents=48,
+    )
+    model = PPO("MultiInputPolicy", env)
+    ```
+"""
+import time
+import asyncio
+import numpy as np
+from gymnasium import spaces
+from typing import Dict, Any, Optional, List, Sequence, Tuple, Union
+import logging
+
+from .actions import ActionMapping
+from .environment import default_action_space, default_observation_space
+from .loop import BackgroundLoop, get_background_loop
+from .metrics import Metrics
+from .protocol import PROTOCOL_JSON
+from .rewards import TargetReward
+from .vec_env import R3FVecEnv, VecEnv
+
+logger = logging.getLogger("r3f_agents")
+
+# Weight of the latest step in the latency moving average of an endpoint
+LATENCY_SMOOTHING = 0.1
+
+
+class Shard:
+    """A contiguous range of agent slots driven over one endpoint."""
+
+    def __init__(self, slots: slice, agent_ids: List[str]):
+        """
+        Args:
+            slots: Slots of the sharded environment the shard covers
+            agent_ids: Identifiers of the shard's agents
+        """
+        self.slots = slots
+        self.agent_ids = agent_ids
+        self.endpoint: Optional[str] = None
+        self.env: Optional[R3FVecEnv] = None
+        self.strikes = 0
+
+    def __len__(self) -> int:
+        return len(self.agent_ids)
+
+
+class Endpoint:
+    """Health and measured latency of one server endpoint."""
+
+    def __init__(self, url: str):
+        """
+        Args:
+            url: URL of the server
+        """
+        self.url = url
+        self.latency: Optional[float] = None
+        # Step latency divided by the agents placed on the endpoint, which
+        # stays meaningful once every shard moved away
+        self.cost: Optional[float] = None
+        self.down_until = 0.0
+        self.failures = 0
+
+    @property
+    def available(self) -> bool:
+        """Whether shards may be placed on the endpoint."""
+        return time.monotonic() >= self.down_until
+
+    def observe(self, seconds: float, agents: int) -> None:
+        """
+        Fold the duration of one step into the moving averages.
+
+        Args:
+            seconds: Step latency of a shard on the endpoint
+            agents: Agents placed on the endpoint during the step
+        """
+        if self.latency is None:
+            self.latency = seconds
+            self.cost = seconds / agents
+        else:
+            self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+            self.cost += LATENCY_SMOOTHING * (seconds / agents - self.cost)
+
+
+class R3FShardedVecEnv(VecEnv):
+    """
+    Vectorized environment spreading its agents over several R3F servers.
+
+    Behaves like ``R3FVecEnv`` towards the learner: observations, rewards and
+    dones come back stacked as ``(num_agents, ...)`` arrays, and episodes end
+    after ``max_episode_steps``. Each shard has its own connection, so a slow
+    or dead endpoint only delays its own shards, by at most ``shard_timeout``.
+    """
+
+    def __init__(self,
+                 endpoints: Sequence[str],
+                 agent_ids: Optional[Sequence[str]] = None,
+                 num_agents: Optional[int] = None,
+                 shard_size: Optional[int] = None,
+                 observation_space: Optional[spaces.Space] = None,
+                 action_space: Optional[spaces.Space] = None,
+                 max_episode_steps: int = 1000,
+                 loop: Optional[BackgroundLoop] = None,
+                 protocol: str = PROTOCOL_JSON,
+                 delta: bool = False,
+                 camera: Optional[Dict[str, Any]] = None,
+                 shard_timeout: float = 5.0,
+                 rebalance_interval: int = 100,
+                 max_strikes: int = 3,
+                 retry_after: float = 30.0,
+                 metrics_port: Optional[int] = None,
+                 action_mapping: Optional[ActionMapping] = None,
+                 reward: Optional[TargetReward] = None):
+        """
+        Initialize the sharded environment.
+
+        Args:
+            endpoints: URLs of the servers, in any scheme ``R3FEnv`` accepts
+            agent_ids: Identifiers of the agents to drive, one per slot
+            num_agents: Number of agents to drive when agent_ids is not given.
+                Agents are then named ``agent_0``, ``agent_1``, ...
+            shard_size: Agents per shard, the unit moved between endpoints.
+                Defaults to splitting the agents into four shards per endpoint
+            observation_space: Per-agent observation space
+            action_space: Per-agent action space
+            max_episode_steps: Maximum number of steps per episode
+            loop: Background loop that owns the connections. Defaults to the
+                process-wide loop shared by all environments
+            protocol: Wire protocol to request from the servers
+            delta: Ask the servers for delta-encoded states
+            camera: Stream every agent's view with this configuration, see
+                ``R3FEnv``
+            shard_timeout: Seconds to wait for the replies of a shard before
+                its agents get stale observations
+            rebalance_interval: Steps between two load-balancing moves. 0
+                disables load balancing; failed shards are still moved
+            max_strikes: Consecutive steps in which a shard gets no reply at
+                all before its endpoint is considered down
+            retry_after: Seconds an endpoint that went down is left out
+            metrics_port: Serve ``metrics`` in the Prometheus text format on
+                this local port
+            action_mapping: How actions map to the channels of the action
+                message, see ``ActionEncoder``
+            reward: Reward engine computing rewards and terminations of all
+                agents from their positions, see ``R3FVecEnv``. Each shard
+                uses the slice of it covering its agents
+
+        Raises:
+            ValueError: If no endpoint is given, the agent IDs are invalid or
+                the reward is built for another number of agents
+        """
+        if not endpoints:
+            raise ValueError("At least one endpoint must be given")
+        if agent_ids is None:
+            if num_agents is None:
+                raise ValueError("Either agent_ids or num_agents must be given")
+            agent_ids = [f"agent_{i}" for i in range(num_agents)]
+        if len(set(agent_ids)) != len(agent_ids):
+            raise ValueError("agent_ids must be unique")
+        if reward is not None and reward.num_agents != len(agent_ids):
+            raise ValueError(f"reward is built for {reward.num_agents} agents, expected {len(agent_ids)}")
+
+        super().__init__(
+            len(agent_ids),
+            observation_space or default_observation_space(),
+            action_space or default_action_space()
+        )
+
+        self.logger = logger
+        self.agent_ids = list(agent_ids)
+        self.endpoints = [Endpoint(url) for url in dict.fromkeys(endpoints)]
+        self.loop = loop
+        self.max_episode_steps = max_episode_steps
+        self.current_steps = np.zeros(self.num_envs, dtype=np.int64)
+        self.shard_timeout = shard_timeout
+        self.rebalance_interval = rebalance_interval
+        self.max_strikes = max_strikes
+        self.retry_after = retry_after
+        self.metrics = Metrics()
+        self.reward = reward
+        self._env_kwargs = {
+            'protocol': protocol,
+            'delta': delta,
+            'camera': camera,
+            'action_mapping': action_mapping,
+            'copy_obs': False,
+        }
+
+        if shard_size is None:
+            shard_size = -(-self.num_envs // (4 * len(self.endpoints)))
+        shard_size = max(1, shard_size)
+        self.shards = [
+            Shard(slice(start, min(start + shard_size, self.num_envs)), self.agent_ids[start:start + shard_size])
+            for start in range(0, self.num_envs, shard_size)
+        ]
+        # Round-robin initial placement, before any latency is known
+        for index, shard in enumerate(self.shards):
+            shard.endpoint = self.endpoints[index % len(self.endpoints)].url
+
+        self._obs: Optional[Union[Dict[str, np.ndarray], np.ndarray]] = None
+        self._actions: Optional[np.ndarray] = None
+        self._steps = 0
+
+        if metrics_port is not None:
+            self.metrics.serve(metrics_port)
+
+        self.logger.info(
+            f"R3F sharded environment initialized: {self.num_envs} agents in {len(self.shards)} shards "
+            f"over {len(self.endpoints)} endpoints"
+        )
+
+    def _run(self, coro) -> Any:
+        """Run a coroutine on the background loop and wait for its result."""
+        if self.loop is None:
+            self.loop = get_background_loop()
+        return self.loop.run(coro)
+
+    def _endpoint(self, url: str) -> Endpoint:
+        return next(endpoint for endpoint in self.endpoints if endpoint.url == url)
+
+    def _load(self) -> Dict[str, int]:
+        """Number of agents placed on every endpoint."""
+        load = {endpoint.url: 0 for endpoint in self.endpoints}
+        for shard in self.shards:
+            load[shard.endpoint] += len(shard)
+        return load
+
+    def _targets(self, candidates: List[Endpoint]) -> Dict[str, float]:
+        """
+        Number of agents each endpoint should hold, proportional to its
+        measured throughput in agents per second.
+
+        Endpoints without a measurement are assumed to be as fast as the
+        average of the measured ones.
+        """
+        throughputs = {endpoint.url: 1.0 / endpoint.cost for endpoint in candidates if endpoint.cost}
+        default = float(np.mean(list(throughputs.values()))) if throughputs else 1.0
+        weights = {endpoint.url: throughputs.get(endpoint.url, default) for endpoint in candidates}
+        total = sum(weights.values())
+        return {url: self.num_envs * weight / total for url, weight in weights.items()}
+
+    def _pick_endpoint(self, shard: Shard) -> Endpoint:
+        """
+        The available endpoint most under its share, other than the shard's.
+
+        Raises:
+            ConnectionError: If every endpoint is down
+        """
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.available]
+        if not candidates:
+            raise ConnectionError(f"All {len(self.endpoints)} endpoints are down")
+        others = [endpoint for endpoint in candidates if endpoint.url != shard.endpoint] or candidates
+        targets = self._targets(candidates)
+        load = self._load()
+        return max(others, key=lambda endpoint: targets[endpoint.url] - load[endpoint.url])
+
+    def _mark_down(self, endpoint: Endpoint, reason: str) -> None:
+        self.metrics.increment('shard_failures')
+        if not endpoint.available:
+            return
+        endpoint.failures += 1
+        endpoint.down_until = time.monotonic() + self.retry_after
+        endpoint.latency = endpoint.cost = None
+        self.logger.warning(f"Endpoint {endpoint.url} is down for {self.retry_after} seconds: {reason}")
+
+    async def _close_shard(self, shard: Shard) -> None:
+        """Close a shard's connection, giving up after ``shard_timeout``."""
+        env, shard.env = shard.env, None
+        if env is None:
+            return
+        try:
+            await asyncio.wait_for(env._disconnect(), self.shard_timeout)
+        except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+            self.logger.debug(f"Error while closing shard on {env.websocket_url}: {e}")
+
+    async def _open_shard(self, shard: Shard) -> None:
+        """
+        Connect a shard to its endpoint and reset its agents, moving it to
+        another endpoint for as long as that fails.
+
+        Raises:
+            ConnectionError: If every endpoint is down
+        """
+        while True:
+            endpoint = self._endpoint(shard.endpoint)
+            if endpoint.available:
+                env = R3FVecEnv(
+                    websocket_url=endpoint.url,
+                    agent_ids=shard.agent_ids,
+                    observation_space=self.observation_space,
+                    action_space=self.action_space,
+                    max_episode_steps=self.max_episode_steps,
+                    loop=self.loop,
+                    reward=None if self.reward is None else self.reward.select(shard.slots),
+                    **self._env_kwargs
+                )
+                env.timeout = self.shard_timeout
+                env._options = [dict(self._options[i] or {}) for i in range(shard.slots.start, shard.slots.stop)]
+                shard.env = env
+                try:
+                    await asyncio.wait_for(env._reset_agents(list(range(len(shard)))), 2 * self.shard_timeout)
+                    shard.strikes = 0
+                    return
+                except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+                    await self._close_shard(shard)
+                    self._mark_down(endpoint, f"reset failed: {e!r}")
+            shard.endpoint = self._pick_endpoint(shard).url
+
+    async def _move_shard(self, shard: Shard, endpoint: Optional[Endpoint] = None, carry: bool = False) -> List[int]:
+        """
+        Close a shard and reopen it on another endpoint.
+
+        Args:
+            shard: Shard to move
+            endpoint: Destination, or None to pick one
+            carry: Save the agents' states on the old endpoint and restore
+                them on the new one, so that their episodes go on
+
+        Returns:
+            Slots of the agents whose episodes did not survive the move
+        """
+        states: List[Optional[Dict[str, Any]]] = [None] * len(shard)
+        if carry:
+            try:
+                states = await asyncio.wait_for(shard.env._save_states(range(len(shard))), 2 * self.shard_timeout)
+            except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+                self.logger.warning(f"Could not save the states of a moving shard: {e!r}")
+        await self._close_shard(shard)
+        shard.endpoint = (endpoint or self._pick_endpoint(shard)).url
+        self.metrics.increment('shard_moves')
+        self.logger.info(f"Moving agents {shard.agent_ids[0]}..{shard.agent_ids[-1]} to {shard.endpoint}")
+        await self._open_shard(shard)
+
+        saved = [i for i, state in enumerate(states) if state is not None]
+        restored = []
+        if saved:
+            try:
+                restored = await asyncio.wait_for(
+                    shard.env._restore_states([states[i] for i in saved], saved), 2 * self.shard_timeout
+                )
+            except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+                self.logger.warning(f"Could not restore the states of a moved shard: {e!r}")
+        return [shard.slots.start + i for i in range(len(shard)) if i not in restored]
+
+    async def _step_shard(self, shard: Shard, actions: np.ndarray, dones: np.ndarray):
+        """
+        Step one shard, bounded by twice ``shard_timeout``.
+
+        Returns:
+            The shard's step results, or None if it failed and was moved
+        """
+        start = time.perf_counter()
+        agents = self._load()[shard.endpoint]
+        try:
+            result = await asyncio.wait_for(
+                shard.env._step_all(actions[shard.slots], dones[shard.slots]), 2 * self.shard_timeout
+            )
+        except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+            self._mark_down(self._endpoint(shard.endpoint), f"step failed: {e!r}")
+            await self._move_shard(shard)
+            return None
+        self._endpoint(shard.endpoint).observe(time.perf_counter() - start, agents)
+
+        infos = result[3]
+        if all(info.get('stale_observation') for info in infos):
+            shard.strikes += 1
+            if shard.strikes >= self.max_strikes:
+                self._mark_down(self._endpoint(shard.endpoint), f"{shard.strikes} steps without replies")
+                await self._move_shard(shard)
+                return None
+        else:
+            shard.strikes = 0
+        return result
+
+    async def _rebalance(self) -> List[Tuple[Shard, List[int]]]:
+        """
+        Move one shard from the endpoint most over its share of agents to
+        the one most under it, if that brings both closer to their share.
+        The moved agents' states go with them.
+
+        Returns:
+            The moved shards, each with the slots of its agents whose
+            episodes did not survive the move
+        """
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.available]
+        if len(candidates) < 2:
+            return []
+        targets = self._targets(candidates)
+        load = self._load()
+        excess = {url: load[url] - target for url, target in targets.items()}
+        source = max(excess, key=excess.get)
+        destination = min(excess, key=excess.get)
+        shards = [shard for shard in self.shards if shard.endpoint == source]
+        if not shards:
+            return []
+        shard = min(shards, key=len)
+        before = abs(excess[source]) + abs(excess[destination])
+        after = abs(excess[source] - len(shard)) + abs(excess[destination] + len(shard))
+        if after >= before:
+            return []
+        cut = await self._move_shard(shard, self._endpoint(destination), carry=True)
+        return [(shard, cut)]
+
+    def _write_obs(self, slots: slice, obs: Union[Dict[str, np.ndarray], np.ndarray]) -> None:
+        """Copy a shard's stacked observations into the full batch."""
+        if self._obs is None:
+            if isinstance(obs, dict):
+                self._obs = {key: np.zeros((self.num_envs,) + value.shape[1:], dtype=value.dtype)
+                             for key, value in obs.items()}
+            else:
+                self._obs = np.zeros((self.num_envs,) + obs.shape[1:], dtype=obs.dtype)
+        if isinstance(obs, dict):
+            for key, value in obs.items():
+                self._obs[key][slots] = value
+        else:
+            self._obs[slots] = obs
+
+    def _batch(self) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        if isinstance(self._obs, dict):
+            return {key: value.copy() for key, value in self._obs.items()}
+        return self._obs.copy()
+
+    def _observation(self, index: int) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        if isinstance(self._obs, dict):
+            return {key: value[index].copy() for key, value in self._obs.items()}
+        return self._obs[index].copy()
+
+    async def _close_all(self) -> None:
+        await asyncio.gather(*(self._close_shard(shard) for shard in self.shards))
+
+    async def _reset_all(self) -> None:
+        await self._close_all()
+        await asyncio.gather(*(self._open_shard(shard) for shard in self.shards))
+        for shard in self.shards:
+            self._write_obs(shard.slots, shard.env._batch())
+            self.reset_infos[shard.slots] = shard.env.reset_infos
+
+    async def _step_shards(self, actions: np.ndarray, dones: np.ndarray):
+        """
+        Step every shard concurrently and stack their results.
+
+        Shards whose step failed end their episodes: their agents get no
+        reward, are flagged ``done`` with ``info['shard_moved']``, and their
+        observation is the reset observation from the new endpoint. Shards
+        moved for load balancing keep their step results and carry their
+        agents' states over; only agents whose state could not be carried
+        are truncated that way.
+
+        Returns:
+            observations, rewards, dones, infos
+        """
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self._step_shard(shard, actions, dones) for shard in self.shards))
+        self._steps += 1
+
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = dones.copy()
+        infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+        failed = []
+        for shard, result in zip(self.shards, results):
+            if result is None:
+                failed.append(shard)
+                continue
+            obs, shard_rewards, shard_dones, shard_infos = result
+            self._write_obs(shard.slots, obs)
+            rewards[shard.slots] = shard_rewards
+            dones[shard.slots] = shard_dones
+            infos[shard.slots] = shard_infos
+            self.reset_infos[shard.slots] = shard.env.reset_infos
+        self.current_steps[dones] = 0
+
+        for shard in failed:
+            for i in range(shard.slots.start, shard.slots.stop):
+                infos[i].update({
+                    'terminal_observation': self._observation(i),
+                    'TimeLimit.truncated': True,
+                    'shard_moved': True,
+                })
+            dones[shard.slots] = True
+            rewards[shard.slots] = 0.0
+            self.current_steps[shard.slots] = 0
+            self._write_obs(shard.slots, shard.env._batch())
+            self.reset_infos[shard.slots] = shard.env.reset_infos
+
+        if self.rebalance_interval and self._steps % self.rebalance_interval == 0:
+            for shard, cut in await self._rebalance():
+                for i in cut:
+                    self.reset_infos[i] = shard.env.reset_infos[i - shard.slots.start]
+                    if dones[i]:
+                        # Already reset with this step, on the old endpoint
+                        continue
+                    infos[i].update({
+                        'terminal_observation': self._observation(i),
+                        'TimeLimit.truncated': True,
+                        'shard_moved': True,
+                    })
+                    dones[i] = True
+                    self.current_steps[i] = 0
+                # Restored agents go on from the same state on the new endpoint
+                self._write_obs(shard.slots, shard.env._batch())
+
+        self.metrics.record('step', time.perf_counter() - start)
+        return self._batch(), rewards, dones, infos
+
+    def reset(self) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Reset every agent, reconnecting every shard.
+
+        Returns:
+            Stacked initial observations
+        """
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        self.current_steps[:] = 0
+        self._run(self._reset_all())
+        self._seeds = [None for _ in range(self.num_envs)]
+        self._options = [{} for _ in range(self.num_envs)]
+        return self._batch()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        """
+        Store the batched actions until ``step_wait``.
+
+        Args:
+            actions: Batch of actions, one per agent
+        """
+        self._actions = np.asarray(actions)
+
+    def step_wait(self):
+        """
+        Step every shard with the stored actions.
+
+        Returns:
+            observations, rewards, dones, infos
+        """
+        if self._actions is None:
+            raise RuntimeError("step_wait() called without a pending step_async()")
+        actions, self._actions = self._actions, None
+        self.current_steps += 1
+        dones = self.current_steps >= self.max_episode_steps
+        self.current_steps[dones] = 0
+        return self._run(self._step_shards(actions, dones))
+
+    def shard_stats(self) -> List[Dict[str, Any]]:
+        """
+        Placement and health of every endpoint.
+
+        Returns:
+            One entry per endpoint with its URL, agents, shards, smoothed step
+            latency in seconds, failures and availability
+        """
+        load = self._load()
+        return [{
+            'url': endpoint.url,
+            'agents': load[endpoint.url],
+            'shards': sum(shard.endpoint == endpoint.url for shard in self.shards),
+            'latency': endpoint.latency,
+            'failures': endpoint.failures,
+            'available': endpoint.available,
+        } for endpoint in self.endpoints]
+
+    def close(self) -> None:
+        """Close every shard's connection."""
+        self.logger.info("Closing R3F sharded environment")
+        self.metrics.close()
+        if self.loop:
+            self.loop.run(self._close_all())
+            self.loop = None
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        """Return an attribute of the sharded environment once per selected agent."""
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        """Set an attribute on the sharded environment, which is shared by all agents."""
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List[Any]:
+        """Call a method of the sharded environment once per selected agent."""
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        """Agents are never wrapped individually."""
+        return [False for _ in self._get_indices(indices)]
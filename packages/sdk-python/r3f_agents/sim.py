@@ -0,0 +1,859 @@
+"""
+Headless kinematic simulator speaking the R3F agent protocol.
+
+The simulator integrates position and rotation for a whole batch of agents
+with NumPy, so it needs neither a browser nor a GPU. It can be used three
+ways:
+
+- directly, through ``KinematicSimulator.step`` on ``(N, 3)`` arrays;
+- in-process as a vectorized environment, through ``HeadlessVecEnv``;
+- as a local WebSocket stand-in for the R3F scene and relay server, through
+  ``SimulatorServer`` or ``python -m r3f_agents.sim``, which ``R3FEnv`` and
+  ``R3FVecEnv`` connect to exactly as they would to the real thing.
+"""
+import json
+import asyncio
+import argparse
+import numpy as np
+from gymnasium import spaces
+from typing import Dict, Any, Optional, List, Sequence, Union, Tuple
+import websockets
+import logging
+
+from .actions import ActionEncoder, ActionMapping
+from .camera import camera_config
+from .environment import default_action_space, default_observation_space
+from .observation import ObservationBuffer
+from .protocol import (PROTOCOL_BINARY, PROTOCOL_JSON, DeltaEncoder, ProtocolError, decode_frame,
+                       encode_camera_frame, encode_record)
+from .vec_env import VecEnv
+
+logger = logging.getLogger("r3f_agents")
+
+
+class KinematicSimulator:
+    """
+    Batched kinematic point-agent simulator.
+
+    Actions are movement directions in ``[-1, 1]^3`` that are scaled by
+    ``speed`` and integrated over ``dt``. Agents stay on the floor, are kept
+    inside ``bounds`` and face their direction of travel unless a rotation
+    action is given. The reward is the progress made towards the agent's
+    target; reaching the target ends the episode with ``success_reward`` and
+    leaving the bounds ends it with ``out_of_bounds_penalty``.
+    """
+
+    def __init__(self,
+                 num_agents: int = 1,
+                 dt: float = 0.1,
+                 speed: float = 5.0,
+                 turn_rate: float = np.pi,
+                 bounds: float = 50.0,
+                 floor_height: float = 0.0,
+                 start_position: Sequence[float] = (0.0, 0.0, 0.0),
+                 target_position: Sequence[float] = (10.0, 0.0, 10.0),
+                 success_radius: float = 0.5,
+                 success_reward: float = 10.0,
+                 out_of_bounds_penalty: float = -10.0):
+        """
+        Initialize the simulator.
+
+        Args:
+            num_agents: Initial number of agent slots. More are added on demand
+            dt: Integration time step in seconds
+            speed: Movement speed in units per second for a unit action
+            turn_rate: Rotation speed in radians per second for a unit action
+            bounds: Half extent of the square floor in the x and z directions
+            floor_height: Height agents are kept at
+            start_position: Position agents are reset to
+            target_position: Position agents are rewarded for reaching
+            success_radius: Distance to the target that counts as reaching it
+            success_reward: Reward added when the target is reached
+            out_of_bounds_penalty: Reward added when an agent leaves the floor
+        """
+        self.dt = dt
+        self.speed = speed
+        self.turn_rate = turn_rate
+        self.bounds = bounds
+        self.floor_height = floor_height
+        self.start_position = np.asarray(start_position, dtype=np.float32)
+        self.target_position = np.asarray(target_position, dtype=np.float32)
+        self.success_radius = success_radius
+        self.success_reward = success_reward
+        self.out_of_bounds_penalty = out_of_bounds_penalty
+
+        self.num_agents = 0
+        self.positions = np.zeros((0, 3), dtype=np.float32)
+        self.rotations = np.zeros((0, 3), dtype=np.float32)
+        self.targets = np.zeros((0, 3), dtype=np.float32)
+        self.rewards = np.zeros(0, dtype=np.float32)
+        self.dones = np.zeros(0, dtype=bool)
+        self.distances = np.zeros(0, dtype=np.float32)
+        self.resize(num_agents)
+
+    def resize(self, num_agents: int) -> None:
+        """
+        Grow the agent arrays to hold at least ``num_agents`` agents.
+
+        Args:
+            num_agents: Required number of agent slots
+        """
+        if num_agents <= self.num_agents:
+            return
+        extra = num_agents - self.num_agents
+        self.positions = np.concatenate([self.positions, np.tile(self.start_position, (extra, 1))])
+        self.rotations = np.concatenate([self.rotations, np.zeros((extra, 3), dtype=np.float32)])
+        self.targets = np.concatenate([self.targets, np.tile(self.target_position, (extra, 1))])
+        self.rewards = np.concatenate([self.rewards, np.zeros(extra, dtype=np.float32)])
+        self.dones = np.concatenate([self.dones, np.zeros(extra, dtype=bool)])
+        self.distances = np.concatenate([self.distances, np.zeros(extra, dtype=np.float32)])
+        self.num_agents = num_agents
+        self._update_distances(np.arange(num_agents - extra, num_agents))
+
+    def _update_distances(self, indices: np.ndarray) -> np.ndarray:
+        self.distances[indices] = np.linalg.norm(self.targets[indices] - self.positions[indices], axis=1)
+        return self.distances[indices]
+
+    def reset(self, indices: Optional[np.ndarray] = None, positions: Optional[np.ndarray] = None) -> None:
+        """
+        Reset agents to their start position.
+
+        Args:
+            indices: Agents to reset. All agents when None
+            positions: Start positions, ``(3,)`` or ``(len(indices), 3)``.
+                Defaults to the simulator's start position
+        """
+        indices = np.arange(self.num_agents) if indices is None else np.asarray(indices)
+        self.positions[indices] = self.start_position if positions is None else positions
+        self.positions[indices, 1] = self.floor_height
+        self.rotations[indices] = 0.0
+        self.rewards[indices] = 0.0
+        self.dones[indices] = False
+        self._update_distances(indices)
+
+    def restore(self, indices: np.ndarray, states: Sequence[Dict[str, Any]]) -> None:
+        """
+        Put agents back into saved states, starting new episodes from them.
+
+        Args:
+            indices: Agents to restore
+            states: One state per agent, as returned by ``snapshot``. Missing
+                fields take their reset value
+        """
+        indices = np.asarray(indices)
+        self.positions[indices] = [state.get('position', self.start_position) for state in states]
+        self.positions[indices, 1] = self.floor_height
+        self.rotations[indices] = [state.get('rotation', (0.0, 0.0, 0.0)) for state in states]
+        self.targets[indices] = [state.get('target', self.target_position) for state in states]
+        self.rewards[indices] = 0.0
+        self.dones[indices] = False
+        self._update_distances(indices)
+
+    def step(self,
+             actions: np.ndarray,
+             indices: Optional[np.ndarray] = None,
+             rotations: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Advance a batch of agents by one time step.
+
+        Args:
+            actions: Movement directions, ``(len(indices), 3)``
+            indices: Agents to advance. All agents when None
+            rotations: Optional angular velocities, ``(len(indices), 3)``.
+                When omitted, agents turn to face their direction of travel
+
+        Returns:
+            rewards and dones of the advanced agents
+        """
+        indices = np.arange(self.num_agents) if indices is None else np.asarray(indices)
+        velocity = np.clip(np.asarray(actions, dtype=np.float32), -1.0, 1.0) * self.speed
+        previous = self.distances[indices].copy()
+
+        positions = self.positions[indices] + velocity * self.dt
+        positions[:, 1] = self.floor_height
+        out_of_bounds = np.any(np.abs(positions[:, [0, 2]]) > self.bounds, axis=1)
+        np.clip(positions, -self.bounds, self.bounds, out=positions)
+        self.positions[indices] = positions
+
+        if rotations is not None:
+            self.rotations[indices] += np.clip(np.asarray(rotations, dtype=np.float32), -1.0, 1.0) * self.turn_rate * self.dt
+            self.rotations[indices] = (self.rotations[indices] + np.pi) % (2 * np.pi) - np.pi
+        else:
+            moving = np.any(velocity[:, [0, 2]] != 0.0, axis=1)
+            yaw = np.arctan2(velocity[:, 0], velocity[:, 2])
+            self.rotations[indices[moving], 1] = yaw[moving]
+
+        distances = self._update_distances(indices)
+        success = distances <= self.success_radius
+        rewards = previous - distances
+        rewards[success] += self.success_reward
+        rewards[out_of_bounds] += self.out_of_bounds_penalty
+
+        self.rewards[indices] = rewards
+        self.dones[indices] = success | out_of_bounds
+        return rewards, self.dones[indices]
+
+    def state(self, index: int) -> Dict[str, Any]:
+        """
+        Protocol ``state`` payload of one agent.
+
+        Args:
+            index: Agent slot
+
+        Returns:
+            State data as the R3F scene would report it. The distance to the
+            target is left out, as clients compute it themselves, so that the
+            state fits a binary record
+        """
+        return {
+            'position': self.positions[index].tolist(),
+            'rotation': self.rotations[index].tolist(),
+            'reward': float(self.rewards[index]),
+            'done': bool(self.dones[index]),
+        }
+
+    def snapshot(self, index: int) -> Dict[str, Any]:
+        """
+        Everything ``restore`` needs to put an agent back where it is.
+
+        Args:
+            index: Agent slot
+
+        Returns:
+            The agent's state, with its target
+        """
+        data = self.state(index)
+        data['target'] = self.targets[index].tolist()
+        return data
+
+    def render(self, index: int, height: int, width: int, channels: int) -> np.ndarray:
+        """
+        Synthetic top-down camera image of one agent, in place of a rendered view.
+
+        RGB images mark the agent in red and its target in green on a black
+        floor; single-channel images hold the distance of every floor cell to
+        the agent, like a depth map.
+
+        Args:
+            index: Agent slot
+            height: Image height in pixels
+            width: Image width in pixels
+            channels: 1 for depth, 3 for RGB, 4 for RGBA
+
+        Returns:
+            ``(height, width, channels)`` uint8 image
+        """
+        def pixel(position: np.ndarray) -> Tuple[int, int]:
+            u = (position[[0, 2]] + self.bounds) / (2 * self.bounds)
+            return (min(int(u[1] * height), height - 1), min(int(u[0] * width), width - 1))
+
+        image = np.zeros((height, width, channels), dtype=np.uint8)
+        if channels == 1:
+            rows = (np.arange(height) + 0.5) / height * 2 * self.bounds - self.bounds
+            columns = (np.arange(width) + 0.5) / width * 2 * self.bounds - self.bounds
+            x, z = self.positions[index, 0], self.positions[index, 2]
+            distance = np.hypot(columns[None, :] - x, rows[:, None] - z)
+            image[..., 0] = np.clip(distance / (2 * self.bounds) * 255, 0, 255).astype(np.uint8)
+            return image
+        image[pixel(self.targets[index]) + (1,)] = 255
+        image[pixel(self.positions[index]) + (0,)] = 255
+        if channels == 4:
+            image[..., 3] = 255
+        return image
+
+
+class SimulatorBackend:
+    """
+    Protocol-level front end of a KinematicSimulator.
+
+    Maps agent IDs to simulator slots and turns ``action``, ``reset`` and
+    ``restore`` messages, including batched frames, into vectorized simulator
+    calls. Replies are ``state`` messages that echo the request's ``seq``,
+    preceded by a ``camera`` frame for agents whose camera was subscribed and
+    is due. ``snapshot`` requests are answered with ``snapshot`` messages
+    carrying the agent's saved ``state``.
+    """
+
+    def __init__(self, simulator: Optional[KinematicSimulator] = None, payload_size: int = 0):
+        """
+        Initialize the backend.
+
+        Args:
+            simulator: Simulator to drive. A default one is created when None
+            payload_size: Number of extra ``sensors`` values added to every
+                state, to emulate scenes that report larger observations
+        """
+        self.simulator = simulator or KinematicSimulator(num_agents=0)
+        self.payload_size = payload_size
+        self._sensors = [0.0] * payload_size
+        self.slots: Dict[str, int] = {}
+        self.cameras: Dict[str, Dict[str, int]] = {}
+        # agent ID -> [ticks since the last reset, frames sent]
+        self._camera_ticks: Dict[str, List[int]] = {}
+
+    def slot(self, agent_id: str) -> int:
+        """
+        Simulator slot of an agent, allocated on first use.
+
+        Args:
+            agent_id: Agent identifier
+
+        Returns:
+            Index of the agent in the simulator arrays
+        """
+        index = self.slots.get(agent_id)
+        if index is None:
+            index = len(self.slots)
+            self.slots[agent_id] = index
+            if index >= self.simulator.num_agents:
+                self.simulator.resize(max(index + 1, 2 * self.simulator.num_agents))
+        return index
+
+    def state(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Current state of an agent as sent in ``state`` replies.
+
+        Args:
+            agent_id: Agent identifier
+
+        Returns:
+            State data, or None if the agent is unknown
+        """
+        index = self.slots.get(agent_id)
+        if index is None:
+            return None
+        data = self.simulator.state(index)
+        if self.payload_size:
+            data['sensors'] = self._sensors
+        return data
+
+    def subscribe_cameras(self, cameras: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Start rendering frames for the given agents.
+
+        Args:
+            cameras: Camera configurations keyed by agent ID
+
+        Returns:
+            Agents whose configuration was accepted
+        """
+        accepted = []
+        for agent_id, config in cameras.items():
+            try:
+                self.cameras[agent_id] = camera_config(config)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Refusing camera of agent {agent_id}: {e}")
+                continue
+            self._camera_ticks[agent_id] = [0, 0]
+            accepted.append(agent_id)
+        return accepted
+
+    def _camera_frame(self, agent_id: str, ticks: int) -> Optional[Dict[str, Any]]:
+        """
+        Count ticks of an agent and render a frame every ``every`` of them.
+
+        Args:
+            agent_id: Agent identifier
+            ticks: Ticks the agent advanced by, 0 for a reset
+
+        Returns:
+            A ``camera`` message, or None if no frame is due
+        """
+        config = self.cameras[agent_id]
+        counter = self._camera_ticks[agent_id]
+        if ticks:
+            previous, counter[0] = counter[0], counter[0] + ticks
+            if previous // config['every'] == counter[0] // config['every']:
+                return None
+        else:
+            counter[0] = 0
+        counter[1] += 1
+        pixels = self.simulator.render(self.slots[agent_id], config['height'], config['width'], config['channels'])
+        return {'type': 'camera', 'agentId': agent_id, 'frame': counter[1], 'data': pixels}
+
+    def handle(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Process one message, batched or not.
+
+        Args:
+            message: Message sent by a trainer
+
+        Returns:
+            Reply messages
+        """
+        message_type = message.get('type')
+        data = message.get('data') or {}
+        if message_type == 'info' and 'camera' in data:
+            accepted = self.subscribe_cameras(data['camera'])
+            return [{'type': 'info', 'agentId': 'server', 'data': {'camera': accepted}}]
+        if message_type not in ('action', 'reset', 'snapshot', 'restore'):
+            return []
+
+        if 'batch' in data:
+            entries = [(entry['agentId'], entry.get('seq'), entry.get('data') or {}) for entry in data['batch']]
+        else:
+            entries = [(message['agentId'], message.get('seq'), data)]
+        indices = np.array([self.slot(agent_id) for agent_id, _, _ in entries], dtype=np.int64)
+
+        if message_type == 'snapshot':
+            replies = []
+            for (agent_id, seq, _), index in zip(entries, indices.tolist()):
+                reply = {'type': 'snapshot', 'agentId': agent_id, 'data': {'state': self.simulator.snapshot(index)}}
+                if seq is not None:
+                    reply['seq'] = seq
+                replies.append(reply)
+            return replies
+
+        rewards = None
+        if message_type == 'action':
+            actions = np.array([entry_data.get('position', (0.0, 0.0, 0.0)) for _, _, entry_data in entries], dtype=np.float32)
+            actions = actions.reshape(len(entries), 3)
+            if any('rotation' in entry_data for _, _, entry_data in entries):
+                rotations = np.array([entry_data.get('rotation', (0.0, 0.0, 0.0)) for _, _, entry_data in entries], dtype=np.float32)
+            else:
+                rotations = None
+            repeats = np.array([max(1, int(entry_data.get('repeat', 1))) for _, _, entry_data in entries], dtype=np.int64)
+            if repeats.max() == 1:
+                self.simulator.step(actions, indices, rotations)
+            else:
+                rewards = self._repeat(actions, indices, rotations, repeats)
+        elif message_type == 'restore':
+            self.simulator.restore(indices, [entry_data.get('state') or {} for _, _, entry_data in entries])
+        else:
+            starts = [entry_data.get('position') for _, _, entry_data in entries]
+            if all(start is None for start in starts):
+                self.simulator.reset(indices)
+            else:
+                positions = np.array([
+                    self.simulator.start_position if start is None else start for start in starts
+                ], dtype=np.float32)
+                self.simulator.reset(indices, positions)
+
+        replies = []
+        for position, (agent_id, seq, entry_data) in enumerate(entries):
+            if agent_id in self.cameras:
+                ticks = max(1, int(entry_data.get('repeat', 1))) if message_type == 'action' else 0
+                frame = self._camera_frame(agent_id, ticks)
+                if frame is not None:
+                    replies.append(frame)
+            reply = {'type': 'state', 'agentId': agent_id, 'data': self.state(agent_id)}
+            if rewards is not None:
+                reply['data']['reward'] = float(rewards[position])
+            if seq is not None:
+                reply['seq'] = seq
+            replies.append(reply)
+        return replies
+
+    def _repeat(self, actions: np.ndarray, indices: np.ndarray,
+                rotations: Optional[np.ndarray], repeats: np.ndarray) -> np.ndarray:
+        """
+        Apply actions for several ticks, stopping agents that finish early.
+
+        Args:
+            actions: Movement directions, ``(len(indices), 3)``
+            indices: Agents to advance
+            rotations: Optional angular velocities, ``(len(indices), 3)``
+            repeats: Number of ticks per agent
+
+        Returns:
+            Reward summed over the ticks each agent was advanced
+        """
+        rewards = np.zeros(len(indices), dtype=np.float32)
+        active = np.ones(len(indices), dtype=bool)
+        for tick in range(int(repeats.max())):
+            active &= repeats > tick
+            if not active.any():
+                break
+            step_rewards, dones = self.simulator.step(
+                actions[active], indices[active], None if rotations is None else rotations[active]
+            )
+            rewards[active] += step_rewards
+            active[active] = ~dones
+        return rewards
+
+
+class SimulatorServer:
+    """
+    WebSocket stand-in for the R3F relay server and scene.
+
+    Speaks the same message contract as ``AgentWebSocketServer``, including
+    batched frames, sequence numbers, binary protocol negotiation,
+    delta-encoded states and camera frames, with a
+    SimulatorBackend producing the states. Replies can be delayed by a fixed
+    latency and, like the relay server does, broadcast to viewers, the
+    connections that never sent an action or reset. Other trainers do not
+    get them.
+
+    Example:
+        ```python
+        server = SimulatorServer(port=8765)
+        await server.start()
+        ...
+        await server.stop()
+        ```
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 8765,
+                 backend: Optional[SimulatorBackend] = None, path: Optional[str] = None,
+                 latency: float = 0.0, broadcast: bool = False):
+        """
+        Initialize the server.
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on. 0 picks a free port
+            backend: Backend answering the messages. A default one is created when None
+            path: Unix domain socket to listen on instead of ``host`` and ``port``
+            latency: Seconds every frame sent to a client is delayed by
+            broadcast: Also send every state to viewer connections
+        """
+        self.host = host
+        self.path = path
+        self.port = port
+        self.backend = backend or SimulatorBackend()
+        self.latency = latency
+        self.broadcast = broadcast
+        self.logger = logger
+        self._server = None
+        self._connections = set()
+        self._trainers = set()
+
+    async def start(self) -> None:
+        """Start listening."""
+        if self.path is not None:
+            self._server = await websockets.unix_serve(self._handle_connection, self.path)
+            self.logger.info(f"Simulator server listening on unix://{self.path}")
+            return
+        self._server = await websockets.serve(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"Simulator server listening on ws://{self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        """Stop listening and close every connection."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self) -> None:
+        """Start the server and run until cancelled."""
+        await self.start()
+        try:
+            await asyncio.Future()
+        finally:
+            await self.stop()
+
+    async def _handle_connection(self, websocket) -> None:
+        binary_agents: List[str] = []
+        deltas: Optional[DeltaEncoder] = None
+        outbox: Optional[asyncio.Queue] = None
+        sender = None
+        if self.latency > 0:
+            outbox = asyncio.Queue()
+            sender = asyncio.create_task(self._send_delayed(websocket, outbox))
+        self._connections.add(websocket)
+        try:
+            await self._send(websocket, outbox, json.dumps({
+                'type': 'info',
+                'agentId': 'server',
+                'data': {'message': 'Connected to simulator'}
+            }))
+            async for raw in websocket:
+                if isinstance(raw, bytes):
+                    try:
+                        messages = decode_frame(raw, binary_agents)
+                    except ProtocolError as e:
+                        self.logger.warning(f"Discarding malformed binary frame: {e}")
+                        continue
+                    replies = []
+                    records = []
+                    texts = []
+                    self._trainers.add(websocket)
+                    for message in messages:
+                        for reply in self.backend.handle(message):
+                            replies.append(reply)
+                            record = self._encode_binary(reply, binary_agents)
+                            # Replies the binary record cannot hold go as JSON
+                            if record is None:
+                                texts.append(self._encode_json(reply, message['type'], deltas))
+                            else:
+                                records.append(record)
+                    if records:
+                        await self._send(websocket, outbox, b''.join(records))
+                    for text in texts:
+                        await self._send(websocket, outbox, text)
+                    self._broadcast(websocket, replies)
+                    continue
+
+                message = json.loads(raw)
+                data = message.get('data') or {}
+                if message.get('type') == 'info':
+                    if data.get('keepalive'):
+                        continue
+                    if data.get('resync'):
+                        if deltas is not None:
+                            await self._resync(websocket, outbox, deltas, data['resync'])
+                        continue
+                    if data.get('delta') and deltas is None:
+                        deltas = DeltaEncoder()
+                    if 'camera' in data:
+                        accepted = self.backend.subscribe_cameras(data['camera'])
+                        for agent_id in accepted:
+                            if agent_id not in binary_agents:
+                                binary_agents.append(agent_id)
+                        reply_data = {'camera': accepted, 'agents': binary_agents}
+                    elif data.get('resume'):
+                        agents = data.get('agents', [])
+                        reply_data = {
+                            'resumed': [agent_id for agent_id in agents if agent_id in self.backend.slots],
+                            'lost': [agent_id for agent_id in agents if agent_id not in self.backend.slots],
+                        }
+                    elif data.get('protocol') == PROTOCOL_BINARY:
+                        for agent_id in data.get('agents', []):
+                            if agent_id not in binary_agents:
+                                binary_agents.append(agent_id)
+                        reply_data = {'protocol': PROTOCOL_BINARY, 'agents': binary_agents, 'delta': deltas is not None}
+                    elif data.get('delta'):
+                        reply_data = {'protocol': PROTOCOL_JSON, 'delta': True}
+                    else:
+                        reply_data = {'message': 'Information received'}
+                    reply = {'type': 'info', 'agentId': 'server', 'data': reply_data}
+                    if message.get('seq') is not None:
+                        reply['seq'] = message['seq']
+                    await self._send(websocket, outbox, json.dumps(reply))
+                    continue
+
+                if message.get('type') in ('action', 'reset', 'snapshot', 'restore'):
+                    self._trainers.add(websocket)
+                replies = self.backend.handle(message)
+                for reply in replies:
+                    if reply['type'] == 'camera':
+                        await self._send(websocket, outbox, self._encode_binary(reply, binary_agents))
+                        continue
+                    await self._send(websocket, outbox, self._encode_json(reply, message.get('type'), deltas))
+                self._broadcast(websocket, replies)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._connections.discard(websocket)
+            self._trainers.discard(websocket)
+            if sender is not None:
+                sender.cancel()
+
+    async def _send(self, websocket, outbox: Optional[asyncio.Queue], frame: Union[str, bytes]) -> None:
+        if outbox is None:
+            await websocket.send(frame)
+        else:
+            outbox.put_nowait((asyncio.get_running_loop().time() + self.latency, frame))
+
+    async def _resync(self, websocket, outbox: Optional[asyncio.Queue],
+                      deltas: DeltaEncoder, agents: List[str]) -> None:
+        """Send keyframes of the given agents to a client that missed a delta."""
+        for agent_id in agents:
+            data = self.backend.state(agent_id)
+            if data is not None:
+                deltas.forget(agent_id)
+                message = deltas.encode({'type': 'state', 'agentId': agent_id, 'data': data})
+                await self._send(websocket, outbox, json.dumps(message))
+
+    async def _send_delayed(self, websocket, outbox: asyncio.Queue) -> None:
+        """Send queued frames in order once their latency has elapsed."""
+        loop = asyncio.get_running_loop()
+        while True:
+            due, frame = await outbox.get()
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await websocket.send(frame)
+            except websockets.ConnectionClosed:
+                return
+
+    def _broadcast(self, origin, replies: List[Dict[str, Any]]) -> None:
+        """Send states to every viewer connection."""
+        if not self.broadcast or len(self._connections) < 2:
+            return
+        others = [connection for connection in self._connections
+                  if connection is not origin and connection not in self._trainers]
+        for reply in replies:
+            if reply['type'] != 'state':
+                continue
+            message = {key: value for key, value in reply.items() if key != 'seq'}
+            websockets.broadcast(others, json.dumps(message))
+
+    @staticmethod
+    def _encode_binary(reply: Dict[str, Any], binary_agents: List[str]) -> Optional[bytes]:
+        """Encode a reply as a binary record, or return None if it has no binary form."""
+        if reply['type'] == 'camera':
+            return encode_camera_frame(binary_agents.index(reply['agentId']), reply['frame'], reply['data'])
+        return encode_record(reply['type'], binary_agents.index(reply['agentId']), reply.get('data') or {}, reply.get('seq'))
+
+    @staticmethod
+    def _encode_json(reply: Dict[str, Any], request_type: Optional[str], deltas: Optional[DeltaEncoder]) -> str:
+        """Encode a reply as JSON text, delta-encoding states when negotiated."""
+        if deltas is not None and reply['type'] == 'state':
+            if request_type in ('reset', 'restore'):
+                deltas.forget(reply['agentId'])
+            reply = deltas.encode(reply)
+        return json.dumps(reply)
+
+
+class HeadlessVecEnv(VecEnv):
+    """
+    In-process vectorized environment backed by a KinematicSimulator.
+
+    Uses the same observation layout, episode limit and auto-reset behaviour
+    as R3FVecEnv, but calls the simulator directly instead of going through a
+    socket, for browser-free smoke training, CI and throughput baselines.
+    """
+
+    def __init__(self,
+                 num_agents: int = 1,
+                 observation_space: Optional[spaces.Space] = None,
+                 action_space: Optional[spaces.Space] = None,
+                 max_episode_steps: int = 1000,
+                 simulator: Optional[KinematicSimulator] = None,
+                 copy_obs: bool = True,
+                 action_mapping: Optional[ActionMapping] = None):
+        """
+        Initialize the headless vector environment.
+
+        Args:
+            num_agents: Number of simulated agents
+            observation_space: Per-agent observation space
+            action_space: Per-agent action space, decoded into movement
+                directions and angular velocities as by R3FEnv
+            max_episode_steps: Maximum number of steps per episode
+            simulator: Simulator to drive. A default one is created when None
+            copy_obs: Return observation copies rather than read-only views
+            action_mapping: How actions map to movement and rotation, see
+                ``ActionEncoder``. Named actions are ignored
+        """
+        super().__init__(
+            num_agents,
+            observation_space or default_observation_space(),
+            action_space or default_action_space()
+        )
+        self.simulator = simulator or KinematicSimulator(num_agents=num_agents)
+        self.simulator.resize(num_agents)
+        self.max_episode_steps = max_episode_steps
+        self.copy_obs = copy_obs
+        self.current_steps = np.zeros(num_agents, dtype=np.int64)
+        self._obs = ObservationBuffer(self.observation_space, num_agents)
+        self.action_encoder = ActionEncoder(self.action_space, action_mapping)
+        self._actions: Optional[np.ndarray] = None
+
+    def _write_obs(self) -> None:
+        """Copy the simulator state into the observation buffer."""
+        sim = self.simulator
+        for key, source in (('position', sim.positions), ('rotation', sim.rotations)):
+            view = self._obs.views.get(key)
+            if view is not None:
+                view[...] = source[:self.num_envs]
+
+    def _infos(self, indices: np.ndarray) -> List[Dict[str, Any]]:
+        distances = self.simulator.distances
+        return [{'distance': float(distances[i])} for i in indices]
+
+    def reset(self) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Reset every agent.
+
+        Returns:
+            Stacked initial observations
+        """
+        self.simulator.reset(np.arange(self.num_envs))
+        self.current_steps[:] = 0
+        self._write_obs()
+        self.reset_infos = self._infos(np.arange(self.num_envs))
+        return self._obs.batch(copy=self.copy_obs)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        """
+        Store the actions for the next step_wait.
+
+        Args:
+            actions: Batch of actions, one per agent
+        """
+        self._actions = actions if isinstance(actions, dict) else np.asarray(actions)
+
+    def step_wait(self):
+        """
+        Advance every agent by one simulator step.
+
+        Returns:
+            observations, rewards, dones, infos
+        """
+        actions, rotations, _, _ = self.action_encoder.arrays(self._actions)
+        indices = np.arange(self.num_envs)
+        rewards, terminated = self.simulator.step(actions.reshape(self.num_envs, 3), indices, rotations)
+        self.current_steps += 1
+        truncated = self.current_steps >= self.max_episode_steps
+        dones = terminated | truncated
+        self._write_obs()
+        infos = self._infos(indices)
+
+        done_indices = np.flatnonzero(dones)
+        if done_indices.size:
+            for i in done_indices:
+                infos[i]['terminal_observation'] = self._obs.observation(i)
+                infos[i]['TimeLimit.truncated'] = bool(truncated[i] and not terminated[i])
+            self.simulator.reset(done_indices)
+            self.current_steps[done_indices] = 0
+            self._write_obs()
+
+        return self._obs.batch(copy=self.copy_obs), rewards.astype(np.float32), dones, infos
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        """Return an attribute of the vector environment once per selected agent."""
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        """Set an attribute on the vector environment, which is shared by all agents."""
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List[Any]:
+        """Call a method of the vector environment once per selected agent."""
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        """Agents are never wrapped individually."""
+        return [False for _ in self._get_indices(indices)]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run the simulator as a local WebSocket server."""
+    parser = argparse.ArgumentParser(description="Headless R3F simulator server")
+    parser.add_argument("--host", type=str, default="localhost", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--unix", type=str, default=None, help="Unix domain socket to listen on instead of the port")
+    parser.add_argument("--dt", type=float, default=0.1, help="Integration time step in seconds")
+    parser.add_argument("--speed", type=float, default=5.0, help="Movement speed for a unit action")
+    parser.add_argument("--target", type=float, nargs=3, default=[10.0, 0.0, 10.0],
+                        help="Target position (x, y, z)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every reply is delayed by")
+    parser.add_argument("--broadcast", action="store_true", help="Broadcast states to viewer connections")
+    parser.add_argument("--payload-size", type=int, default=0, help="Extra sensor values in every state")
+    args = parser.parse_args(argv)
+
+    simulator = KinematicSimulator(num_agents=0, dt=args.dt, speed=args.speed, target_position=args.target)
+    server = SimulatorServer(
+        args.host,
+        args.port,
+        SimulatorBackend(simulator, payload_size=args.payload_size),
+        path=args.unix,
+        latency=args.latency,
+        broadcast=args.broadcast
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+import pickle
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+from typing import Dict, Any, Optional, List, Sequence, Callable, Tuple
+import logging
+
+from .vec_env import VecEnv
+
+try:
+    import cloudpickle
+except ImportError:
+    cloudpickle = pickle
+
+logger = logging.getLogger("r3f_agents")
+
+# Single-byte commands sent from the parent to the workers
+CMD_STEP = b"S"
+CMD_RESET = b"R"
+CMD_CLOSE = b"C"
+CMD_GET_ATTR = b"G"
+CMD_SET_ATTR = b"A"
+CMD_ENV_METHOD = b"M"
+CMD_IS_WRAPPED = b"W"
+
+# Empty reply: the shared arrays hold everything the parent needs
+REPLY_EMPTY = b""
+
+
+class SharedArrays:
+    """
+    NumPy arrays living in one ``multiprocessing.shared_memory`` block.
+
+    The parent creates the block from a list of ``(name, shape, dtype)``
+    specs; workers attach to it by name with the same specs and see the same
+    memory, so step results never travel through a pipe.
+    """
+
+    def __init__(self, specs: Sequence[Tuple[str, Tuple[int, ...], str]], name: Optional[str] = None):
+        """
+        Create or attach to the shared block.
+
+        Args:
+            specs: ``(name, shape, dtype)`` of every array, in layout order
+            name: Name of an existing block to attach to. A new block is
+                created when None
+        """
+        self.specs = list(specs)
+        layout = []
+        size = 0
+        for array_name, shape, dtype in self.specs:
+            dtype = np.dtype(dtype)
+            size = -(-size // dtype.alignment) * dtype.alignment
+            layout.append((array_name, shape, dtype, size))
+            size += int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=max(size, 1))
+        self.arrays: Dict[str, np.ndarray] = {
+            array_name: np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            for array_name, shape, dtype, offset in layout
+        }
+
+    @property
+    def name(self) -> str:
+        """Name workers use to attach to the block."""
+        return self.shm.name
+
+    def __getitem__(self, array_name: str) -> np.ndarray:
+        return self.arrays[array_name]
+
+    def close(self) -> None:
+        """Detach from the block, and free it if this side created it."""
+        self.arrays.clear()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# Subspaces stored as shared arrays, each with a fixed shape and dtype
+SHARED_SPACES = (spaces.Box, spaces.Discrete, spaces.MultiDiscrete, spaces.MultiBinary)
+
+
+def _subspaces(space: spaces.Space, kind: str) -> Dict[Optional[str], spaces.Space]:
+    """
+    Parts of a space stored as separate shared arrays: the keys of a Dict
+    space, or the space itself under None.
+
+    Raises:
+        ValueError: If a part has no fixed shape and dtype, e.g. a nested
+            Dict or a Tuple space
+    """
+    subspaces = space.spaces if isinstance(space, spaces.Dict) else {None: space}
+    for key, subspace in subspaces.items():
+        if not isinstance(subspace, SHARED_SPACES):
+            where = "" if key is None else f" for key '{key}'"
+            raise ValueError(f"Unsupported {kind} space{where}: {subspace}")
+    return subspaces
+
+
+def _array_name(prefix: str, key: Optional[str]) -> str:
+    return prefix if key is None else f"{prefix}/{key}"
+
+
+def _shared_specs(num_envs: int, observation_space: spaces.Space, action_space: spaces.Space) -> List[Tuple[str, Tuple[int, ...], str]]:
+    """
+    Layout of the arrays shared between the parent and the workers.
+
+    Every observation and action key gets its own array, shaped and typed
+    like its subspace.
+
+    Raises:
+        ValueError: If a space cannot be laid out, see ``_subspaces``
+    """
+    specs = []
+    for prefix, space, kind in (('obs', observation_space, 'observation'),
+                                ('terminal_obs', observation_space, 'observation'),
+                                ('actions', action_space, 'action')):
+        for key, subspace in _subspaces(space, kind).items():
+            specs.append((_array_name(prefix, key), (num_envs,) + tuple(subspace.shape), np.dtype(subspace.dtype).str))
+    return specs + [
+        ('rewards', (num_envs,), 'float32'),
+        ('dones', (num_envs,), 'bool'),
+        ('truncated', (num_envs,), 'bool'),
+    ]
+
+
+class SharedSpace:
+    """
+    Values of one space for every environment, read and written through the
+    shared arrays of its keys.
+    """
+
+    def __init__(self, space: spaces.Space, shared: SharedArrays, prefix: str):
+        """
+        Attach to the arrays of a space.
+
+        Args:
+            space: Per-environment space
+            shared: Shared block laid out by ``_shared_specs``
+            prefix: Name of the space's arrays in the block
+        """
+        self.is_dict = isinstance(space, spaces.Dict)
+        keys = space.spaces if self.is_dict else [None]
+        self.arrays: Dict[Optional[str], np.ndarray] = {key: shared[_array_name(prefix, key)] for key in keys}
+
+    def write(self, index: int, value: Any) -> None:
+        """Store the value of one environment."""
+        if self.is_dict:
+            for key, array in self.arrays.items():
+                array[index] = value[key]
+        else:
+            self.arrays[None][index] = value
+
+    def write_batch(self, values: Any) -> None:
+        """
+        Store the values of every environment.
+
+        Args:
+            values: ``(num_envs, ...)`` array, and for a Dict space a dict of
+                such arrays or a sequence of one dict per environment
+        """
+        if not self.is_dict:
+            array = self.arrays[None]
+            array[...] = np.asarray(values).reshape(array.shape)
+        elif isinstance(values, dict):
+            for key, array in self.arrays.items():
+                array[...] = np.asarray(values[key]).reshape(array.shape)
+        else:
+            for index, value in enumerate(values):
+                self.write(index, value)
+
+    def read(self, index: int) -> Any:
+        """Copy of the value of one environment."""
+        if self.is_dict:
+            return {key: array[index].copy() for key, array in self.arrays.items()}
+        return self.arrays[None][index].copy()
+
+    def batch(self) -> Any:
+        """Copies of the values of every environment, stacked as ``(num_envs, ...)``."""
+        if self.is_dict:
+            return {key: array.copy() for key, array in self.arrays.items()}
+        return self.arrays[None].copy()
+
+
+def _worker(conn: Connection, env_fns_bytes: bytes, indices: List[int]) -> None:
+    """
+    Worker process owning a slice of the environments.
+
+    Args:
+        conn: Pipe to the parent process
+        env_fns_bytes: Pickled environment factories for this worker
+        indices: Global indices of this worker's environments
+    """
+    envs: List[gym.Env] = [env_fn() for env_fn in cloudpickle.loads(env_fns_bytes)]
+    conn.send_bytes(pickle.dumps((envs[0].observation_space, envs[0].action_space)))
+    try:
+        num_envs, shm_name = pickle.loads(conn.recv_bytes())
+    except EOFError:
+        # The parent could not lay out the spaces and gave up
+        for env in envs:
+            env.close()
+        conn.close()
+        return
+
+    observation_space, action_space = envs[0].observation_space, envs[0].action_space
+    shared = SharedArrays(_shared_specs(num_envs, observation_space, action_space), name=shm_name)
+    obs = SharedSpace(observation_space, shared, 'obs')
+    terminal_obs = SharedSpace(observation_space, shared, 'terminal_obs')
+    actions = SharedSpace(action_space, shared, 'actions')
+    rewards = shared['rewards']
+    dones, truncated = shared['dones'], shared['truncated']
+
+    def pack_infos(infos: List[Dict[str, Any]]) -> bytes:
+        # Infos only cross the pipe when they actually carry something
+        return pickle.dumps(infos) if any(infos) else REPLY_EMPTY
+
+    try:
+        while True:
+            message = conn.recv_bytes()
+            command, payload = message[:1], message[1:]
+
+            if command == CMD_STEP:
+                infos = []
+                for env, i in zip(envs, indices):
+                    observation, reward, terminated, trunc, info = env.step(actions.read(i))
+                    done = terminated or trunc
+                    if done:
+                        terminal_obs.write(i, observation)
+                        observation, _ = env.reset()
+                    obs.write(i, observation)
+                    rewards[i] = reward
+                    dones[i] = done
+                    truncated[i] = trunc and not terminated
+                    infos.append(info)
+                conn.send_bytes(pack_infos(infos))
+
+            elif command == CMD_RESET:
+                seeds, options = pickle.loads(payload)
+                infos = []
+                for env, i in zip(envs, indices):
+                    observation, info = env.reset(seed=seeds[i], options=options[i] or None)
+                    obs.write(i, observation)
+                    infos.append(info)
+                conn.send_bytes(pack_infos(infos))
+
+            elif command == CMD_GET_ATTR:
+                attr_name, targets = pickle.loads(payload)
+                conn.send_bytes(pickle.dumps([
+                    getattr(env, attr_name) for env, i in zip(envs, indices) if i in targets
+                ]))
+
+            elif command == CMD_SET_ATTR:
+                attr_name, value, targets = pickle.loads(payload)
+                for env, i in zip(envs, indices):
+                    if i in targets:
+                        setattr(env, attr_name, value)
+                conn.send_bytes(REPLY_EMPTY)
+
+            elif command == CMD_ENV_METHOD:
+                method_name, args, kwargs, targets = cloudpickle.loads(payload)
+                conn.send_bytes(pickle.dumps([
+                    getattr(env, method_name)(*args, **kwargs) for env, i in zip(envs, indices) if i in targets
+                ]))
+
+            elif command == CMD_IS_WRAPPED:
+                wrapper_class, targets = cloudpickle.loads(payload)
+                conn.send_bytes(pickle.dumps([
+                    _is_wrapped(env, wrapper_class) for env, i in zip(envs, indices) if i in targets
+                ]))
+
+            elif command == CMD_CLOSE:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for env in envs:
+            env.close()
+        shared.close()
+        conn.close()
+
+
+def _is_wrapped(env: gym.Env, wrapper_class: type) -> bool:
+    """Whether an environment is wrapped with the given wrapper class."""
+    while isinstance(env, gym.Wrapper):
+        if isinstance(env, wrapper_class):
+            return True
+        env = env.env
+    return False
+
+
+class R3FSubprocVecEnv(VecEnv):
+    """
+    Vectorized environment running R3F environments in worker processes.
+
+    Each worker owns one or more environments (and therefore their WebSocket
+    connections and JSON parsing), which spreads the per-step work across
+    cores. Observations, actions, rewards and dones are exchanged through
+    ``multiprocessing.shared_memory`` arrays laid out from the observation
+    and action spaces, one array per key with the key's own shape and dtype;
+    the pipes only carry one-byte commands, plus pickled ``info``
+    dictionaries on the steps where they are not empty.
+
+    Example:
+        ```python
+        from r3f_agents import R3FEnv, R3FSubprocVecEnv
+
+        env = R3FSubprocVecEnv([
+            lambda i=i: R3FEnv(websocket_url=f"ws://localhost:{8765 + i}", agent_id="main")
+            for i in range(4)
+        ])
+        ```
+    """
+
+    def __init__(self,
+                 env_fns: Sequence[Callable[[], gym.Env]],
+                 envs_per_worker: int = 1,
+                 start_method: Optional[str] = None):
+        """
+        Start the workers and allocate the shared arrays.
+
+        Args:
+            env_fns: Factories creating the environments, one per sub-environment
+            envs_per_worker: Number of environments each worker process owns
+            start_method: Multiprocessing start method. Defaults to
+                ``forkserver`` where available, else ``spawn``, since the
+                environments run background threads that do not survive fork
+
+        Raises:
+            ValueError: If a space has a part without a fixed shape and dtype,
+                such as a nested Dict or a Tuple
+        """
+        if envs_per_worker < 1:
+            raise ValueError("envs_per_worker must be at least 1")
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self.logger = logger
+        self.closed = False
+        self.waiting = False
+
+        num_envs = len(env_fns)
+        self._worker_indices = [
+            list(range(start, min(start + envs_per_worker, num_envs)))
+            for start in range(0, num_envs, envs_per_worker)
+        ]
+        self._pipes: List[Connection] = []
+        self._processes = []
+        for indices in self._worker_indices:
+            parent_conn, worker_conn = ctx.Pipe()
+            env_fns_bytes = cloudpickle.dumps([env_fns[i] for i in indices])
+            process = ctx.Process(target=_worker, args=(worker_conn, env_fns_bytes, indices), daemon=True)
+            process.start()
+            worker_conn.close()
+            self._pipes.append(parent_conn)
+            self._processes.append(process)
+
+        observation_space, action_space = pickle.loads(self._pipes[0].recv_bytes())
+        for pipe in self._pipes[1:]:
+            pipe.recv_bytes()
+
+        super().__init__(num_envs, observation_space, action_space)
+
+        try:
+            specs = _shared_specs(num_envs, observation_space, action_space)
+        except ValueError:
+            for pipe in self._pipes:
+                pipe.close()
+            for process in self._processes:
+                process.join()
+            raise
+        self._shared = SharedArrays(specs)
+        self._obs = SharedSpace(observation_space, self._shared, 'obs')
+        self._terminal_obs = SharedSpace(observation_space, self._shared, 'terminal_obs')
+        self._actions = SharedSpace(action_space, self._shared, 'actions')
+        handshake = pickle.dumps((num_envs, self._shared.name))
+        for pipe in self._pipes:
+            pipe.send_bytes(handshake)
+
+        self.logger.info(f"R3F subprocess vector environment started: {num_envs} envs in {len(self._pipes)} workers")
+
+    def _gather_infos(self) -> List[Dict[str, Any]]:
+        """Collect one reply per worker and expand them into per-env infos."""
+        infos: List[Dict[str, Any]] = [{} for _ in range(self.num_envs)]
+        for pipe, indices in zip(self._pipes, self._worker_indices):
+            reply = pipe.recv_bytes()
+            if reply:
+                for i, info in zip(indices, pickle.loads(reply)):
+                    infos[i] = info
+        return infos
+
+    def reset(self):
+        """
+        Reset every environment.
+
+        Returns:
+            Stacked initial observations
+        """
+        message = CMD_RESET + pickle.dumps((self._seeds, self._options))
+        for pipe in self._pipes:
+            pipe.send_bytes(message)
+        self.reset_infos = self._gather_infos()
+        self._seeds = [None for _ in range(self.num_envs)]
+        self._options = [{} for _ in range(self.num_envs)]
+        return self._obs.batch()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        """
+        Publish the actions and signal the workers.
+
+        Args:
+            actions: Batch of actions, one per environment
+        """
+        self._actions.write_batch(actions)
+        for pipe in self._pipes:
+            pipe.send_bytes(CMD_STEP)
+        self.waiting = True
+
+    def step_wait(self):
+        """
+        Wait for every worker to finish the step.
+
+        Returns:
+            observations, rewards, dones, infos
+        """
+        infos = self._gather_infos()
+        self.waiting = False
+
+        dones = self._shared['dones'].copy()
+        truncated = self._shared['truncated']
+        for i in np.flatnonzero(dones):
+            infos[i]['terminal_observation'] = self._terminal_obs.read(i)
+            infos[i]['TimeLimit.truncated'] = bool(truncated[i])
+        return self._obs.batch(), self._shared['rewards'].copy(), dones, infos
+
+    def close(self) -> None:
+        """Stop the workers and free the shared memory."""
+        if self.closed:
+            return
+        if self.waiting:
+            for pipe in self._pipes:
+                pipe.recv_bytes()
+        for pipe in self._pipes:
+            pipe.send_bytes(CMD_CLOSE)
+        for process in self._processes:
+            process.join()
+        for pipe in self._pipes:
+            pipe.close()
+        self._shared.close()
+        self.closed = True
+
+    def _call(self, command: bytes, payload: Any, indices) -> List[Any]:
+        """Send a pickled request to the workers owning the selected envs."""
+        targets = set(self._get_indices(indices))
+        results = []
+        for pipe, worker_indices in zip(self._pipes, self._worker_indices):
+            if targets.intersection(worker_indices):
+                pipe.send_bytes(command + cloudpickle.dumps(payload + (targets,)))
+                reply = pipe.recv_bytes()
+                if reply:
+                    results.extend(pickle.loads(reply))
+        return results
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        """Return an attribute from each selected environment."""
+        return self._call(CMD_GET_ATTR, (attr_name,), indices)
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        """Set an attribute on each selected environment."""
+        self._call(CMD_SET_ATTR, (attr_name, value), indices)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List[Any]:
+        """Call a method on each selected environment."""
+        return self._call(CMD_ENV_METHOD, (method_name, method_args, method_kwargs), indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        """Check whether each selected environment is wrapped with a wrapper class."""
+        return self._call(CMD_IS_WRAPPED, (wrapper_class,), indices)
@@ -0,0 +1,200 @@
+"""
+Transports carrying R3F protocol messages, selected by URL scheme.
+
+- ``ws://host:port`` and ``wss://host:port``: WebSocket over TCP
+- ``unix:///path/to/socket``: WebSocket over a Unix domain socket, for a
+  relay server on the same host
+- ``inproc://name``: direct calls into a Python backend registered with
+  ``register_backend``, without any serialization
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Any, Optional, List, Union
+import websockets
+import logging
+
+logger = logging.getLogger("r3f_agents")
+
+Frame = Union[str, bytes, Dict[str, Any]]
+
+_backends: Dict[str, Any] = {}
+
+
+def register_backend(name: str, backend: Any) -> None:
+    """
+    Make a Python backend reachable at ``inproc://<name>``.
+
+    Args:
+        name: Name the backend is registered under
+        backend: Object with a ``handle(message) -> List[message]`` method,
+            such as ``r3f_agents.sim.SimulatorBackend``
+    """
+    _backends[name] = backend
+
+
+def unregister_backend(name: str) -> None:
+    """
+    Remove a backend registered with ``register_backend``.
+
+    Args:
+        name: Name the backend is registered under
+    """
+    _backends.pop(name, None)
+
+
+class Transport(ABC):
+    """
+    Bidirectional message channel underneath an R3FConnection.
+
+    Transports that set ``serializes`` to False exchange message dictionaries
+    as they are; the others exchange JSON text or binary frames.
+    """
+
+    serializes = True
+
+    def __init__(self, url: str):
+        self.url = url
+
+    @abstractmethod
+    async def connect(self) -> None:
+        """Open the channel."""
+
+    @abstractmethod
+    async def send(self, frame: Frame) -> None:
+        """
+        Send one frame.
+
+        Args:
+            frame: JSON text, a binary frame, or a message dictionary for
+                transports that do not serialize
+        """
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Close the channel."""
+
+    def __aiter__(self) -> AsyncIterator[Frame]:
+        return self._frames()
+
+    @abstractmethod
+    def _frames(self) -> AsyncIterator[Frame]:
+        """
+        Yield incoming frames until the channel closes.
+
+        Raises:
+            ConnectionError: If the channel is closed abnormally
+        """
+
+
+class WebSocketTransport(Transport):
+    """WebSocket transport over TCP."""
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        self.websocket = None
+
+    async def _open(self):
+        return await websockets.connect(self.url)
+
+    async def connect(self) -> None:
+        self.websocket = await self._open()
+
+    async def send(self, frame: Frame) -> None:
+        try:
+            await self.websocket.send(frame)
+        except websockets.ConnectionClosed as e:
+            raise ConnectionError(str(e))
+
+    async def close(self) -> None:
+        if self.websocket is not None:
+            await self.websocket.close()
+            self.websocket = None
+
+    async def _frames(self) -> AsyncIterator[Frame]:
+        try:
+            async for frame in self.websocket:
+                yield frame
+        except websockets.ConnectionClosed as e:
+            raise ConnectionError(str(e))
+
+
+class UnixSocketTransport(WebSocketTransport):
+    """WebSocket transport over a Unix domain socket."""
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        self.path = url[len("unix://"):]
+
+    async def _open(self):
+        return await websockets.unix_connect(self.path, uri="ws://localhost/")
+
+
+class InProcessTransport(Transport):
+    """
+    Transport calling a registered Python backend directly.
+
+    Messages are handed to the backend's ``handle`` method as dictionaries and
+    its replies are delivered the same way, so nothing is encoded or copied.
+    """
+
+    serializes = False
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        self.name = url[len("inproc://"):]
+        self.backend = None
+        self._inbox: Optional[asyncio.Queue] = None
+
+    async def connect(self) -> None:
+        backend = _backends.get(self.name)
+        if backend is None:
+            raise ConnectionError(f"No in-process backend registered as '{self.name}'")
+        self.backend = backend
+        self._inbox = asyncio.Queue()
+
+    async def send(self, frame: Frame) -> None:
+        if self.backend is None:
+            raise ConnectionError("In-process transport is closed")
+        replies: List[Dict[str, Any]] = self.backend.handle(frame)
+        for reply in replies:
+            self._inbox.put_nowait(reply)
+
+    async def close(self) -> None:
+        self.backend = None
+        if self._inbox is not None:
+            self._inbox.put_nowait(None)
+
+    async def _frames(self) -> AsyncIterator[Frame]:
+        while True:
+            message = await self._inbox.get()
+            if message is None:
+                return
+            yield message
+
+
+TRANSPORTS = {
+    "ws": WebSocketTransport,
+    "wss": WebSocketTransport,
+    "unix": UnixSocketTransport,
+    "inproc": InProcessTransport,
+}
+
+
+def create_transport(url: str) -> Transport:
+    """
+    Create the transport for a URL.
+
+    Args:
+        url: ``ws://``, ``wss://``, ``unix://`` or ``inproc://`` URL
+
+    Returns:
+        An unconnected transport
+
+    Raises:
+        ValueError: If the URL scheme is not supported
+    """
+    scheme = url.split("://", 1)[0].lower() if "://" in url else ""
+    transport_class = TRANSPORTS.get(scheme)
+    if transport_class is None:
+        raise ValueError(f"Unsupported URL scheme in '{url}', expected one of {sorted(TRANSPORTS)}")
+    return transport_class(url)
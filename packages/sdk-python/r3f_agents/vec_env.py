@@ -0,0 +1,681 @@
+import time
+import asyncio
+import numpy as np
+from gymnasium import spaces
+from collections import deque
+from typing import Dict, Any, Optional, List, Sequence, Union, Iterable, Deque, Tuple
+import logging
+
+from .camera import CAMERA_KEY, FrameRing, camera_config, split_camera_space
+from .connection import R3FConnection
+from .actions import ActionEncoder, ActionMapping
+from .environment import default_action_space, default_observation_space
+from .loop import BackgroundLoop, get_background_loop
+from .metrics import Metrics
+from .observation import ObservationBuffer
+from .protocol import PROTOCOL_JSON
+from .rewards import TargetReward
+
+logger = logging.getLogger("r3f_agents")
+
+try:
+    from stable_baselines3.common.vec_env import VecEnv
+except ImportError:
+    class VecEnv:
+        """
+        Minimal stand-in for Stable Baselines3's VecEnv base class.
+
+        Used when stable-baselines3 is not installed so the vector environments
+        keep the same interface (``reset``, ``step_async``, ``step_wait``, ...).
+        """
+
+        def __init__(self, num_envs: int, observation_space: spaces.Space, action_space: spaces.Space):
+            self.num_envs = num_envs
+            self.observation_space = observation_space
+            self.action_space = action_space
+            self.reset_infos: List[Dict[str, Any]] = [{} for _ in range(num_envs)]
+            self._seeds: List[Optional[int]] = [None for _ in range(num_envs)]
+            self._options: List[Dict[str, Any]] = [{} for _ in range(num_envs)]
+
+        def step(self, actions: np.ndarray):
+            self.step_async(actions)
+            return self.step_wait()
+
+        def seed(self, seed: Optional[int] = None) -> List[Optional[int]]:
+            if seed is None:
+                seed = int(np.random.randint(0, np.iinfo(np.uint32).max, dtype=np.uint32))
+            self._seeds = [seed + idx for idx in range(self.num_envs)]
+            return self._seeds
+
+        def set_options(self, options: Union[None, Dict[str, Any], List[Dict[str, Any]]] = None) -> None:
+            if options is None:
+                options = {}
+            if isinstance(options, dict):
+                options = [options] * self.num_envs
+            self._options = [dict(option) for option in options]
+
+        def _get_indices(self, indices: Union[None, int, Iterable[int]]) -> Iterable[int]:
+            if indices is None:
+                return range(self.num_envs)
+            if isinstance(indices, int):
+                return [indices]
+            return indices
+
+
+class R3FVecEnv(VecEnv):
+    """
+    Vectorized environment driving several agents of one R3F scene.
+
+    All agents share a single WebSocket connection. Each step sends one batched
+    ``action`` frame carrying every agent's action and gathers the per-agent
+    ``state`` replies concurrently. Observations are returned stacked with a
+    leading ``(num_agents, ...)`` dimension, as Stable Baselines3 expects.
+
+    Example:
+        ```python
+        from stable_baselines3 import PPO
+        from r3f_agents import R3FVecEnv
+
+        env = R3FVecEnv(websocket_url="ws://localhost:8765", num_agents=8)
+        model = PPO("MultiInputPolicy", env)
+        model.learn(total_timesteps=100_000)
+        ```
+    """
+
+    def __init__(self,
+                 websocket_url: str = "ws://localhost:8765",
+                 agent_ids: Optional[Sequence[str]] = None,
+                 num_agents: Optional[int] = None,
+                 observation_space: Optional[spaces.Space] = None,
+                 action_space: Optional[spaces.Space] = None,
+                 max_episode_steps: int = 1000,
+                 loop: Optional[BackgroundLoop] = None,
+                 protocol: str = PROTOCOL_JSON,
+                 copy_obs: bool = True,
+                 max_inflight: int = 1,
+                 metrics_port: Optional[int] = None,
+                 on_disconnect: str = "truncate",
+                 delta: bool = False,
+                 camera: Optional[Dict[str, Any]] = None,
+                 reward: Optional[TargetReward] = None,
+                 action_mapping: Optional[ActionMapping] = None,
+                 timings: bool = False):
+        """
+        Initialize the vectorized R3F environment.
+
+        Args:
+            websocket_url: URL of the server: ``ws://host:port``,
+                ``unix:///path/to/socket`` or ``inproc://name``
+            agent_ids: Identifiers of the agents to drive, one per sub-environment
+            num_agents: Number of agents to drive when agent_ids is not given.
+                Agents are then named ``agent_0``, ``agent_1``, ...
+            observation_space: Per-agent observation space
+            action_space: Per-agent action space
+            max_episode_steps: Maximum number of steps per episode
+            loop: Background loop that owns the WebSocket. Defaults to the
+                process-wide loop shared by all environments
+            protocol: Wire protocol to request from the server, ``"json"`` or
+                ``"binary"``. Binary falls back to JSON if the server does not
+                support it
+            copy_obs: Return observation copies. When False, observations are
+                read-only views into the environment's buffer that are
+                overwritten by the next step
+            max_inflight: Number of action batches that may be sent with
+                ``step_async`` before their results are collected with
+                ``step_wait``
+            metrics_port: Serve ``metrics`` in the Prometheus text format on
+                this local port
+            on_disconnect: What to do with a step whose connection dropped
+                before its replies arrived, once reconnected: ``"truncate"``
+                ends every agent's episode, ``"replay"`` sends the actions
+                again to the agents whose state the server kept and truncates
+                the others
+            delta: Ask the server for delta-encoded states, which are merged
+                back into full states as they arrive
+            camera: Stream every agent's view from the scene with this
+                configuration, see ``R3FEnv``. The latest frames are stacked
+                into the ``camera`` observation
+            reward: Reward engine computing rewards and terminations from the
+                agents' positions instead of taking them from the server.
+                Agents are reset to its start positions. Requires
+                ``max_inflight=1``, as terminated agents are reset before the
+                step returns
+            action_mapping: How actions map to the channels of the action
+                message, see ``ActionEncoder``. The whole batch is encoded in
+                one pass
+            timings: Add the phase timings of each step to every agent's
+                ``info['timings']``. They are always recorded in ``metrics``.
+                Off by default, so that infos stay empty and cheap to pass
+                between processes
+        """
+        if on_disconnect not in ("truncate", "replay"):
+            raise ValueError(f"on_disconnect must be 'truncate' or 'replay', got {on_disconnect!r}")
+        if agent_ids is None:
+            if num_agents is None:
+                raise ValueError("Either agent_ids or num_agents must be given")
+            agent_ids = [f"agent_{i}" for i in range(num_agents)]
+        if len(set(agent_ids)) != len(agent_ids):
+            raise ValueError("agent_ids must be unique")
+        if reward is not None and reward.num_agents != len(agent_ids):
+            raise ValueError(f"reward is built for {reward.num_agents} agents, expected {len(agent_ids)}")
+        if reward is not None and max_inflight > 1:
+            raise ValueError("reward cannot be combined with max_inflight > 1")
+
+        super().__init__(
+            len(agent_ids),
+            observation_space or default_observation_space(),
+            action_space or default_action_space()
+        )
+
+        self.logger = logger
+
+        self.websocket_url = websocket_url
+        self.agent_ids = list(agent_ids)
+        self.metrics = Metrics()
+        self.connection = R3FConnection(websocket_url, protocol=protocol, metrics=self.metrics, delta=delta)
+        self.loop = loop
+        self.timeout = 5.0
+        self.max_episode_steps = max_episode_steps
+        self.current_steps = np.zeros(self.num_envs, dtype=np.int64)
+        self.action_encoder = ActionEncoder(self.action_space, action_mapping)
+
+        state_space = self.observation_space
+        self.camera = None
+        self._frames: List[FrameRing] = []
+        if camera is not None:
+            self.camera = camera_config(camera)
+            self.observation_space, state_space = split_camera_space(self.observation_space, self.camera)
+            self._frames = [self.connection.add_camera(agent_id, self.camera) for agent_id in self.agent_ids]
+            self._camera_batch = np.zeros((self.num_envs,) + self._frames[0].shape, dtype=np.uint8)
+
+        self.copy_obs = copy_obs
+        self._obs = ObservationBuffer(state_space, self.num_envs)
+        self._rewards = np.zeros(self.num_envs, dtype=np.float32)
+        self.reward = reward
+        self._positions = np.zeros((self.num_envs, 3), dtype=np.float32)
+        self._start_states: Optional[List[Dict[str, Any]]] = None
+        self._start_rng = np.random.default_rng()
+        self.max_inflight = max_inflight
+        self.timings = timings
+        self.on_disconnect = on_disconnect
+        self._inflight: Deque[Any] = deque()
+        self._send_lock: Optional[asyncio.Lock] = None
+
+        if metrics_port is not None:
+            self.metrics.serve(metrics_port)
+
+        self.logger.info(f"R3F vector environment initialized: {self.num_envs} agents, url={websocket_url}")
+
+    async def _connect(self) -> None:
+        """
+        Establish WebSocket connection.
+
+        Raises:
+            ConnectionError: If connection to the WebSocket server fails
+        """
+        for agent_id in self.agent_ids:
+            self.connection.register(agent_id)
+        await self.connection.connect()
+
+    async def _disconnect(self) -> None:
+        """Close WebSocket connection."""
+        await self.connection.close()
+
+    async def _request_batch(self, message_type: str, payloads: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Send one batched frame and gather the ``state`` reply of each agent.
+
+        Args:
+            message_type: Type shared by every message in the batch
+            payloads: Message data keyed by agent ID
+
+        Returns:
+            State data keyed by agent ID. Agents that did not answer before the
+            timeout are missing from the result and keep their previous state.
+
+        Raises:
+            ConnectionError: If the connection drops and cannot be re-established
+        """
+        await self._connect()
+        try:
+            seqs = await self.connection.send_batch_request(message_type, payloads)
+            return await self._wait_batch(seqs)
+        except ConnectionError as e:
+            self.logger.warning(f"Connection lost during {message_type}: {e}. Reconnecting")
+            await self._connect()
+        seqs = await self.connection.send_batch_request(message_type, payloads)
+        return await self._wait_batch(seqs)
+
+    async def _reset_agents(self, indices: Sequence[int]) -> None:
+        """
+        Reset a subset of agents with one batched ``reset`` frame, and one
+        batched ``restore`` frame for those starting from a saved state.
+
+        Args:
+            indices: Indices of the agents to reset
+        """
+        agent_ids = [self.agent_ids[i] for i in indices]
+        states = {}
+        for message_type, payloads in self._reset_payloads(indices).items():
+            states.update(await self._request_batch(message_type, payloads))
+        for i, agent_id in zip(indices, agent_ids):
+            self.current_steps[i] = 0
+            self.reset_infos[i] = self._update_state(i, states.get(agent_id, {}))
+            self.connection.lost_agents.discard(agent_id)
+        self._reset_reward(indices, self.reset_infos)
+
+    def _reset_data(self, index: int) -> Dict[str, Any]:
+        """Data of the ``reset`` message of an agent."""
+        if self.reward is not None:
+            return self.reward.reset_data(index, self._options[index])
+        return dict(self._options[index] or {})
+
+    def _reset_payloads(self, indices: Sequence[int]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Messages starting the next episode of some agents.
+
+        Agents given a ``state`` in their reset options, or drawn a start
+        state from the pool set with ``set_start_states``, are restored.
+        The others are reset.
+
+        Args:
+            indices: Indices of the agents to reset
+
+        Returns:
+            Message data keyed by message type, then by agent ID
+        """
+        payloads: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for i in indices:
+            state = (self._options[i] or {}).get('state')
+            if state is None and self._start_states:
+                state = self._start_states[self._start_rng.integers(len(self._start_states))]
+            if state is None:
+                payloads.setdefault('reset', {})[self.agent_ids[i]] = self._reset_data(i)
+            else:
+                payloads.setdefault('restore', {})[self.agent_ids[i]] = {'state': state}
+        return payloads
+
+    def _reset_reward(self, indices: Sequence[int], infos: List[Dict[str, Any]]) -> None:
+        """Start the reward engine's episodes of reset agents."""
+        if self.reward is None or not len(indices):
+            return
+        fields = self.reward.reset(self._positions, indices)
+        for i in indices:
+            infos[i].update(self.reward.info(fields, i))
+
+    async def _wait_batch(self, seqs: Dict[str, int]) -> Dict[str, Dict[str, Any]]:
+        """
+        Gather the ``state`` replies to a batch sent with ``send_batch_request``.
+
+        Args:
+            seqs: Sequence numbers keyed by agent ID
+
+        Returns:
+            State data keyed by agent ID, missing agents that timed out
+        """
+        replies = await self.connection.wait_replies(seqs, self.timeout)
+        if len(replies) < len(seqs):
+            missing = sorted(set(seqs) - set(replies))
+            self.metrics.increment('timeouts', len(missing))
+            self.metrics.increment('stale_observations', len(missing))
+            self.logger.warning(
+                f"Timeout waiting for {len(missing)} agent(s) after {self.timeout} seconds: {missing}"
+            )
+        return {agent_id: reply.get('data', {}) for agent_id, reply in replies.items()}
+
+    async def _send_step(self, payloads: Dict[str, Dict[str, Any]],
+                         reset_indices: Sequence[int]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """
+        Send an action frame followed by a reset frame for some agents.
+
+        Args:
+            payloads: Action data keyed by agent ID
+            reset_indices: Indices of the agents to reset after their action
+
+        Returns:
+            Sequence numbers of the actions and of the resets, keyed by agent ID
+        """
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        async with self._send_lock:
+            seqs = {}
+            if payloads:
+                seqs = await self.connection.send_batch_request('action', payloads)
+            reset_seqs = {}
+            for message_type, reset_payloads in self._reset_payloads(reset_indices).items():
+                reset_seqs.update(await self.connection.send_batch_request(message_type, reset_payloads))
+        return seqs, reset_seqs
+
+    def _count_steps(self) -> np.ndarray:
+        """
+        Count one more step for every agent and restart the counters of the
+        agents whose episode ends with it.
+
+        Only called on the loop thread, in the order the steps were sent.
+
+        Returns:
+            Mask of the agents whose episode ends with this step
+        """
+        self.current_steps += 1
+        dones = self.current_steps >= self.max_episode_steps
+        self.current_steps[dones] = 0
+        return dones
+
+    async def _step_all(self, actions: np.ndarray, dones: Optional[np.ndarray] = None, previous=None):
+        """
+        Send every agent's action in one frame and collect the results.
+
+        The action frame is followed right away by a reset frame for the
+        agents whose episode ends with this step, so actions pipelined behind
+        it reach those agents after their reset. Results are applied to the
+        observation buffer only once the previous pipelined step has finished.
+        Agents whose state reports ``done``, or whose episode the reward
+        engine ends, are reset once their results are in.
+
+        If the connection drops, it is re-established and the step is
+        replayed or truncated according to ``on_disconnect``. Truncated
+        agents are reset and flagged with ``info['connection_lost']``.
+
+        Args:
+            actions: Batch of actions, one per agent
+            dones: Agents whose episode ends with this step. Counted here,
+                before anything is awaited, when None
+            previous: Future of the step sent before this one, if still pending
+
+        Returns:
+            observations, rewards, dones, infos. With ``timings``, each info
+            holds the phase timings of the whole batch in ``timings``
+        """
+        start = time.perf_counter()
+        if dones is None:
+            dones = self._count_steps()
+        await self._connect()
+        done_indices = np.flatnonzero(dones).tolist()
+        payloads = dict(zip(self.agent_ids, self.action_encoder.encode_batch(actions)))
+        # Agents the server forgot during a reconnect between two steps
+        truncated = [i for i, agent_id in enumerate(self.agent_ids) if agent_id in self.connection.lost_agents]
+        reset_indices = sorted(set(done_indices) | set(truncated))
+        try:
+            seqs, reset_seqs = await self._send_step(payloads, reset_indices)
+            sent = time.perf_counter()
+            serialize, send = self.connection.last_serialize, self.connection.last_send
+            if previous is not None:
+                await asyncio.wait([asyncio.wrap_future(previous)])
+            states = await self._wait_batch(seqs)
+            reset_states = await self._wait_batch(reset_seqs)
+        except ConnectionError as e:
+            self.logger.warning(f"Connection lost during step: {e}. Reconnecting")
+            await self._connect()
+            if self.on_disconnect == "replay":
+                lost = self.connection.lost_agents
+                payloads = {agent_id: data for agent_id, data in payloads.items() if agent_id not in lost}
+            else:
+                payloads = {}
+            truncated = [i for i, agent_id in enumerate(self.agent_ids) if agent_id not in payloads]
+            reset_indices = sorted(set(done_indices) | set(truncated))
+            seqs, reset_seqs = await self._send_step(payloads, reset_indices)
+            sent = time.perf_counter()
+            serialize, send = self.connection.last_serialize, self.connection.last_send
+            states = await self._wait_batch(seqs)
+            reset_states = await self._wait_batch(reset_seqs)
+
+        received = time.perf_counter()
+        infos = [self._update_state(i, states.get(agent_id, {})) for i, agent_id in enumerate(self.agent_ids)]
+        # Episodes the scene ends itself, e.g. when an agent reaches its goal
+        ended = np.array([bool(states.get(agent_id, {}).get('done')) for agent_id in self.agent_ids])
+        if self.reward is not None:
+            rewards, reached, fields = self.reward.step(self._positions)
+            for i, info in enumerate(infos):
+                info.update(self.reward.info(fields, i))
+            ended |= reached
+        else:
+            rewards = self._rewards.copy()
+        dones = dones | ended
+        # Agents the scene does not reset with this step are reset now
+        terminated = [i for i in np.flatnonzero(ended).tolist() if i not in reset_indices]
+        if len(states) < len(seqs):
+            for i, agent_id in enumerate(self.agent_ids):
+                if agent_id in seqs and agent_id not in states:
+                    infos[i]['stale_observation'] = True
+
+        if truncated:
+            dones = dones.copy()
+            for i in truncated:
+                dones[i] = True
+                rewards[i] = 0.0
+                self.current_steps[i] = 0
+                infos[i]['connection_lost'] = True
+
+        if reset_indices:
+            for i in reset_indices:
+                infos[i]['terminal_observation'] = self._observation(i)
+                infos[i]['TimeLimit.truncated'] = not ended[i]
+            for i in reset_indices:
+                agent_id = self.agent_ids[i]
+                self.reset_infos[i] = self._update_state(i, reset_states.get(agent_id, {}))
+                self.connection.lost_agents.discard(agent_id)
+            self._reset_reward(reset_indices, self.reset_infos)
+        if terminated:
+            for i in terminated:
+                infos[i]['terminal_observation'] = self._observation(i)
+                infos[i]['TimeLimit.truncated'] = False
+                self.current_steps[i] = 0
+            await self._reset_agents(terminated)
+
+        obs = self._batch()
+        end = time.perf_counter()
+        self.metrics.record('wait', received - sent)
+        self.metrics.record('observation', end - received)
+        self.metrics.record('step', end - start)
+        if self.timings:
+            timings = {
+                'serialize': serialize,
+                'send': send,
+                'wait': received - sent,
+                'parse': self.connection.last_parse,
+                'observation': end - received,
+                'step': end - start,
+            }
+            for info in infos:
+                info['timings'] = timings
+        return obs, rewards, dones, infos
+
+    def _run(self, coro) -> Any:
+        """Run a coroutine on the background loop and wait for its result."""
+        if self.loop is None:
+            self.loop = get_background_loop()
+        return self.loop.run(coro)
+
+    def _update_state(self, index: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Write one agent's state update into the observation buffer.
+
+        Args:
+            index: Index of the agent
+            data: State data received from the server
+
+        Returns:
+            Fields outside the observation space, for the info dictionary
+        """
+        if 'reward' in data:
+            self._rewards[index] = data['reward']
+        if 'position' in data:
+            self._positions[index] = data['position']
+        return self._obs.write(index, data)
+
+    def _observation(self, index: int) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        """Copy of one agent's observation, including its latest camera frame."""
+        obs = self._obs.observation(index)
+        if self._frames:
+            obs[CAMERA_KEY] = self._frames[index].latest()
+        return obs
+
+    def _batch(self) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        """Stacked observations, including the latest camera frames."""
+        obs = self._obs.batch(copy=self.copy_obs)
+        if self._frames:
+            for i, frames in enumerate(self._frames):
+                np.copyto(self._camera_batch[i], frames.latest(copy=False))
+            if self.copy_obs:
+                obs[CAMERA_KEY] = self._camera_batch.copy()
+            else:
+                obs[CAMERA_KEY] = self._camera_batch.view()
+                obs[CAMERA_KEY].flags.writeable = False
+        return obs
+
+    def reset(self) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Reset every agent. Agents given a ``state`` in their reset options,
+        see ``set_options``, start from it.
+
+        Returns:
+            Stacked initial observations
+        """
+        self._drain_inflight()
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        self._run(self._reset_agents(list(range(self.num_envs))))
+        self._seeds = [None for _ in range(self.num_envs)]
+        self._options = [{} for _ in range(self.num_envs)]
+        return self._batch()
+
+    def get_states(self, indices: Union[None, int, Iterable[int]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Save the current state of some agents with one batched ``snapshot``
+        frame.
+
+        Args:
+            indices: Agents to save, or None for all of them
+
+        Returns:
+            One state per selected agent, None for agents the server did not
+            answer for in time or does not know
+        """
+        self._drain_inflight()
+        return self._run(self._save_states(list(self._get_indices(indices))))
+
+    def set_states(self, states: Sequence[Dict[str, Any]],
+                   indices: Union[None, int, Iterable[int]] = None) -> Union[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Put some agents back into saved states with one batched ``restore``
+        frame. Their episodes go on: step counts are kept.
+
+        Args:
+            states: One state per selected agent, as returned by
+                ``get_states``
+            indices: Agents to restore, or None for all of them
+
+        Returns:
+            Stacked observations of every agent
+        """
+        self._drain_inflight()
+        indices = list(self._get_indices(indices))
+        if len(states) != len(indices):
+            raise ValueError(f"Got {len(states)} states for {len(indices)} agents")
+        self._run(self._restore_states(states, indices))
+        return self._batch()
+
+    async def _save_states(self, indices: Sequence[int]) -> List[Optional[Dict[str, Any]]]:
+        """Send one batched ``snapshot`` frame, see ``get_states``."""
+        agent_ids = [self.agent_ids[i] for i in indices]
+        replies = await self._request_batch('snapshot', {agent_id: {} for agent_id in agent_ids})
+        return [replies.get(agent_id, {}).get('state') for agent_id in agent_ids]
+
+    async def _restore_states(self, states: Sequence[Dict[str, Any]], indices: Sequence[int]) -> List[int]:
+        """
+        Send one batched ``restore`` frame, see ``set_states``.
+
+        Returns:
+            Indices of the agents the server answered for, whose state was restored
+        """
+        replies = await self._request_batch('restore', {
+            self.agent_ids[i]: {'state': state} for i, state in zip(indices, states)
+        })
+        infos = [{} for _ in range(self.num_envs)]
+        for i in indices:
+            infos[i] = self._update_state(i, replies.get(self.agent_ids[i], {}))
+        self._reset_reward(indices, infos)
+        return [i for i in indices if self.agent_ids[i] in replies]
+
+    def set_start_states(self, states: Optional[Sequence[Dict[str, Any]]], seed: Optional[int] = None) -> None:
+        """
+        Start every following episode from a state drawn from a pool.
+
+        Episodes ending during ``step`` and those started by ``reset`` are
+        then restored, batched into one ``restore`` frame, instead of reset.
+        A ``state`` given in the reset options still wins.
+
+        Args:
+            states: Pool of states saved by ``get_states``, or None to reset
+                agents again
+            seed: Seed of the draws from the pool
+        """
+        self._start_states = list(states) if states else None
+        self._start_rng = np.random.default_rng(seed)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        """
+        Send the batched actions without waiting for the replies.
+
+        Up to ``max_inflight`` batches can be in flight at once; their results
+        are collected in order with ``step_wait``.
+
+        Args:
+            actions: Batch of actions, one per agent
+
+        Raises:
+            RuntimeError: If ``max_inflight`` batches are already in flight
+        """
+        if len(self._inflight) >= self.max_inflight:
+            raise RuntimeError(f"{len(self._inflight)} step(s) already in flight, call step_wait() first")
+        if self.loop is None:
+            self.loop = get_background_loop()
+        previous = self._inflight[-1] if self._inflight else None
+        if not isinstance(actions, dict):
+            actions = np.asarray(actions)
+        # Step counters are kept on the loop thread, see _count_steps
+        self._inflight.append(self.loop.submit(self._step_all(actions, previous=previous)))
+
+    def step_wait(self):
+        """
+        Wait for the replies to the oldest batch of actions in flight.
+
+        Returns:
+            observations, rewards, dones, infos
+        """
+        if not self._inflight:
+            raise RuntimeError("step_wait() called without a pending step_async()")
+        return self._inflight.popleft().result()
+
+    def _drain_inflight(self) -> None:
+        """Wait for and discard the results of every batch still in flight."""
+        while self._inflight:
+            try:
+                self._inflight.popleft().result()
+            except Exception as e:
+                self.logger.warning(f"Discarding failed in-flight step: {e}")
+
+    def close(self) -> None:
+        """Close the shared connection."""
+        self.logger.info("Closing R3F vector environment")
+        self.metrics.close()
+        if self.loop:
+            self._drain_inflight()
+            self.loop.run(self._disconnect())
+            self.loop = None
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        """Return an attribute of the vector environment once per selected agent."""
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        """Set an attribute on the vector environment, which is shared by all agents."""
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List[Any]:
+        """Call a method of the vector environment once per selected agent."""
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        """Agents are never wrapped individually."""
+        return [False for _ in self._get_indices(indices)]
@@ -27,6 +27,9 @@ setup(
         "gymnasium>=0.26.0",
     ],
     extras_require={
+        "server": [
+            "uvloop>=0.17.0; sys_platform != 'win32'",
+        ],
         "full": [
             "stable-baselines3>=2.0.0",
             "torch>=2.0.0",
@@ -39,6 +42,11 @@ setup(
             "mypy>=0.931",
         ],
     },
+    entry_points={
+        "console_scripts": [
+            "r3f-server=r3f_agents.server:main",
+        ],
+    },
     author="delartificial",
     author_email="",
     description="Python SDK for React Three Agents - RL in 3D environments",
@@ -0,0 +1,54 @@
+"""
+Shared fixtures: a background loop for the synchronous environments and
+headless simulator servers listening on free local ports.
+"""
+import itertools
+import pytest
+
+from r3f_agents import BackgroundLoop, SimulatorServer, register_backend, unregister_backend
+from r3f_agents.sim import SimulatorBackend
+
+_names = itertools.count()
+
+
+@pytest.fixture(scope="session")
+def loop():
+    """Background loop owning the connections and servers of the tests."""
+    return BackgroundLoop(name="r3f-agents-tests")
+
+
+@pytest.fixture
+def start_server(loop):
+    """Start simulator servers on free ports, stopped after the test."""
+    servers = []
+
+    def start(port: int = 0, **kwargs) -> SimulatorServer:
+        server = SimulatorServer(host="127.0.0.1", port=port, **kwargs)
+        loop.run(server.start())
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        loop.run(server.stop())
+
+
+@pytest.fixture
+def server(start_server):
+    """One simulator server."""
+    return start_server()
+
+
+@pytest.fixture
+def url(server):
+    """URL of the simulator server."""
+    return f"ws://127.0.0.1:{server.port}"
+
+
+@pytest.fixture
+def inproc_url():
+    """URL of a simulator backend registered for the in-process transport."""
+    name = f"tests-{next(_names)}"
+    register_backend(name, SimulatorBackend())
+    yield f"inproc://{name}"
+    unregister_backend(name)
@@ -0,0 +1,222 @@
+import asyncio
+import numpy as np
+import pytest
+
+from r3f_agents import R3FConnection, R3FEnv
+from r3f_agents.sim import SimulatorBackend
+
+
+def state(agent_id, seq=None, **data):
+    message = {'type': 'state', 'agentId': agent_id, 'data': data}
+    if seq is not None:
+        message['seq'] = seq
+    return message
+
+
+def run(scenario):
+    """Run a scenario against a connection that is never connected."""
+    async def main():
+        return await scenario(R3FConnection("ws://127.0.0.1:1", keepalive_interval=None))
+    return asyncio.run(main())
+
+
+def test_replies_are_matched_by_seq_whatever_their_order():
+    async def scenario(connection):
+        first = connection._track('a', 'action')
+        second = connection._track('a', 'action')
+        connection._dispatch(state('a', second, reward=2.0))
+        connection._dispatch(state('a', first, reward=1.0))
+        replies = [await connection.wait_reply('a', seq, 0.1) for seq in (first, second)]
+        return [reply['data']['reward'] for reply in replies]
+
+    assert run(scenario) == [1.0, 2.0]
+
+
+def test_batched_replies_are_matched_per_agent():
+    async def scenario(connection):
+        seqs = {agent_id: connection._track(agent_id, 'action') for agent_id in ('a', 'b')}
+        connection._dispatch(state('b', seqs['b'], reward=2.0))
+        connection._dispatch(state('a', seqs['a'], reward=1.0))
+        replies = await connection.wait_replies(seqs, 0.1)
+        return {agent_id: reply['data']['reward'] for agent_id, reply in replies.items()}
+
+    assert run(scenario) == {'a': 1.0, 'b': 2.0}
+
+
+def test_states_without_seq_answer_requests_in_order():
+    async def scenario(connection):
+        first = connection._track('a', 'action')
+        second = connection._track('a', 'action')
+        connection._dispatch(state('a', reward=1.0))
+        connection._dispatch(state('a', reward=2.0))
+        return [(await connection.wait_reply('a', seq, 0.1))['data']['reward'] for seq in (first, second)]
+
+    assert run(scenario) == [1.0, 2.0]
+
+
+def test_states_without_seq_skip_requests_whose_replies_echo_it():
+    async def scenario(connection):
+        # The server echoes the seq of resets, the scene reports actions without it
+        connection._dispatch(state('a', connection._track('a', 'reset')))
+        reset = connection._track('a', 'reset')
+        action = connection._track('a', 'action')
+        connection._dispatch(state('a', reward=1.0))
+        reply = await connection.wait_reply('a', action, 0.1)
+        return reply['data'], connection._pending[('a', reset)].done()
+
+    data, reset_done = run(scenario)
+    assert data == {'reward': 1.0}
+    assert not reset_done
+
+
+def test_late_replies_are_counted_and_dropped():
+    async def scenario(connection):
+        seq = connection._track('a', 'action')
+        assert await connection.wait_reply('a', seq, 0.0) is None
+        connection._dispatch(state('a', seq))
+        return connection.stale_replies, connection.drain('a')
+
+    assert run(scenario) == (1, [])
+
+
+def test_unsolicited_states_are_queued():
+    async def scenario(connection):
+        connection.register('a')
+        connection._dispatch(state('a', reward=3.0))
+        connection._dispatch(state('unknown'))
+        return connection.drain('a'), connection.dropped_messages
+
+    messages, dropped = run(scenario)
+    assert [message['data'] for message in messages] == [{'reward': 3.0}]
+    assert dropped == 1
+
+
+def test_dropped_connection_fails_requests_not_awaited_yet():
+    async def scenario(connection):
+        seq = connection._track('a', 'action')
+        connection._fail_pending(ConnectionError("lost"))
+        await connection.wait_reply('a', seq, 0.1)
+
+    with pytest.raises(ConnectionError):
+        run(scenario)
+
+
+def test_deltas_merge_into_the_baseline_and_gaps_resync():
+    async def scenario(connection):
+        seqs = [connection._track('a', 'action') for _ in range(3)]
+        connection._dispatch({**state('a', seqs[0], position=[0, 0, 0], reward=0.0), 'version': 1})
+        connection._dispatch({**state('a', seqs[1], reward=1.0), 'version': 2, 'delta': True})
+        # Version 3 was lost: the delta cannot be applied
+        connection._dispatch({**state('a', seqs[2], reward=3.0), 'version': 4, 'delta': True})
+        missed = connection._pending[('a', seqs[2])].done()
+        resync = set(connection._resync_agents)
+        connection._dispatch({**state('a', position=[1, 0, 0], reward=3.0), 'version': 5})
+        replies = [await connection.wait_reply('a', seq, 0.1) for seq in seqs]
+        return [reply['data'] for reply in replies], missed, resync, connection.metrics.counters['resyncs']
+
+    replies, missed, resync, resyncs = run(scenario)
+    assert replies[0] == {'position': [0, 0, 0], 'reward': 0.0}
+    assert replies[1] == {'position': [0, 0, 0], 'reward': 1.0}
+    assert replies[2] == {'position': [1, 0, 0], 'reward': 3.0}
+    assert not missed
+    assert resync == {'a'}
+    assert resyncs == 1
+
+
+def test_info_replies_only_answer_the_request_with_their_seq():
+    async def scenario(connection):
+        future = asyncio.get_running_loop().create_future()
+        connection._handshake = ('protocol', 5, future)
+        connection._dispatch({'type': 'info', 'agentId': '*', 'seq': 4, 'data': {'protocol': 'json'}})
+        answered_early = future.done()
+        connection._dispatch({'type': 'info', 'agentId': '*', 'seq': 5, 'data': {'protocol': 'binary'}})
+        return answered_early, await future
+
+    answered_early, data = run(scenario)
+    assert not answered_early
+    assert data == {'protocol': 'binary'}
+
+
+def step_counters(env, steps):
+    """Frames and binary frames received over some steps."""
+    before = dict(env.connection.metrics.counters)
+    for _ in range(steps):
+        env.step(np.ones(3, dtype=np.float32))
+    counters = env.connection.metrics.counters
+    return (counters['frames_received'] - before['frames_received'],
+            counters['binary_frames_received'] - before['binary_frames_received'])
+
+
+def test_binary_protocol_is_used_end_to_end(url, loop):
+    env = R3FEnv(url, agent_id="binary", protocol="binary", loop=loop)
+    try:
+        env.reset()
+        assert env.connection.protocol == "binary"
+        assert step_counters(env, 5) == (5, 5)
+        obs, _, _, _, _ = env.step(np.ones(3, dtype=np.float32))
+        assert obs['position'][0] > 0
+    finally:
+        env.close()
+
+
+def test_binary_protocol_falls_back_to_json_for_extra_fields(start_server, loop):
+    server = start_server(backend=SimulatorBackend(payload_size=4))
+    env = R3FEnv(f"ws://127.0.0.1:{server.port}", agent_id="fallback", protocol="binary", loop=loop)
+    try:
+        env.reset()
+        assert env.connection.protocol == "binary"
+        assert step_counters(env, 5) == (5, 0)
+    finally:
+        env.close()
+
+
+def test_delta_states_rebuild_full_observations(url, loop):
+    envs = [R3FEnv(url, agent_id=f"delta_{delta}", delta=delta, loop=loop) for delta in (False, True)]
+    try:
+        for env in envs:
+            env.reset()
+        assert envs[1].connection.delta
+        for _ in range(5):
+            full, delta = (env.step(np.array([1.0, 0.0, 0.5], dtype=np.float32))[0] for env in envs)
+            np.testing.assert_allclose(full['position'], delta['position'])
+            np.testing.assert_allclose(full['rotation'], delta['rotation'])
+    finally:
+        for env in envs:
+            env.close()
+
+
+def test_reconnect_resumes_agents_the_server_kept(start_server, server, url, loop):
+    env = R3FEnv(url, agent_id="resumed", loop=loop)
+    try:
+        env.reset()
+        obs, _, _, _, _ = env.step(np.ones(3, dtype=np.float32))
+        loop.run(server.stop())
+        start_server(port=server.port, backend=server.backend)
+
+        next_obs, _, _, truncated, info = env.step(np.ones(3, dtype=np.float32))
+        assert not truncated
+        assert 'connection_lost' not in info
+        assert next_obs['position'][0] > obs['position'][0]
+        assert env.connection.metrics.counters['reconnects'] == 1
+    finally:
+        env.close()
+
+
+def test_reconnect_truncates_agents_the_server_lost(start_server, server, url, loop):
+    env = R3FEnv(url, agent_id="lost", loop=loop)
+    try:
+        env.reset()
+        env.step(np.ones(3, dtype=np.float32))
+        loop.run(server.stop())
+        start_server(port=server.port)
+
+        _, reward, _, truncated, info = env.step(np.ones(3, dtype=np.float32))
+        assert truncated
+        assert info['connection_lost']
+        assert reward == 0.0
+
+        env.reset()
+        _, _, _, truncated, _ = env.step(np.ones(3, dtype=np.float32))
+        assert not truncated
+    finally:
+        env.close()
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from r3f_agents.protocol import (NO_SEQ, DeltaEncoder, ProtocolError, decode_frame, encode_camera_frame,
+                                 encode_record)
+
+AGENTS = ['a', 'b']
+
+
+def test_state_round_trip():
+    data = {'position': [1.0, 2.0, 3.0], 'rotation': [0.0, 0.5, 0.0], 'reward': 1.5, 'done': True}
+    [message] = decode_frame(encode_record('state', 1, data, seq=7), AGENTS)
+
+    assert message['type'] == 'state'
+    assert message['agentId'] == 'b'
+    assert message['seq'] == 7
+    np.testing.assert_array_equal(message['data']['position'], [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(message['data']['rotation'], [0.0, 0.5, 0.0])
+    assert message['data']['reward'] == 1.5
+    assert message['data']['done'] is True
+
+
+def test_state_values_are_views_into_the_frame():
+    frame = encode_record('state', 0, {'position': [1.0, 2.0, 3.0]})
+    [message] = decode_frame(frame, AGENTS)
+
+    position = message['data']['position']
+    assert position.dtype == np.float32
+    assert not position.flags.writeable
+    assert 'seq' not in message
+
+
+def test_action_round_trip_with_repeat():
+    frame = encode_record('action', 0, {'rotation': [0.0, 1.0, 0.0], 'repeat': 4}, seq=3)
+    [message] = decode_frame(frame, AGENTS)
+
+    assert message['type'] == 'action'
+    assert set(message['data']) == {'rotation', 'repeat'}
+    np.testing.assert_array_equal(message['data']['rotation'], [0.0, 1.0, 0.0])
+    assert message['data']['repeat'] == 4
+
+
+def test_records_are_concatenated_into_one_frame():
+    frame = (encode_record('reset', 0, {}, seq=1)
+             + encode_record('action', 1, {'position': [1.0, 0.0, 0.0]}, seq=2))
+    messages = decode_frame(frame, AGENTS)
+
+    assert [(m['type'], m['agentId'], m['seq']) for m in messages] == [('reset', 'a', 1), ('action', 'b', 2)]
+    assert messages[0]['data'] == {}
+
+
+def test_camera_frame_round_trip():
+    pixels = np.arange(2 * 3 * 4, dtype=np.uint8).reshape(2, 3, 4)
+    [message] = decode_frame(encode_camera_frame(1, 12, pixels), AGENTS)
+
+    assert message['type'] == 'camera'
+    assert message['agentId'] == 'b'
+    assert message['frame'] == 12
+    np.testing.assert_array_equal(message['data'], pixels)
+
+
+@pytest.mark.parametrize('message_type, data', [
+    ('state', {'position': [0, 0, 0], 'sensors': [1.0]}),
+    ('action', {'position': [0, 0, 0], 'action': 'jump'}),
+    ('reset', {'position': [0, 0, 0]}),
+    ('info', {}),
+])
+def test_messages_without_a_binary_form_fall_back_to_json(message_type, data):
+    assert encode_record(message_type, 0, data) is None
+
+
+def test_truncated_frames_are_rejected():
+    frame = encode_record('state', 0, {'position': [1.0, 2.0, 3.0]})
+    with pytest.raises(ProtocolError):
+        decode_frame(frame[:-4], AGENTS)
+    with pytest.raises(ProtocolError):
+        decode_frame(frame[:6], AGENTS)
+
+
+def test_unknown_agent_index_is_rejected():
+    with pytest.raises(ProtocolError):
+        decode_frame(encode_record('state', 5, {}), AGENTS)
+
+
+def test_missing_seq_is_encoded_as_no_seq():
+    frame = encode_record('reset', 0, {})
+    assert int.from_bytes(frame[4:8], 'little') == NO_SEQ
+
+
+def test_delta_encoder_sends_keyframes_then_changed_fields():
+    encoder = DeltaEncoder(keyframe_interval=2)
+    state = {'position': [0, 0, 0], 'reward': 0.0}
+
+    first = encoder.encode({'type': 'state', 'agentId': 'a', 'data': state})
+    assert first['version'] == 1 and 'delta' not in first
+
+    second = encoder.encode({'type': 'state', 'agentId': 'a', 'data': {**state, 'reward': 1.0}})
+    assert second['version'] == 2 and second['delta'] and second['data'] == {'reward': 1.0}
+
+    encoder.encode({'type': 'state', 'agentId': 'a', 'data': {**state, 'reward': 2.0}})
+    keyframe = encoder.encode({'type': 'state', 'agentId': 'a', 'data': {**state, 'reward': 3.0}})
+    assert keyframe['version'] == 4 and 'delta' not in keyframe
+    assert keyframe['data'] == {**state, 'reward': 3.0}
+
+
+def test_delta_encoder_forget_forces_a_keyframe():
+    encoder = DeltaEncoder()
+    encoder.encode({'type': 'state', 'agentId': 'a', 'data': {'reward': 0.0, 'done': False}})
+    encoder.forget('a')
+    message = encoder.encode({'type': 'state', 'agentId': 'a', 'data': {'reward': 1.0, 'done': False}})
+
+    assert message['version'] == 1
+    assert 'delta' not in message
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from r3f_agents import R3FEnv, R3FReplayEnv, R3FReplayVecEnv, TrajectoryReader, TrajectoryRecorder
+
+EPISODES = 3
+EPISODE_STEPS = 4
+
+
+@pytest.fixture
+def run(inproc_url, loop, tmp_path):
+    """A recording of a few step-limited episodes, with what was stepped."""
+    env = TrajectoryRecorder(R3FEnv(inproc_url, loop=loop, max_episode_steps=EPISODE_STEPS), str(tmp_path),
+                             chunk_size=5, batch_size=2)
+    steps = []
+    for episode in range(EPISODES):
+        obs, _ = env.reset()
+        for step in range(EPISODE_STEPS):
+            action = np.array([1.0, 0.0, 0.5 * episode], dtype=np.float32)
+            next_obs, reward, terminated, truncated, _ = env.step(action)
+            steps.append((obs['position'].copy(), action, reward, next_obs['position'].copy()))
+            obs = next_obs
+    env.close()
+    return str(tmp_path), steps
+
+
+def test_episodes_read_back_as_recorded(run):
+    directory, steps = run
+    reader = TrajectoryReader(directory)
+
+    assert len(reader) == EPISODES
+    assert reader.num_transitions == EPISODES * EPISODE_STEPS
+    for index in range(EPISODES):
+        episode = reader.episode(index)
+        recorded = steps[index * EPISODE_STEPS:(index + 1) * EPISODE_STEPS]
+        assert reader.episodes[index]['complete']
+        np.testing.assert_allclose(episode['observation']['position'], [step[0] for step in recorded])
+        np.testing.assert_allclose(episode['action'], [step[1] for step in recorded])
+        np.testing.assert_allclose(episode['reward'], [step[2] for step in recorded], rtol=1e-6)
+        np.testing.assert_allclose(episode['next_observation']['position'], [step[3] for step in recorded])
+        # R3FEnv reports its step limit as the end of the episode
+        np.testing.assert_array_equal(episode['terminated'], [False] * (EPISODE_STEPS - 1) + [True])
+        assert not episode['truncated'].any()
+
+
+def test_replay_env_steps_through_the_recording(run, loop):
+    directory, steps = run
+    env = R3FReplayEnv(directory, loop=loop)
+    try:
+        for index in range(EPISODES):
+            obs, info = env.reset()
+            assert env.episode == index
+            for step in range(EPISODE_STEPS):
+                position, _, reward, next_position = steps[index * EPISODE_STEPS + step]
+                np.testing.assert_allclose(obs['position'], position)
+                obs, replayed, terminated, truncated, _ = env.step(env.action_space.sample())
+                np.testing.assert_allclose(obs['position'], next_position)
+                assert replayed == pytest.approx(reward, rel=1e-6)
+                assert terminated == (step == EPISODE_STEPS - 1)
+                assert not truncated
+    finally:
+        env.close()
+
+
+def test_replay_vec_env_replays_one_episode_per_agent(run, loop):
+    directory, steps = run
+    env = R3FReplayVecEnv(directory, num_agents=2, loop=loop)
+    try:
+        obs = env.reset()
+        np.testing.assert_array_equal(env.episodes, [0, 1])
+        actions = np.zeros((2, 3), dtype=np.float32)
+        for step in range(EPISODE_STEPS):
+            expected = [steps[episode * EPISODE_STEPS + step] for episode in (0, 1)]
+            np.testing.assert_allclose(obs['position'], [step_[0] for step_ in expected])
+            obs, rewards, dones, infos = env.step(actions)
+            np.testing.assert_allclose(rewards, [step_[2] for step_ in expected], rtol=1e-6)
+
+        assert dones.all()
+        assert not any(info['TimeLimit.truncated'] for info in infos)
+        np.testing.assert_allclose(infos[0]['terminal_observation']['position'], steps[EPISODE_STEPS - 1][3])
+        # The next pass starts over with episodes 2 and 0
+        np.testing.assert_array_equal(env.episodes, [2, 0])
+        np.testing.assert_allclose(obs['position'], [steps[2 * EPISODE_STEPS][0], steps[0][0]])
+    finally:
+        env.close()
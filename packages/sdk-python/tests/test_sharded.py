@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from r3f_agents import R3FShardedVecEnv, TargetReward
+
+TOWARDS_TARGET = np.array([1.0, 0.0, 1.0], dtype=np.float32)
+
+
+@pytest.fixture
+def make_env(loop):
+    envs = []
+
+    def make(endpoints, **kwargs):
+        env = R3FShardedVecEnv([f"ws://127.0.0.1:{server.port}" for server in endpoints], loop=loop, **kwargs)
+        envs.append(env)
+        return env
+
+    yield make
+    for env in envs:
+        env.close()
+
+
+def test_shards_move_to_the_faster_endpoint_without_ending_episodes(start_server, make_env):
+    fast, slow = start_server(), start_server(latency=0.02)
+    env = make_env([fast, slow], num_agents=8, shard_size=2, rebalance_interval=5, max_episode_steps=1000)
+    obs = env.reset()
+    assert [stats['agents'] for stats in env.shard_stats()] == [4, 4]
+
+    for _ in range(20):
+        next_obs, rewards, dones, infos = env.step(np.tile(TOWARDS_TARGET * 0.1, (8, 1)))
+        assert not dones.any()
+        assert not any(info.get('shard_moved') for info in infos)
+        assert (rewards != 0).all()
+        # Carried states go on from where they were: no jump back to the start
+        assert (next_obs['position'][:, 0] > obs['position'][:, 0]).all()
+        obs = next_obs
+
+    fast_stats, slow_stats = env.shard_stats()
+    assert fast_stats['agents'] > slow_stats['agents']
+    assert env.metrics.counters['shard_moves'] > 0
+
+
+def test_a_failed_endpoint_only_ends_the_episodes_of_its_shards(start_server, make_env, loop):
+    kept, lost = start_server(), start_server()
+    env = make_env([kept, lost], num_agents=4, shard_size=2, rebalance_interval=0, shard_timeout=0.2)
+    env.reset()
+    env.step(np.tile(TOWARDS_TARGET, (4, 1)))
+    loop.run(lost.stop())
+
+    _, rewards, dones, infos = env.step(np.tile(TOWARDS_TARGET, (4, 1)))
+
+    np.testing.assert_array_equal(dones, [False, False, True, True])
+    np.testing.assert_array_equal(rewards[2:], [0.0, 0.0])
+    assert rewards[0] != 0.0
+    assert all(infos[i]['shard_moved'] and infos[i]['TimeLimit.truncated'] for i in (2, 3))
+    assert [stats['agents'] for stats in env.shard_stats()] == [4, 0]
+
+    _, _, dones, _ = env.step(np.tile(TOWARDS_TARGET, (4, 1)))
+    assert not dones.any()
+
+
+def test_each_shard_gets_its_slice_of_the_reward_engine(start_server, make_env):
+    reward = TargetReward(4, target_position=[[1.0, 0.0, 0.0]] * 2 + [[-1.0, 0.0, 0.0]] * 2)
+    env = make_env([start_server()], num_agents=4, shard_size=2, reward=reward)
+    env.reset()
+
+    _, rewards, _, _ = env.step(np.tile([1.0, 0.0, 0.0], (4, 1)).astype(np.float32))
+
+    assert (rewards[:2] > 0).all()
+    assert (rewards[2:] < 0).all()
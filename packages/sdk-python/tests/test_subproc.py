@@ -0,0 +1,92 @@
+import functools
+import gymnasium as gym
+import numpy as np
+import pytest
+from gymnasium import spaces
+
+from r3f_agents import R3FSubprocVecEnv
+
+
+class CountingEnv(gym.Env):
+    """Episodes of ``length`` steps whose observations count the steps taken."""
+
+    def __init__(self, length: int = 3, nested_action: bool = False):
+        self.length = length
+        self.observation_space = spaces.Dict({
+            'position': spaces.Box(-np.inf, np.inf, (3,), np.float32),
+            'camera': spaces.Box(0, 255, (2, 2, 1), np.uint8),
+        })
+        action_spaces = {'move': spaces.Box(-1.0, 1.0, (3,), np.float32), 'jump': spaces.Discrete(2)}
+        if nested_action:
+            action_spaces['nested'] = spaces.Dict({'x': spaces.Discrete(2)})
+        self.action_space = spaces.Dict(action_spaces)
+        self.steps = 0
+
+    def _obs(self):
+        return {
+            'position': np.full(3, self.steps, dtype=np.float32),
+            'camera': np.full((2, 2, 1), 250 + self.steps, dtype=np.uint8),
+        }
+
+    def reset(self, seed=None, options=None):
+        self.steps = 0
+        return self._obs(), {}
+
+    def step(self, action):
+        self.steps += 1
+        terminated = self.steps >= self.length
+        return self._obs(), float(action['jump']) + float(action['move'][0]), terminated, False, {}
+
+
+@pytest.fixture
+def env():
+    env = R3FSubprocVecEnv([CountingEnv, CountingEnv, CountingEnv], envs_per_worker=2)
+    yield env
+    env.close()
+
+
+def actions(jump):
+    return {'move': np.zeros((3, 3), dtype=np.float32), 'jump': np.asarray(jump)}
+
+
+def test_shared_arrays_keep_each_key_dtype(env):
+    obs = env.reset()
+
+    assert obs['position'].dtype == np.float32
+    assert obs['camera'].dtype == np.uint8
+    assert obs['camera'].shape == (3, 2, 2, 1)
+    assert (obs['camera'] == 250).all()
+
+
+def test_dict_actions_reach_the_workers(env):
+    env.reset()
+
+    _, rewards, _, _ = env.step(actions([1, 0, 1]))
+    np.testing.assert_array_equal(rewards, [1.0, 0.0, 1.0])
+
+    per_env = [{'move': np.array([0.5, 0.0, 0.0]), 'jump': 0} for _ in range(3)]
+    _, rewards, _, _ = env.step(per_env)
+    np.testing.assert_array_equal(rewards, [0.5, 0.5, 0.5])
+
+
+def test_finished_episodes_auto_reset_in_the_workers(env):
+    env.reset()
+    for _ in range(2):
+        _, _, dones, _ = env.step(actions([0, 0, 0]))
+        assert not dones.any()
+
+    obs, _, dones, infos = env.step(actions([0, 0, 0]))
+
+    assert dones.all()
+    for info in infos:
+        assert not info['TimeLimit.truncated']
+        assert (info['terminal_observation']['position'] == 3).all()
+        assert info['terminal_observation']['camera'].dtype == np.uint8
+        assert (info['terminal_observation']['camera'] == 253).all()
+    assert (obs['position'] == 0).all()
+    assert (obs['camera'] == 250).all()
+
+
+def test_unsupported_spaces_are_rejected_at_construction():
+    with pytest.raises(ValueError, match="nested"):
+        R3FSubprocVecEnv([functools.partial(CountingEnv, nested_action=True)])
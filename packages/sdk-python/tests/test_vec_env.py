@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from r3f_agents import R3FVecEnv, TargetReward
+
+TOWARDS_TARGET = np.array([1.0, 0.0, 1.0], dtype=np.float32)
+
+
+@pytest.fixture
+def make_env(inproc_url, loop):
+    envs = []
+
+    def make(**kwargs):
+        env = R3FVecEnv(inproc_url, loop=loop, **kwargs)
+        envs.append(env)
+        return env
+
+    yield make
+    for env in envs:
+        env.close()
+
+
+def test_episodes_end_at_the_step_limit_and_auto_reset(make_env):
+    env = make_env(num_agents=2, max_episode_steps=3)
+    start = env.reset()['position'].copy()
+
+    for _ in range(2):
+        _, _, dones, _ = env.step(np.ones((2, 3), dtype=np.float32))
+        assert not dones.any()
+    obs, _, dones, infos = env.step(np.ones((2, 3), dtype=np.float32))
+
+    assert dones.all()
+    for i, info in enumerate(infos):
+        assert info['TimeLimit.truncated']
+        assert info['terminal_observation']['position'][0] > start[i][0]
+    np.testing.assert_allclose(obs['position'], start)
+
+
+def test_episodes_the_scene_reports_done_end_and_auto_reset(make_env):
+    env = make_env(num_agents=2, max_episode_steps=100)
+    start = env.reset()['position'].copy()
+    actions = np.tile(TOWARDS_TARGET, (2, 1))
+
+    for step in range(100):
+        obs, rewards, dones, infos = env.step(actions)
+        if dones.any():
+            break
+
+    assert dones.all()
+    assert step < 99
+    assert not infos[0]['TimeLimit.truncated']
+    assert rewards[0] > 5.0
+    np.testing.assert_allclose(obs['position'], start)
+    assert (env.current_steps == 0).all()
+
+
+def test_reward_engine_replaces_the_scene_reward(make_env):
+    reward = TargetReward(2, target_position=[1.0, 0.0, 0.0], success_bonus=100.0)
+    env = make_env(num_agents=2, reward=reward)
+    env.reset()
+
+    for _ in range(10):
+        _, rewards, dones, infos = env.step(np.tile([1.0, 0.0, 0.0], (2, 1)).astype(np.float32))
+        if dones.any():
+            break
+
+    assert dones.all()
+    assert infos[0]['success']
+    assert rewards[0] > 100.0
+
+
+def test_saved_states_restore_observations(make_env):
+    env = make_env(num_agents=2)
+    env.reset()
+    env.step(np.tile(TOWARDS_TARGET, (2, 1)))
+    saved = env.get_states()
+    saved_obs = env.step(np.zeros((2, 3), dtype=np.float32))[0]['position'].copy()
+
+    env.step(np.tile(TOWARDS_TARGET, (2, 1)))
+    obs = env.set_states(saved)
+
+    np.testing.assert_allclose(obs['position'], saved_obs)
+
+
+def test_pipelined_steps_keep_episode_boundaries(make_env):
+    env = make_env(num_agents=2, max_episode_steps=4, max_inflight=2)
+    env.reset()
+
+    dones = [env.step(np.ones((2, 3), dtype=np.float32))[2].all() for _ in range(12)]
+
+    assert dones == [False, False, False, True] * 3